@@ -2,20 +2,38 @@
 BAWT Backend - Flask API
 Media Mix Model Budget Allocation Workflow Tool
 
-Run with: python backend/app.py
+Run with: python backend/app.py (development server)
+Production: python backend/serve.py --workers 4 --threads 8
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import json
 import os
+import time
 from datetime import datetime
 from models import MMModel, ResponseCurve
 from database import Database
 from optimizer import optimizer
+import approximation
+import compare
+import curves as curve_library
+import dispatch
+import fitting
+from flighting import FlightingOptimizer
+import groups
+import metrics
+import multistart
+import portfolio
+import robust
+import serialization
+import uncertainty
+import whatif
 
 app = Flask(__name__)
+app.json = serialization.FastJSONProvider(app)
 CORS(app)
+metrics.init_app(app)
 
 # Initialize database
 db = Database()
@@ -24,6 +42,54 @@ db = Database()
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 
 
+def wants_columnar(data: dict = None) -> bool:
+    """Columnar responses are opt-in via ?format=columnar or "format": "columnar"."""
+    if request.args.get('format') == serialization.COLUMNAR:
+        return True
+    return isinstance(data, dict) and data.get('format') == serialization.COLUMNAR
+
+
+def wants_ndjson(data: dict = None) -> bool:
+    """Streamed NDJSON responses are opt-in via ?format=ndjson, "format": "ndjson" or Accept: application/x-ndjson."""
+    if request.args.get('format') == serialization.NDJSON:
+        return True
+    if request.accept_mimetypes.best == serialization.NDJSON_MIMETYPE:
+        return True
+    return isinstance(data, dict) and data.get('format') == serialization.NDJSON
+
+
+def request_flag(data: dict, name: str, default: bool = False) -> bool:
+    """A boolean request field: JSON true/false, 0/1, or "true"/"false" (any case); anything else is an error."""
+    value = data.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false', '1', '0'):
+        return value.strip().lower() in ('true', '1')
+    raise ValueError(f"'{name}' must be true or false")
+
+
+def ndjson_response(lines) -> Response:
+    """Stream encoded NDJSON lines as they are produced."""
+    return Response(stream_with_context(lines), mimetype=serialization.NDJSON_MIMETYPE,
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
+
+# optimizer_controls objective_type -> MMMOptimizer objective
+OBJECTIVE_TYPES = {'MaxRevenue': 'maximize_response', 'MinBudget': 'minimize_spend'}
+
+
+def default_objective() -> str:
+    """Objective configured by the objective_type optimizer control."""
+    for control in db.get_controls():
+        if control['setting_name'] == 'objective_type':
+            return OBJECTIVE_TYPES.get(control['setting_value'], 'maximize_response')
+    return 'maximize_response'
+
+
 # ==========================================
 # MODELS & CURVES
 # ==========================================
@@ -303,6 +369,44 @@ def save_result():
     return jsonify({"success": True, "id": result_id})
 
 
+@app.route('/api/results/compare', methods=['GET', 'POST'])
+def compare_results():
+    """
+    Compact diff of saved results against a baseline.
+    
+    Request body (or query string: ?ids=RES-001,RES-002&baseline=RES-001&top=10):
+    {
+        "ids": ["RES-001", "RES-002", "RES-003"],
+        "baseline": "RES-001",                 // default: the first id
+        "top": 10                              // biggest movers per scenario
+    }
+    """
+    try:
+        if request.method == 'POST':
+            data = request.json or {}
+            ids = data.get('ids') or []
+        else:
+            data = request.args
+            ids = [i for i in data.get('ids', '').split(',') if i]
+        ids = list(dict.fromkeys(str(i) for i in ids))
+        
+        stored = db.get_results_data(ids)
+        missing = [i for i in ids if i not in stored]
+        if missing:
+            return jsonify({"success": False, "error": f"Result not found: {', '.join(missing)}"}), 404
+        
+        comparison = compare.compare_scenarios(
+            [stored[i] for i in ids],
+            baseline=data.get('baseline'),
+            top=int(data.get('top', compare.DEFAULT_TOP))
+        )
+        return jsonify({"success": True, "data": comparison})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/results/<result_id>', methods=['GET'])
 def get_result(result_id):
     """Get a specific result."""
@@ -415,6 +519,54 @@ def get_response_curves():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def _sample_args():
+    """Parse ?points=&max_spend= for the curve sampling endpoints."""
+    points = request.args.get('points', curve_library.DEFAULT_SAMPLE_POINTS, type=int)
+    max_spend = request.args.get('max_spend', type=float)
+    return points, max_spend
+
+
+@app.route('/api/response-curves/<int:curve_ref>/samples', methods=['GET'])
+def get_curve_samples(curve_ref):
+    """
+    Sample a response curve for charting.
+    
+    Query: points (default 64, max 1000), max_spend (default 4x the curve's knee)
+    Returns spend, response, mroi and roi arrays on a grid concentrated near the knee.
+    """
+    try:
+        curve = db.get_curve(curve_ref)
+        if curve is None:
+            return jsonify({"success": False, "error": "Curve not found"}), 404
+        points, max_spend = _sample_args()
+        return jsonify({"success": True, "data": curve_library.cached_samples(curve, points, max_spend)})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/response-curves/samples', methods=['GET'])
+def get_curve_samples_batch():
+    """Sample every curve in a hierarchy selection (market, brand, sub_brand filters)."""
+    market = request.args.get('market')
+    brand = request.args.get('brand')
+    sub_brand = request.args.get('sub_brand')
+    
+    try:
+        points, max_spend = _sample_args()
+        samples = []
+        errors = []
+        for curve in db.get_curves(market, brand, sub_brand):
+            try:
+                samples.append(curve_library.cached_samples(curve, points, max_spend))
+            except ValueError as e:
+                errors.append(str(e))
+        return jsonify({"success": True, "data": samples, "errors": errors})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/response-curves', methods=['POST'])
 def save_response_curve():
     """Save or update a response curve."""
@@ -426,6 +578,44 @@ def save_response_curve():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/curves/fit', methods=['POST'])
+def fit_response_curves():
+    """
+    Refit response curves from weekly spend and response history.
+    
+    Request body:
+    {
+        "curve_refs": [1, 2, 3],      // optional, default every curve with history
+        "family": "auto",             // optional: hill | atan | scurve | tanh | auto, default each curve's own type
+        "workers": 4,                 // optional chunks fitted at once on the solver pool
+        "write": true,                // optional, write parameters and diagnostics back (default true)
+        "series": [                   // optional inline history instead of the database (never written)
+            {"curve_ref": 1, "curve_type": "hill", "spend": [...], "response": [...]}
+        ]
+    }
+    """
+    try:
+        data = request.json or {}
+        family = data.get('family')
+        workers = data.get('workers')
+        
+        start = time.perf_counter()
+        if data.get('series'):
+            fits = fitting.fit_curves(data['series'], family, workers=workers)
+            result = {'fits': fits, 'summary': {'fitted': len(fits), 'written': False}}
+        else:
+            result = fitting.refit(db, data.get('curve_refs'), family, workers, write=request_flag(data, 'write', True))
+        metrics.observe_solver('fit', time.perf_counter() - start,
+                               iterations=sum(f['iterations'] for f in result['fits']),
+                               converged=all(f['converged'] for f in result['fits']))
+        
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/cpms', methods=['GET'])
 def get_cpm_data():
     """Get CPM data filtered by criteria."""
@@ -467,7 +657,13 @@ def run_optimization():
         "week": "2024-W50",
         "total_budget": 1000000,
         "current_allocations": {"RC-US-A-PS": 300000, ...},
-        "constraints": {"RC-US-A-PS": {"min": 50000, "max": 500000}, ...}
+        "constraints": {"RC-US-A-PS": {"min": 50000, "max": 500000}, ...},
+        "solver_options": {"epsilon": 0.01, "max_iterations": 100, "step_size": 0.05},
+        "trace": false,
+        "objective": "maximize_response",   // or "minimize_spend" (default: objective_type control)
+        "target": 2500000,                  // KPI to reach, minimize_spend only
+        "kpi": "response",                  // or "incr_volume"
+        "sensitivity": false                // add shadow prices of the budget and binding bounds
     }
     """
     try:
@@ -478,6 +674,12 @@ def run_optimization():
         total_budget = data.get('total_budget', 1000000)
         current_allocations = data.get('current_allocations', {})
         constraints = data.get('constraints', {})
+        solver_options = data.get('solver_options')
+        trace = request_flag(data, 'trace')
+        objective = data.get('objective') or default_objective()
+        target = data.get('target')
+        kpi = data.get('kpi', 'response')
+        sensitivity = request_flag(data, 'sensitivity')
         
         # Get curves and CPMs
         curves = db.get_curves(market, brand)
@@ -492,15 +694,307 @@ def run_optimization():
             current_allocations = {c['id']: per_channel for c in curves}
         
         # Run optimization
+        start = time.perf_counter()
         result = optimizer.optimize(
             curves=curves,
             current_allocations=current_allocations,
             total_budget=total_budget,
             cpms=cpms,
-            constraints=constraints
+            constraints=constraints,
+            objective=objective,
+            options=solver_options,
+            trace=trace,
+            target=float(target) if target is not None else None,
+            kpi=kpi,
+            sensitivity=sensitivity
+        )
+        summary = result['summary']
+        metrics.observe_solver(
+            'mroi' if objective == 'maximize_response' else 'mroi:min_spend', time.perf_counter() - start,
+            iterations=summary['iterations'],
+            evaluations=summary['evaluations'],
+            converged=summary['converged']
+        )
+        
+        if wants_ndjson(data):
+            return ndjson_response(serialization.ndjson_optimization(result))
+        if wants_columnar(data):
+            result = serialization.columnar_optimization(result)
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/optimize/multistart', methods=['POST'])
+def run_multistart_optimization():
+    """
+    Multi-start global search for S-shaped (non-concave) response curves.
+    
+    Request body:
+    {
+        "market": "US",                       // response_curves filters, or inline "curves"
+        "brand": "Brand A",
+        "total_budget": 1000000,
+        "current_allocations": {"1": 300000, ...},
+        "constraints": {"1": {"min": 50000, "max": 500000}, ...},
+        "multistart": {"starts": 16, "time_budget": 2.0, "workers": 4,
+                       "local_solver": "slsqp", "max_iterations": 200, "seed": 42}
+    }
+    """
+    try:
+        data = request.json or {}
+        curves = data.get('curves') or db.get_curves(data.get('market'), data.get('brand'), data.get('sub_brand'))
+        settings = data.get('multistart') or {}
+        
+        start = time.perf_counter()
+        result = multistart.multistart(
+            curves=curves,
+            total_budget=float(data.get('total_budget', 1000000)),
+            constraints=data.get('constraints'),
+            current_allocations=data.get('current_allocations'),
+            starts=int(settings.get('starts', multistart.DEFAULT_STARTS)),
+            time_budget=float(settings.get('time_budget', multistart.DEFAULT_TIME_BUDGET)),
+            workers=settings.get('workers'),
+            local_solver=settings.get('local_solver'),
+            max_iterations=settings.get('max_iterations'),
+            seed=settings.get('seed')
+        )
+        summary = result['summary']
+        metrics.observe_solver(
+            f"multistart:{summary['multistart']['local_solver']}", time.perf_counter() - start,
+            iterations=summary['iterations'],
+            converged=summary['converged']
+        )
+        
+        if wants_ndjson(data):
+            return ndjson_response(serialization.ndjson_optimization(result))
+        if wants_columnar(data):
+            result = serialization.columnar_optimization(result)
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/optimize/portfolio', methods=['POST'])
+def run_portfolio_optimization():
+    """
+    Optimize a global budget across markets by dual decomposition.
+    
+    Request body:
+    {
+        "market": null,                       // response_curves filters (omit for all markets), or inline "curves"
+        "total_budget": 50000000,
+        "current_allocations": {"1": 300000, ...},
+        "constraints": {"1": {"min": 50000, "max": 500000}, ...},
+        "portfolio": {"partition_by": ["market", "brand"], "workers": 4, "tolerance": 1e-6}
+    }
+    """
+    try:
+        data = request.json or {}
+        curves = data.get('curves') or db.get_curves(data.get('market'), data.get('brand'), data.get('sub_brand'))
+        settings = data.get('portfolio') or {}
+        
+        start = time.perf_counter()
+        result = portfolio.optimize_portfolio(
+            curves=curves,
+            total_budget=float(data.get('total_budget', 1000000)),
+            constraints=data.get('constraints'),
+            current_allocations=data.get('current_allocations'),
+            partition_by=settings.get('partition_by'),
+            workers=settings.get('workers'),
+            tolerance=float(settings.get('tolerance', portfolio.DEFAULT_TOLERANCE))
+        )
+        summary = result['summary']
+        metrics.observe_solver('portfolio', time.perf_counter() - start,
+                               iterations=summary['iterations'],
+                               converged=summary['converged'])
+        
+        if wants_ndjson(data):
+            return ndjson_response(serialization.ndjson_optimization(result))
+        if wants_columnar(data):
+            result = serialization.columnar_optimization(result)
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/optimize/robust', methods=['POST'])
+def run_robust_optimization():
+    """
+    Optimize expected or downside (CVaR) response over sampled curve parameters.
+    
+    Request body:
+    {
+        "market": "US",                       // response_curves filters, or inline "curves"
+        "brand": "Brand A",
+        "total_budget": 1000000,
+        "constraints": {"1": {"min": 50000, "max": 500000}, ...},
+        "robust": {"objective": "cvar", "alpha": 0.1, "samples": 200, "seed": 42,
+                   "curves": {"default": {"top": {"cv": 0.2}}}}
+    }
+    """
+    try:
+        data = request.json or {}
+        curves = data.get('curves') or uncertainty.with_standard_errors(
+            db.get_curves(data.get('market'), data.get('brand'), data.get('sub_brand')), db.get_curve_fits())
+        settings = data.get('robust') or {}
+        
+        start = time.perf_counter()
+        result = robust.robust_optimize(
+            curves=curves,
+            total_budget=float(data.get('total_budget', 1000000)),
+            constraints=data.get('constraints'),
+            current_allocations=data.get('current_allocations'),
+            specs=settings.get('curves'),
+            objective=settings.get('objective', 'expected'),
+            alpha=float(settings.get('alpha', robust.DEFAULT_ALPHA)),
+            samples=int(settings.get('samples', robust.DEFAULT_SAMPLES)),
+            max_iterations=settings.get('max_iterations'),
+            seed=settings.get('seed')
+        )
+        summary = result['summary']
+        metrics.observe_solver(f"robust:{summary['robust']['objective']}", time.perf_counter() - start,
+                               iterations=summary['iterations'],
+                               converged=summary['converged'])
+        
+        if wants_ndjson(data):
+            return ndjson_response(serialization.ndjson_optimization(result))
+        if wants_columnar(data):
+            result = serialization.columnar_optimization(result)
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/optimize/grouped', methods=['POST'])
+def run_grouped_optimization():
+    """
+    Optimize with budget caps/floors on hierarchy groups.
+    
+    Request body:
+    {
+        "market": "US",                       // response_curves filters, or inline "curves"
+        "total_budget": 5000000,
+        "constraints": {"1": {"min": 50000, "max": 500000}, ...},
+        "groups": [
+            {"name": "TV <= 40% of Brand A", "where": {"brand": "Brand A", "channel": "TV"},
+             "max_share": 0.4, "of": {"brand": "Brand A"}},
+            {"where": {"market": "UK", "channel": "Digital"}, "min": 2000000}
+        ]
+    }
+    """
+    try:
+        data = request.json or {}
+        curves = data.get('curves') or db.get_curves(data.get('market'), data.get('brand'), data.get('sub_brand'))
+        
+        start = time.perf_counter()
+        result = groups.optimize_grouped(
+            curves=curves,
+            total_budget=float(data.get('total_budget', 1000000)),
+            constraints=data.get('constraints'),
+            groups=data.get('groups'),
+            current_allocations=data.get('current_allocations')
         )
+        metrics.observe_solver('grouped', time.perf_counter() - start,
+                               converged=result['summary']['group_violation'] == 0)
         
+        if wants_ndjson(data):
+            return ndjson_response(serialization.ndjson_optimization(result))
+        if wants_columnar(data):
+            result = serialization.columnar_optimization(result)
         return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/optimize/auto', methods=['POST'])
+def run_auto_optimization():
+    """
+    Optimize with the fastest solver that can handle the problem (see dispatch.py).
+        
+    Request body, either curves:
+    {
+        "market": "US",                       // response_curves filters, or inline "curves"
+        "total_budget": 1000000,
+        "current_allocations": {"1": 300000, ...},
+        "constraints": {"1": {"min": 50000, "max": 500000}, ...},
+        "groups": [...],                      // as for /api/optimize/grouped
+        "objective": "maximize_response",     // or "minimize_spend" with "target" (default: objective_type control)
+        "kpi": "response",
+        "dispatch": {"method": null, "gap": 0.001}
+    }
+    or campaigns (as for /api/optimize/nlopt, plus "flighting" rules for a weekly plan).
+    The result carries the chosen method, the reason and every candidate's
+    estimate under summary.dispatch (campaign results: dispatch).
+    """
+    try:
+        data = request.json or {}
+        settings = data.get('dispatch') or {}
+        method = settings.get('method')
+        gap = float(settings.get('gap', dispatch.DEFAULT_GAP))
+        total_budget = float(data.get('total_budget', 1000000))
+        
+        start = time.perf_counter()
+        campaigns = data.get('campaigns')
+        if campaigns:
+            if serialization.is_columnar(campaigns):
+                campaigns = serialization.campaigns_from_columnar(campaigns)
+            results = dispatch.optimize_campaigns(
+                campaigns, total_budget,
+                flighting=data.get('flighting'),
+                options=data.get('solver_options'),
+                trace=request_flag(data, 'trace'),
+                sensitivity=request_flag(data, 'sensitivity'),
+                method=method,
+                gap=gap
+            )
+            metrics.observe_solver(f"auto:{results['dispatch']['method']}", time.perf_counter() - start,
+                                   iterations=results.get('iterations'),
+                                   evaluations=results.get('evaluations'),
+                                   converged=results.get('solver') != 'Fallback')
+            if wants_ndjson(data):
+                return ndjson_response(serialization.ndjson_campaign_results(results))
+            if wants_columnar(data):
+                results = serialization.columnar_campaign_results(results)
+            return jsonify({"success": True, "data": results})
+        
+        curves = data.get('curves') or db.get_curves(data.get('market'), data.get('brand'), data.get('sub_brand'))
+        target = data.get('target')
+        result = dispatch.optimize_curves(
+            curves=curves,
+            total_budget=total_budget,
+            constraints=data.get('constraints'),
+            groups=data.get('groups'),
+            current_allocations=data.get('current_allocations'),
+            objective=data.get('objective') or default_objective(),
+            target=float(target) if target is not None else None,
+            kpi=data.get('kpi', 'response'),
+            method=method,
+            gap=gap
+        )
+        summary = result['summary']
+        metrics.observe_solver(f"auto:{summary['dispatch']['method']}", time.perf_counter() - start,
+                               iterations=summary.get('iterations'),
+                               evaluations=summary.get('evaluations'),
+                               converged=summary.get('converged', True))
+        
+        if wants_ndjson(data):
+            return ndjson_response(serialization.ndjson_optimization(result))
+        if wants_columnar(data):
+            result = serialization.columnar_optimization(result)
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -530,6 +1024,12 @@ def run_mmm_simulation():
         cpms_list = db.get_cpms(market, brand, week)
         cpms = {cpm['id'].replace('CPM', 'RC'): cpm for cpm in cpms_list}
         
+        if wants_ndjson(data):
+            # Each curve's row is sent as soon as it is evaluated; totals follow the last row
+            summary = {}
+            rows = optimizer.iter_simulate(curves=curves, allocations=allocations, cpms=cpms, summary=summary)
+            return ndjson_response(serialization.ndjson_lines(rows, lambda: {'summary': summary}))
+        
         # Run simulation
         result = optimizer.simulate(
             curves=curves,
@@ -537,11 +1037,144 @@ def run_mmm_simulation():
             cpms=cpms
         )
         
+        if wants_columnar(data):
+            result = serialization.columnar_optimization(result)
         return jsonify({"success": True, "data": result})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/simulate/uncertainty', methods=['POST'])
+def run_uncertainty_simulation():
+    """
+    Monte Carlo simulation of a spend plan under curve-parameter uncertainty.
+    
+    Request body:
+    {
+        "market": "US",                       // response_curves filters, or inline "curves"
+        "brand": "Brand A",
+        "allocations": {"1": 300000, ...},
+        "uncertainty": {
+            "samples": 5000, "percentiles": [5, 50, 95], "group_by": "channel", "workers": 1, "seed": 42,
+            "curves": {"1": {"scale": {"dist": "lognormal", "sd": 12000}},
+                       "default": {"top": {"dist": "normal", "cv": 0.1}}}
+        }
+    }
+    """
+    try:
+        data = request.json or {}
+        curves = data.get('curves') or uncertainty.with_standard_errors(
+            db.get_curves(data.get('market'), data.get('brand'), data.get('sub_brand')), db.get_curve_fits())
+        settings = data.get('uncertainty') or {}
+        
+        start = time.perf_counter()
+        result = uncertainty.simulate_uncertainty(
+            curves=curves,
+            allocations=data.get('allocations', {}),
+            specs=settings.get('curves'),
+            samples=int(settings.get('samples', uncertainty.DEFAULT_SAMPLES)),
+            percentiles=settings.get('percentiles'),
+            group_by=settings.get('group_by', 'channel'),
+            workers=settings.get('workers'),
+            seed=settings.get('seed')
+        )
+        metrics.observe_solver('uncertainty', time.perf_counter() - start)
+        
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/simulate/batch', methods=['POST'])
+def run_batch_simulation():
+    """
+    Score many spend plans at once.
+    
+    Request body:
+    {
+        "market": "US",                       // response_curves filters, or inline "curves"
+        "brand": "Brand A",
+        "curve_ids": [1, 2, 3],               // column order of plans (default: all curves, in order)
+        "plans": [[100000, 50000, 0], ...],   // plans x curves spend, or a compact block:
+                                              // {"shape": [n, 3], "dtype": "float32", "data": "<base64>"}
+        "per_curve": false,                   // also return the plans x curves response matrix
+        "approximate": false,                 // score from interpolation tables (best plan re-scored exactly)
+        "tolerance": 1e-6                     // approximation error bound, relative to max response
+    }
+    """
+    try:
+        data = request.json or {}
+        curves = data.get('curves') or db.get_curves(data.get('market'), data.get('brand'), data.get('sub_brand'))
+        if 'plans' not in data:
+            return jsonify({"success": False, "error": "No plans provided"}), 400
+        plans = serialization.decode_matrix(data['plans'])
+        
+        start = time.perf_counter()
+        result = whatif.simulate_plans(
+            curves=curves,
+            plans=plans,
+            curve_ids=data.get('curve_ids'),
+            per_curve=request_flag(data, 'per_curve'),
+            approximate=request_flag(data, 'approximate'),
+            tolerance=float(data.get('tolerance', approximation.DEFAULT_TOLERANCE))
+        )
+        metrics.observe_solver('batch_simulate', time.perf_counter() - start)
+        
+        if 'responses' in result:
+            # Answer in the encoding the plans came in
+            compact = serialization.is_compact_matrix(data['plans'])
+            dtype = data['plans'].get('dtype', 'float64') if compact else 'float64'
+            result['responses'] = serialization.encode_matrix(result['responses'], compact, dtype)
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/simulate/grid', methods=['POST'])
+def run_whatif_grid():
+    """
+    What-if grid: total response over a grid of spend levels for up to four curves.
+    
+    Request body:
+    {
+        "market": "US",                       // response_curves filters, or inline "curves"
+        "brand": "Brand A",
+        "allocations": {"1": 300000, ...},    // current spend of every curve
+        "axes": [
+            {"curve_id": 1, "min": 0, "max": 600000, "points": 200},
+            {"curve_id": 2, "levels": [0, 50000, 100000]}
+        ],
+        "others": "fixed",                    // or "optimize": re-allocate the leftover budget
+        "total_budget": 1000000,              // "optimize" only (default: current total spend)
+        "constraints": {"3": {"min": 50000, "max": 500000}}
+    }
+    """
+    try:
+        data = request.json or {}
+        curves = data.get('curves') or db.get_curves(data.get('market'), data.get('brand'), data.get('sub_brand'))
+        
+        start = time.perf_counter()
+        result = whatif.whatif_grid(
+            curves=curves,
+            axes=data.get('axes', []),
+            current_allocations=data.get('allocations', {}),
+            others=data.get('others', 'fixed'),
+            total_budget=data.get('total_budget'),
+            constraints=data.get('constraints')
+        )
+        metrics.observe_solver(f"grid:{result['grid']['others']}", time.perf_counter() - start)
+        
+        return jsonify({"success": True, "data": result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # ==========================================
 # FILE UPLOAD
 # ==========================================
@@ -651,6 +1284,51 @@ def upload_cpms():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/upload/responses', methods=['POST'])
+def upload_responses():
+    """
+    Upload weekly KPI response history from CSV file, for curve fitting.
+    
+    Expected CSV columns:
+    curve_ref, week, response
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify({"success": False, "error": "No file provided"}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"success": False, "error": "No file selected"}), 400
+        
+        import csv
+        import io
+        
+        content = file.read().decode('utf-8')
+        reader = csv.DictReader(io.StringIO(content))
+        
+        rows = []
+        errors = []
+        
+        for line, row in enumerate(reader, start=1):
+            try:
+                rows.append({
+                    'curve_ref': int(row['curve_ref']),
+                    'week': row['week'],
+                    'response': float(row['response'])
+                })
+            except Exception as e:
+                errors.append(f"Row {line}: {str(e)}")
+        
+        imported = db.save_weekly_responses(rows)
+        return jsonify({
+            "success": True, 
+            "imported": imported,
+            "errors": errors
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # ==========================================
 # NLOPT OPTIMIZER
 # ==========================================
@@ -661,9 +1339,14 @@ def run_nlopt_optimization():
     Run NLopt optimization with tanh response curve.
     
     Input:
-    - campaigns: List of campaign data with alpha, beta, spend_max, n, W1-W52, C1-C52
+    - campaigns: List of campaign data with alpha, beta, spend_max, n, W1-W52, C1-C52,
+      or a columnar block {"columns": {...}, "W": [[...]], "C": [[...]]}
     - total_budget: Total budget constraint
-    - algorithm: Optimization algorithm (SLSQP, COBYLA, etc.)
+    - algorithm: Optimization algorithm (SLSQP, COBYLA, etc.), or "auto" to let
+      dispatch pick the fastest valid one (reported under "dispatch")
+    - solver_options: Optional xtol_rel, ftol_rel, maxeval overrides
+    - trace: Optional flag to return a per-evaluation convergence trace
+    - sensitivity: Optional flag to return shadow prices of the budget and binding bounds
     
     Output per campaign:
     - net_spend: Optimized spend allocation
@@ -675,15 +1358,36 @@ def run_nlopt_optimization():
         
         data = request.json
         campaigns = data.get('campaigns', [])
+        if serialization.is_columnar(campaigns):
+            campaigns = serialization.campaigns_from_columnar(campaigns)
         total_budget = float(data.get('total_budget', 1000000))
         algorithm = data.get('algorithm', 'SLSQP')
+        solver_options = data.get('solver_options')
+        trace = request_flag(data, 'trace')
+        sensitivity = request_flag(data, 'sensitivity')
         
         if not campaigns:
             return jsonify({"success": False, "error": "No campaign data provided"}), 400
         
         # Run optimization
-        results = optimize_budget(campaigns, total_budget, algorithm)
+        start = time.perf_counter()
+        if algorithm == 'auto':
+            results = dispatch.optimize_campaigns(campaigns, total_budget, options=solver_options, trace=trace,
+                                                  sensitivity=sensitivity, methods=dispatch.NLOPT_METHODS)
+            algorithm = 'auto:' + results['dispatch']['method'].partition(':')[2]
+        else:
+            results = optimize_budget(campaigns, total_budget, algorithm, solver_options, trace, sensitivity)
+        metrics.observe_solver(
+            f'nlopt:{algorithm}', time.perf_counter() - start,
+            iterations=results.get('iterations'),
+            evaluations=results.get('evaluations'),
+            converged=results['solver'] != 'Fallback'
+        )
         
+        if wants_ndjson(data):
+            return ndjson_response(serialization.ndjson_campaign_results(results))
+        if wants_columnar(data):
+            results = serialization.columnar_campaign_results(results)
         return jsonify({
             "success": True,
             "data": results
@@ -695,6 +1399,11 @@ def run_nlopt_optimization():
             "error": "NLopt optimizer not available. Install nlopt or scipy.",
             "details": str(e)
         }), 500
+    except ValueError as e:
+        return jsonify({
+            "success": False, 
+            "error": str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             "success": False, 
@@ -702,6 +1411,54 @@ def run_nlopt_optimization():
         }), 500
 
 
+@app.route('/api/optimize/flighting', methods=['POST'])
+def run_flighting_optimization():
+    """
+    Schedule campaigns week by week (flighting) with the tanh response curve.
+    
+    Input:
+    - campaigns: As for /api/optimize/nlopt; C1-C52 = 0 weeks are never funded.
+      Optional per-campaign min_weekly_spend, min_run_weeks, max_weekly_spend
+    - total_budget: Total budget constraint
+    - flighting: Defaults for min_weekly_spend, min_run_weeks, max_weekly_spend; max_repairs
+    - trace: Optional flag to return a per-pass trace
+    
+    Output per campaign (in addition to the NLopt fields):
+    - weekly_spend: 52 weekly spends
+    - flights: Active runs as [first_week, last_week] (1-based)
+    """
+    try:
+        data = request.json
+        campaigns = data.get('campaigns', [])
+        if serialization.is_columnar(campaigns):
+            campaigns = serialization.campaigns_from_columnar(campaigns)
+        total_budget = float(data.get('total_budget', 1000000))
+        options = data.get('flighting')
+        trace = request_flag(data, 'trace')
+        
+        if not campaigns:
+            return jsonify({"success": False, "error": "No campaign data provided"}), 400
+        
+        start = time.perf_counter()
+        flighting = FlightingOptimizer(campaigns, total_budget, options, trace)
+        spend, active, relaxed_profit, passes, elapsed = flighting.solve()
+        metrics.observe_solver('flighting', time.perf_counter() - start, iterations=passes)
+        
+        summary = flighting.summary(spend, active, relaxed_profit, passes, elapsed)
+        rows = flighting.iter_campaigns(spend, active)
+        if wants_ndjson(data):
+            # Campaign rows (52 weekly values each) are expanded from the sparse plan one at a time
+            return ndjson_response(serialization.ndjson_lines(rows, summary))
+        results = {**summary, 'campaigns': list(rows)}
+        if wants_columnar(data):
+            results = serialization.columnar_campaign_results(results)
+        return jsonify({"success": True, "data": results})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route('/api/optimize/nlopt/template', methods=['GET'])
 def get_optimization_template():
     """
@@ -736,7 +1493,7 @@ def get_optimization_template():
 
 
 # ==========================================
-# HEALTH CHECK
+# HEALTH CHECK & METRICS
 # ==========================================
 
 @app.route('/api/health', methods=['GET'])
@@ -745,6 +1502,12 @@ def health_check():
     return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == '__main__':
     print("=" * 50)
     print("  BAWT Backend API")
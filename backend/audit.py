@@ -0,0 +1,170 @@
+"""
+BAWT Backend - Audit Log
+Write-behind audit trail: events are queued in memory and written in batches
+
+Audit entries are a side channel of the results they describe, so saving or
+deleting a result no longer writes them in its own transaction. log() stamps
+the event and appends it to an in-memory queue; a background thread writes
+the queue to audit_log with one executemany per batch, either every
+FLUSH_INTERVAL seconds or as soon as BATCH_SIZE events are waiting.
+
+Durability: close() (called by the server when a worker drains, and at
+interpreter exit) writes whatever is still queued. A failed batch is put back
+at the front of the queue and retried on the next flush; events past
+MAX_QUEUE are dropped oldest first and counted, so a locked or unwritable
+database cannot grow the queue without bound.
+
+The writer thread is started lazily in the process that logs, so loggers
+created in the pre-fork server parent work unchanged in every worker.
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from metrics import audit_queue_depth, observe_audit_flush
+
+
+FLUSH_INTERVAL = float(os.environ.get('BAWT_AUDIT_FLUSH_INTERVAL', 1.0))  # seconds
+BATCH_SIZE = 256  # events that trigger an early flush
+MAX_QUEUE = 100000  # events held while the database is unwritable
+BUSY_TIMEOUT = 30.0  # seconds a flush waits for the SQLite write lock
+
+INSERT_SQL = 'INSERT INTO audit_log (result_id, action, user, timestamp, details) VALUES (?, ?, ?, ?, ?)'
+
+# Loggers with a writer thread in this process, closed on shutdown
+_loggers: 'List[AuditLogger]' = []
+_loggers_lock = threading.Lock()
+
+
+class AuditLogger:
+    """Queue of pending audit_log rows with a background batch writer."""
+
+    def __init__(self, db_path: str, flush_interval: float = FLUSH_INTERVAL,
+                 batch_size: int = BATCH_SIZE, max_queue: int = MAX_QUEUE):
+        self.db_path = db_path
+        self.flush_interval = float(flush_interval)
+        self.batch_size = max(1, int(batch_size))
+        self._queue: 'deque[Tuple]' = deque(maxlen=max(1, int(max_queue)))
+        self._wakeup = threading.Condition(threading.Lock())
+        # Serializes writers so a foreground flush() and the thread never interleave batches
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._closed = False
+
+    def log(self, result_id: str, action: str, user: str = 'User', details: str = '',
+            timestamp: Optional[str] = None) -> None:
+        """Queue one audit event; returns without touching the database."""
+        event = (result_id, action, user, timestamp or datetime.now().isoformat(), details)
+        with self._wakeup:
+            if len(self._queue) == self._queue.maxlen:
+                observe_audit_flush(0, 0.0, dropped=1)
+            self._queue.append(event)
+            audit_queue_depth.set(len(self._queue))
+            write_through = self._closed
+            if not write_through:
+                self._ensure_thread()
+                if len(self._queue) >= self.batch_size:
+                    self._wakeup.notify()
+        if write_through:
+            # Logged after close(): no thread will flush again
+            self.flush()
+
+    def pending(self) -> int:
+        """Number of queued events not yet written."""
+        return len(self._queue)
+
+    def flush(self) -> int:
+        """
+        Write every queued event now.
+
+        Returns:
+            Number of events written
+        """
+        written = 0
+        with self._write_lock:
+            while True:
+                with self._wakeup:
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    break
+                try:
+                    self._write(batch)
+                except sqlite3.Error:
+                    with self._wakeup:
+                        # Retry later, ahead of anything queued meanwhile
+                        room = self._queue.maxlen - len(self._queue)
+                        kept = batch[-room:] if room > 0 else []
+                        self._queue.extendleft(reversed(kept))
+                        audit_queue_depth.set(len(self._queue))
+                    if len(kept) < len(batch):
+                        observe_audit_flush(0, 0.0, dropped=len(batch) - len(kept))
+                    raise
+                written += len(batch)
+        with self._wakeup:
+            audit_queue_depth.set(len(self._queue))
+        return written
+
+    def close(self) -> None:
+        """Stop the writer thread and write what is still queued."""
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            thread.join()
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass
+
+    def _write(self, batch: List[Tuple]) -> None:
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        try:
+            with conn:
+                conn.executemany(INSERT_SQL, batch)
+        finally:
+            conn.close()
+        observe_audit_flush(len(batch), time.perf_counter() - started)
+
+    def _ensure_thread(self) -> None:
+        # Caller holds _wakeup. A thread started before fork() does not exist in the child.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='bawt-audit', daemon=True)
+        self._thread.start()
+        with _loggers_lock:
+            if self not in _loggers:
+                _loggers.append(self)
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                if not self._closed and len(self._queue) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # Batch was requeued; back off until the next interval
+                time.sleep(self.flush_interval)
+
+
+def close_all() -> None:
+    """Durably flush every logger of this process (worker drain / interpreter exit)."""
+    with _loggers_lock:
+        loggers = list(_loggers)
+    for logger in loggers:
+        logger.close()
+
+
+atexit.register(close_all)
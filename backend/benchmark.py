@@ -0,0 +1,172 @@
+"""
+BAWT Backend - Solver Benchmark
+Times every allocation method on synthetic problems to calibrate solver dispatch
+
+Each size runs every method on the same generated problem: hill curves
+split over markets and brands with a third of them bounded, once with
+concave curves (shape <= 1) and once with S-shaped ones, and tanh campaigns
+with weekly seasonality for the NLopt / SciPy methods. A method's time is
+the fastest of REPEATS runs; its gap is how far its response falls short of
+the best any method found on that problem. A method whose time is projected
+past SIZE_LIMIT_SECONDS is not run at larger sizes (dispatch extrapolates).
+
+Run with: python backend/benchmark.py [--write]
+--write saves the table to dispatch.CALIBRATION_PATH, which dispatch then
+prefers over its built-in DEFAULT_CALIBRATION.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+import dispatch
+
+
+SIZES = (5, 20, 60, 200, 600)
+REPEATS = 3
+SIZE_LIMIT_SECONDS = 10.0
+SEED = 7
+
+CURVE_CLASSES = {'concave': (0.5, 1.0), 's_shaped': (1.2, 2.5)}  # range of the shape parameter
+MARKETS = 4
+BRANDS = 2
+
+
+def synthetic_curves(n: int, problem_class: str,
+                     seed: int = SEED) -> Tuple[List[Dict[str, Any]], float, Dict[str, Dict[str, float]]]:
+    """(hill curves, total budget, constraints) of a synthetic allocation problem."""
+    rng = np.random.default_rng(seed)
+    low, high = CURVE_CLASSES[problem_class]
+    curves = [{
+        'id': f'BM-{i}',
+        'k': float(rng.uniform(5e4, 5e5)),
+        's': float(rng.uniform(low, high)),
+        'max_response': float(rng.uniform(1e5, 2e6)),
+        'market': f'M{i % MARKETS}',
+        'brand': f'B{i // MARKETS % BRANDS}',
+    } for i in range(n)]
+    constraints = {c['id']: {'min': 0.2 * c['k'], 'max': 5 * c['k']} for c in curves[::3]}
+    return curves, 1e5 * n, constraints
+
+
+def synthetic_campaigns(n: int, seed: int = SEED) -> Tuple[List[Dict[str, Any]], float]:
+    """(tanh campaigns in the columnar W / C layout, total budget)."""
+    rng = np.random.default_rng(seed)
+    campaigns = []
+    for i in range(n):
+        spend_max = float(rng.uniform(5e4, 3e5))
+        campaigns.append({
+            'campaignproduct': f'BM-{i}',
+            'alpha': float(rng.uniform(1.0, 3.0)),
+            'beta': float(rng.uniform(0.5, 0.9)),
+            'spend_max': spend_max,
+            'spend_min': 0.1 * spend_max if i % 3 == 0 else 0.0,
+            'W': rng.uniform(0.5, 2.0, 52).round(2).tolist(),
+            'C': (rng.random(52) > 0.2).astype(int).tolist(),
+        })
+    return campaigns, 0.5 * sum(c['spend_max'] for c in campaigns)
+
+
+def _timed(run, repeats: int) -> Tuple[float, float]:
+    """(fastest wall time, response) of repeated runs."""
+    best_time, value = math.inf, 0.0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = run()
+        best_time = min(best_time, time.perf_counter() - started)
+        value = (result['summary']['total_optimized_response'] if 'summary' in result
+                 else result['total_profit'])
+    return best_time, value
+
+
+def _projected(entry: Dict[str, List[float]], n: int) -> float:
+    if not entry['sizes']:
+        return 0.0
+    return dispatch._interpolate(entry['sizes'], entry['seconds'], n)
+
+
+def _measure(methods: List[str], runs, sizes: Tuple[int, ...], repeats: int,
+             verbose: bool) -> Dict[str, Dict[str, List[float]]]:
+    """Per method {'sizes', 'seconds', 'gap'}; runs(method, n) returns a zero-argument solve."""
+    table = {m: {'sizes': [], 'seconds': [], 'gap': []} for m in methods}
+    for n in sizes:
+        measured = {}
+        for method in methods:
+            if _projected(table[method], n) > SIZE_LIMIT_SECONDS:
+                continue
+            measured[method] = _timed(runs(method, n), repeats)
+        if not measured:
+            break
+        best = max(value for _, value in measured.values())
+        for method, (seconds, value) in measured.items():
+            gap = max(best - value, 0.0) / abs(best) if best else 0.0
+            table[method]['sizes'].append(n)
+            table[method]['seconds'].append(round(seconds, 6))
+            table[method]['gap'].append(round(gap, 6))
+            if verbose:
+                print(f"  {n:>5}  {method:<14} {seconds * 1000:>10.2f} ms   gap {gap:.2e}")
+    return {m: entry for m, entry in table.items() if entry['sizes']}
+
+
+def run(sizes: Tuple[int, ...] = SIZES, repeats: int = REPEATS, verbose: bool = False) -> Dict[str, Any]:
+    """Benchmark every method available here; returns a dispatch calibration table."""
+    calibration: Dict[str, Any] = {
+        'measured_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': f"{platform.machine()}, {os.cpu_count()} CPU, Python {platform.python_version()}",
+        'curves': {},
+        'campaigns': {},
+    }
+
+    for problem_class in CURVE_CLASSES:
+        if verbose:
+            print(f"curves ({problem_class})")
+        problems = {n: synthetic_curves(n, problem_class) for n in sizes}
+        features = dispatch.curve_features(*problems[sizes[0]][::2])
+        methods = [m for m in dispatch.CURVE_METHODS if dispatch.rejection(m, features) is None]
+
+        def curve_run(method: str, n: int, problems=problems):
+            curves, budget, constraints = problems[n]
+            return lambda: dispatch.run_curves(method, curves, budget, constraints)
+        calibration['curves'][problem_class] = _measure(methods, curve_run, sizes, repeats, verbose)
+
+    if verbose:
+        print("campaigns")
+    campaigns = {n: synthetic_campaigns(n) for n in sizes}
+    features = dispatch.campaign_features(campaigns[sizes[0]][0])
+    methods = [m for m in dispatch.CAMPAIGN_METHODS if dispatch.rejection(m, features) is None]
+
+    def campaign_run(method: str, n: int):
+        return lambda: dispatch.run_campaigns(method, *campaigns[n])
+    calibration['campaigns'] = _measure(methods, campaign_run, sizes, repeats, verbose)
+    return calibration
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark BAWT solvers and calibrate dispatch')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='Curves / campaigns per problem')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='Runs per method and size (fastest counts)')
+    parser.add_argument('--write', action='store_true', help=f'Save to {dispatch.CALIBRATION_PATH}')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Optional[Dict[str, Any]]:
+    args = parse_args(argv)
+    calibration = run(tuple(sorted(args.sizes)), max(1, args.repeats), verbose=True)
+    if args.write:
+        with open(dispatch.CALIBRATION_PATH, 'w') as f:
+            json.dump(calibration, f, indent=2)
+        print(f"Calibration written to {dispatch.CALIBRATION_PATH}")
+    else:
+        print(json.dumps(calibration))
+    return calibration
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+BAWT Backend - Caches
+Small thread-safe LRU cache with hit/miss metrics
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from metrics import record_cache
+
+
+class LRUCache:
+    """Least-recently-used cache; lookups are reported as bawt_cache_requests_total{cache=name}."""
+
+    def __init__(self, name: str, maxsize: int = 512):
+        self.name = name
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing and storing it on a miss."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                record_cache(self.name, True)
+                return self._data[key]
+        record_cache(self.name, False)
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
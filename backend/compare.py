@@ -0,0 +1,242 @@
+"""
+BAWT Backend - Scenario Comparison
+Compact diff of saved results: per-curve and per-week deltas, total lifts, biggest movers
+
+A saved result keeps whatever the endpoint that produced it returned: rows
+under 'allocations' or 'curves' (a list, a dict keyed by curve id, or a
+columnar block), flighting 'campaigns' with weekly_spend vectors, or rows in
+the allocations table. scenario_table() reads any of these into per-curve
+spend and response vectors (plus a curves x weeks spend matrix when the rows
+carry one). compare_scenarios() aligns the scenarios on the union of curve
+ids and diffs them against a baseline as scenarios x curves arrays, so the
+response only carries curves that moved somewhere, not the stored blobs.
+"""
+
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+
+ROW_BLOCKS = ('allocations', 'curves', 'campaigns', 'results')
+KEY_FIELDS = ('curve_id', 'id', 'name', 'channel')
+SPEND_FIELDS = ('optimized_spend', 'spend', 'net_spend')
+RESPONSE_FIELDS = ('optimized_response', 'response', 'optimized_value', 'value', 'profit', 'volume')
+WEEKLY_FIELD = 'weekly_spend'
+
+MAX_SCENARIOS = 20
+DEFAULT_TOP = 10
+TOLERANCE = 0.005  # deltas below half a cent are rounding noise
+
+
+def _rows(block: Any) -> List[Dict[str, Any]]:
+    """Row dicts of a stored list, dict keyed by curve id, or columnar block."""
+    if isinstance(block, list):
+        return [row for row in block if isinstance(row, dict)]
+    if not isinstance(block, dict):
+        return []
+    block = block.get('columns', block)
+    values = list(block.values())
+    if values and all(isinstance(v, list) for v in values):
+        return [dict(zip(block.keys(), row)) for row in zip(*values)]
+    return [{'curve_id': key, **row} for key, row in block.items() if isinstance(row, dict)]
+
+
+def _field(rows: List[Dict[str, Any]], candidates: tuple) -> Optional[str]:
+    """First candidate field that any row carries."""
+    for field in candidates:
+        if any(row.get(field) is not None for row in rows):
+            return field
+    return None
+
+
+def _numbers(rows: List[Dict[str, Any]], field: Optional[str]) -> np.ndarray:
+    if field is None:
+        return np.zeros(len(rows))
+    return np.array([float(row.get(field) or 0) for row in rows])
+
+
+def scenario_table(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Per-curve spend and response of one stored result.
+
+    Args:
+        result: {'id', 'data', 'allocations'} as returned by Database.get_results_data
+
+    Returns:
+        {'keys', 'spend', 'response', 'weekly' (curves x weeks or None), 'source', 'spend_field', 'response_field'}
+    """
+    data = result.get('data') or {}
+    rows, source = [], None
+    for block in ROW_BLOCKS:
+        rows = _rows(data.get(block))
+        if rows:
+            source = block
+            break
+    if not rows and result.get('allocations'):
+        rows, source = result['allocations'], 'allocations_table'
+    if not rows:
+        raise ValueError(f"Result {result.get('id')} has no per-curve allocations to compare")
+
+    key_field = _field(rows, KEY_FIELDS)
+    spend_field = _field(rows, SPEND_FIELDS)
+    if key_field is None or spend_field is None:
+        raise ValueError(f"Result {result.get('id')} rows have no curve id or spend")
+    response_field = _field(rows, RESPONSE_FIELDS)
+
+    # Rows sharing a curve id (e.g. one per week or sub-brand) are summed
+    keys, inverse = np.unique([str(row.get(key_field)) for row in rows], return_inverse=True)
+    spend = np.bincount(inverse, weights=_numbers(rows, spend_field), minlength=len(keys))
+    response = np.bincount(inverse, weights=_numbers(rows, response_field), minlength=len(keys))
+
+    weekly = None
+    vectors = [row.get(WEEKLY_FIELD) for row in rows]
+    if any(isinstance(v, list) for v in vectors):
+        n_weeks = max(len(v) for v in vectors if isinstance(v, list))
+        weekly = np.zeros((len(keys), n_weeks))
+        for i, v in enumerate(vectors):
+            if isinstance(v, list) and v:
+                weekly[inverse[i], :len(v)] += np.asarray(v, dtype=float)
+
+    return {
+        'keys': keys.tolist(),
+        'spend': spend,
+        'response': response,
+        'weekly': weekly,
+        'source': source,
+        'spend_field': spend_field,
+        'response_field': response_field,
+    }
+
+
+def _round(values: np.ndarray) -> List[float]:
+    return np.round(values, 2).tolist()
+
+
+def compare_scenarios(
+    results: List[Dict[str, Any]],
+    baseline: Optional[str] = None,
+    top: int = DEFAULT_TOP
+) -> Dict[str, Any]:
+    """
+    Diff two or more stored results against a baseline.
+
+    Args:
+        results: Stored results in display order (see Database.get_results_data)
+        baseline: Id of the result the others are compared to (default: the first)
+        top: Biggest movers listed per scenario
+
+    Returns:
+        {'baseline', 'curve_ids', 'scenarios': [...], 'total_curves', 'unchanged_curves', 'warnings'}
+        where every non-baseline scenario carries curve_spend_delta / curve_response_delta
+        aligned with curve_ids, weekly_spend_delta when both sides have weekly spend,
+        and its biggest movers.
+    """
+    if len(results) < 2:
+        raise ValueError("Select at least two results to compare")
+    if len(results) > MAX_SCENARIOS:
+        raise ValueError(f"At most {MAX_SCENARIOS} results can be compared at once")
+    ids = [r['id'] for r in results]
+    if baseline is None:
+        baseline = ids[0]
+    if baseline not in ids:
+        raise ValueError(f"Baseline {baseline} is not among the compared results")
+    b = ids.index(baseline)
+    top = max(0, int(top))
+
+    tables = [scenario_table(r) for r in results]
+    curve_ids = sorted(set().union(*(t['keys'] for t in tables)))
+    column = {cid: j for j, cid in enumerate(curve_ids)}
+
+    # Scenarios x curves; a curve absent from a scenario has no spend there
+    shape = (len(tables), len(curve_ids))
+    spend, response, present = np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=bool)
+    for s, t in enumerate(tables):
+        cols = np.array([column[k] for k in t['keys']], dtype=np.int64)
+        spend[s, cols] = t['spend']
+        response[s, cols] = t['response']
+        present[s, cols] = True
+
+    spend_delta = spend - spend[b]
+    response_delta = response - response[b]
+    changed = (np.abs(spend_delta) > TOLERANCE) | (np.abs(response_delta) > TOLERANCE) | (present != present[b])
+    moved = changed.any(axis=0)
+
+    total_spend = spend.sum(axis=1)
+    total_response = response.sum(axis=1)
+    base_weekly = tables[b]['weekly']
+
+    scenarios = []
+    for s, (result, t) in enumerate(zip(results, tables)):
+        entry = {
+            'id': result['id'],
+            'name': result.get('name'),
+            'type': result.get('type'),
+            'source': t['source'],
+            'response_field': t['response_field'],
+            'curves': len(t['keys']),
+            'total_spend': round(float(total_spend[s]), 2),
+            'total_response': round(float(total_response[s]), 2),
+            'roi': round(float(total_response[s] / total_spend[s]), 4) if total_spend[s] > 0 else 0,
+        }
+        if s != b:
+            lift = total_response[s] - total_response[b]
+            entry.update({
+                'spend_delta': round(float(total_spend[s] - total_spend[b]), 2),
+                'response_delta': round(float(lift), 2),
+                'response_lift_pct': round(float(lift / abs(total_response[b]) * 100), 1) if total_response[b] else None,
+                'curves_changed': int(changed[s].sum()),
+                'curve_spend_delta': _round(spend_delta[s, moved]),
+                'curve_response_delta': _round(response_delta[s, moved]),
+                'movers': _movers(s, b, curve_ids, changed, spend, spend_delta, response_delta, present, top),
+            })
+            if t['weekly'] is not None and base_weekly is not None:
+                entry['weekly_spend_delta'] = _round(_weekly_totals(t['weekly'], base_weekly))
+        scenarios.append(entry)
+
+    warnings = []
+    if len({t['response_field'] for t in tables}) > 1:
+        warnings.append("Results measure response differently ("
+                        + ', '.join(f"{r['id']}: {t['response_field']}" for r, t in zip(results, tables))
+                        + "); response deltas mix units")
+
+    return {
+        'baseline': baseline,
+        'curve_ids': [cid for cid, m in zip(curve_ids, moved) if m],
+        'scenarios': scenarios,
+        'total_curves': len(curve_ids),
+        'unchanged_curves': int((~moved).sum()),
+        'warnings': warnings,
+    }
+
+
+def _movers(s: int, b: int, curve_ids: List[str], changed: np.ndarray, spend: np.ndarray,
+            spend_delta: np.ndarray, response_delta: np.ndarray, present: np.ndarray,
+            top: int) -> List[Dict[str, Any]]:
+    """Curves of scenario s with the largest response change (then spend change) vs the baseline."""
+    candidates = np.flatnonzero(changed[s])
+    if not top or not len(candidates):
+        return []
+    order = np.lexsort((-np.abs(spend_delta[s, candidates]), -np.abs(response_delta[s, candidates])))
+    movers = []
+    for j in candidates[order[:top]]:
+        status = 'changed'
+        if present[s, j] != present[b, j]:
+            status = 'added' if present[s, j] else 'removed'
+        movers.append({
+            'curve_id': curve_ids[j],
+            'status': status,
+            'spend': round(float(spend[s, j]), 2),
+            'spend_delta': round(float(spend_delta[s, j]), 2),
+            'spend_delta_pct': round(float(spend_delta[s, j] / spend[b, j] * 100), 1) if spend[b, j] else None,
+            'response_delta': round(float(response_delta[s, j]), 2),
+        })
+    return movers
+
+
+def _weekly_totals(weekly: np.ndarray, base: np.ndarray) -> np.ndarray:
+    """Per-week total spend difference, padding the shorter plan with zero weeks."""
+    n_weeks = max(weekly.shape[1], base.shape[1])
+    delta = np.zeros(n_weeks)
+    delta[:weekly.shape[1]] += weekly.sum(axis=0)
+    delta[:base.shape[1]] -= base.sum(axis=0)
+    return delta
@@ -0,0 +1,36 @@
+"""Shared test fixtures and closed-form optima of s = 1 Hill curves"""
+import math
+
+import pytest
+
+import shared
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A two-worker solver pool, shut down after the test."""
+    monkeypatch.setattr(shared, 'POOL_WORKERS', 2)
+    yield
+    shared.shutdown_pool()
+
+
+def hill_optimum(curves, budget=None, target=None):
+    """
+    Closed-form optimum of s = 1 Hill curves top x / (k + x), all of them funded.
+
+    Equal marginal response top k / (k + x)^2 = 1 / u^2 gives k + x = u sqrt(top k),
+    and each curve then earns top - sqrt(top k) / u. A budget fixes
+    u = (budget + sum k) / sum sqrt(top k); a response target fixes
+    u = sum sqrt(top k) / (sum top - target). The budget's price is 1 / u^2 and
+    the target's (spend per unit of response) is u^2.
+
+    Returns (spend per curve, total response, u).
+    """
+    roots = [math.sqrt(c['max_response'] * c['k']) for c in curves]
+    if target is None:
+        u = (budget + sum(c['k'] for c in curves)) / sum(roots)
+    else:
+        u = sum(roots) / (sum(c['max_response'] for c in curves) - target)
+    spends = [u * r - c['k'] for c, r in zip(curves, roots)]
+    response = sum(c['max_response'] - r / u for c, r in zip(curves, roots))
+    return spends, response, u
@@ -0,0 +1,233 @@
+"""
+BAWT Backend - Response Curve Families
+Vectorized evaluation of the curve types stored in response_curves
+
+Every family is a saturating function of normalized spend u = (spend / scale)^shape:
+
+    hill    response = top * u / (1 + u)            param_a=k, param_b=s, param_c=max_response
+    atan    response = top * (2/pi) * atan(u)       param_a=scale, param_b=shape, param_c=max_response
+    scurve  response = top * (1 - exp(-u))          param_a=scale, param_b=shape, param_c=max_response
+    tanh    response = top * tanh(u)                param_a=alpha (top), param_b=beta (scale), param_c=shape (default 1)
+
+Optimizer-style dicts ({id, k, s, max_response}) are treated as hill curves.
+With shape > 1 every family is S-shaped (convex below the knee at spend ~ scale).
+"""
+
+import copy
+import math
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from cache import LRUCache
+
+
+FAMILIES = ('hill', 'atan', 'scurve', 'tanh')
+FAMILY_CODES = {name: code for code, name in enumerate(FAMILIES)}
+
+# Default sampled range, as a multiple of the curve's scale (knee) parameter
+SAMPLE_RANGE_MULTIPLE = 4.0
+DEFAULT_SAMPLE_POINTS = 64
+MAX_SAMPLE_POINTS = 1000
+
+
+def curve_key(curve: Dict[str, Any]) -> Any:
+    """Identifier of a curve: curve_ref for database rows, id for optimizer dicts."""
+    return curve['curve_ref'] if curve.get('curve_ref') is not None else curve.get('id')
+
+
+def curve_parameters(curve: Dict[str, Any]) -> Tuple[str, float, float, float]:
+    """
+    Normalize a curve to (family, scale, shape, top).
+
+    Raises:
+        ValueError: Unknown curve type or missing parameters
+    """
+    if 'k' in curve and 'max_response' in curve:
+        return 'hill', float(curve['k']), float(curve['s']), float(curve['max_response'])
+
+    family = (curve.get('curve_type') or 'hill').lower()
+    a, b, c = curve.get('param_a'), curve.get('param_b'), curve.get('param_c')
+    if family not in FAMILY_CODES:
+        raise ValueError(f"Unknown curve type '{family}' for curve {curve_key(curve)}")
+    if family == 'tanh':
+        if a is None or b is None:
+            raise ValueError(f"Curve {curve_key(curve)} is missing tanh parameters")
+        return family, float(b), float(c) if c is not None else 1.0, float(a)
+    if a is None or b is None or c is None:
+        raise ValueError(f"Curve {curve_key(curve)} is missing {family} parameters")
+    return family, float(a), float(b), float(c)
+
+
+def _shape_terms(spend: np.ndarray, scale: np.ndarray, shape: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """u = (spend/scale)^shape and du/dspend, with spend clipped at zero."""
+    x = np.maximum(spend, 0.0) / scale
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        u = np.power(x, shape)
+        du = shape * np.power(x, shape - 1.0) / scale
+    return u, du
+
+
+def _evaluate(codes: np.ndarray, u: np.ndarray, du: np.ndarray, top: np.ndarray,
+              want_marginal: bool) -> np.ndarray:
+    """Family dispatch on normalized spend (all arrays broadcast together)."""
+    if want_marginal:
+        choices = [
+            1.0 / np.square(1.0 + u),
+            (2.0 / math.pi) / (1.0 + np.square(u)),
+            np.exp(-u),
+            1.0 - np.square(np.tanh(u)),
+        ]
+        with np.errstate(invalid='ignore'):
+            out = top * np.select([codes == i for i in range(len(FAMILIES))], choices) * du
+        # 0 * inf: fully saturated (u = inf) is flat, zero spend with shape < 1 is unbounded
+        return np.where(np.isnan(out), np.where(np.isinf(u), 0.0, np.inf), out)
+    with np.errstate(invalid='ignore'):
+        choices = [
+            u / (1.0 + u),
+            (2.0 / math.pi) * np.arctan(u),
+            1.0 - np.exp(-u),
+            np.tanh(u),
+        ]
+        # u = inf (huge spend) saturates at 1 for every family
+        values = np.select([codes == i for i in range(len(FAMILIES))], choices)
+    return top * np.where(np.isinf(u), 1.0, values)
+
+
+class CurveSet:
+    """
+    Parameters of many curves as aligned arrays, for evaluating response and
+    marginal response of spend arrays shaped (..., n_curves) in one pass.
+    """
+
+    def __init__(self, curves: List[Dict[str, Any]]):
+        self.curves = curves
+        self.ids = [curve_key(c) for c in curves]
+        params = [curve_parameters(c) for c in curves]
+        self.families = [p[0] for p in params]
+        self.codes = np.array([FAMILY_CODES[p[0]] for p in params], dtype=np.int8)
+        self.scale = np.array([p[1] for p in params], dtype=float)
+        self.shape = np.array([p[2] for p in params], dtype=float)
+        self.top = np.array([p[3] for p in params], dtype=float)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def with_parameters(self, scale: Optional[np.ndarray] = None, shape: Optional[np.ndarray] = None,
+                        top: Optional[np.ndarray] = None) -> 'CurveSet':
+        """Copy with replaced parameter arrays, e.g. (samples, n_curves) draws broadcast against spend."""
+        other = copy.copy(self)
+        if scale is not None:
+            other.scale = np.asarray(scale, dtype=float)
+        if shape is not None:
+            other.shape = np.asarray(shape, dtype=float)
+        if top is not None:
+            other.top = np.asarray(top, dtype=float)
+        return other
+
+    def response(self, spend: np.ndarray) -> np.ndarray:
+        """Response for spend shaped (..., n_curves)."""
+        u, du = _shape_terms(np.asarray(spend, dtype=float), self.scale, self.shape)
+        return _evaluate(self.codes, u, du, self.top, want_marginal=False)
+
+    def marginal(self, spend: np.ndarray) -> np.ndarray:
+        """d(response)/d(spend) for spend shaped (..., n_curves)."""
+        u, du = _shape_terms(np.asarray(spend, dtype=float), self.scale, self.shape)
+        return _evaluate(self.codes, u, du, self.top, want_marginal=True)
+
+    def peak_spend(self) -> np.ndarray:
+        """
+        Spend at which each curve's marginal response peaks (0 when shape <= 1).
+
+        S-shaped curves have rising mROI below this point and falling mROI above
+        it. With u = (spend/scale)^shape the peak solves
+        (shape - 1) + shape * u * g''(u) / g'(u) = 0 for the family's g(u).
+        """
+        s = np.maximum(self.shape, 1.0)
+        ratio = (s - 1.0) / (s + 1.0)
+        # tanh: 2 s u tanh(u) = s - 1, with u tanh(u) increasing from 0 to 0.76 on [0, 1]
+        target = (s - 1.0) / (2.0 * s)
+        lo, hi = np.zeros_like(s), np.ones_like(s)
+        for _ in range(50):
+            mid = 0.5 * (lo + hi)
+            below = mid * np.tanh(mid) < target
+            lo, hi = np.where(below, mid, lo), np.where(below, hi, mid)
+        u = np.select(
+            [self.codes == FAMILY_CODES[f] for f in FAMILIES],
+            [ratio, np.sqrt(ratio), (s - 1.0) / s, 0.5 * (lo + hi)]
+        )
+        return np.where(self.shape > 1, self.scale * np.power(u, 1.0 / s), 0.0)
+
+
+def response(curve: Dict[str, Any], spend: np.ndarray) -> np.ndarray:
+    """Response of a single curve at an array of spend levels."""
+    return CurveSet([curve]).response(np.asarray(spend, dtype=float)[..., None])[..., 0]
+
+
+def marginal(curve: Dict[str, Any], spend: np.ndarray) -> np.ndarray:
+    """Marginal response of a single curve at an array of spend levels."""
+    return CurveSet([curve]).marginal(np.asarray(spend, dtype=float)[..., None])[..., 0]
+
+
+# ==========================================
+# ADAPTIVE SAMPLING
+# ==========================================
+
+def adaptive_grid(curve: Dict[str, Any], points: int, max_spend: float) -> np.ndarray:
+    """
+    Spend grid on [0, max_spend] refined where the curve bends most.
+
+    Starting from a coarse uniform grid, each round bisects the intervals whose
+    midpoint deviates most from linear interpolation, so points concentrate
+    around the saturation knee and stay sparse on the flat tail.
+    """
+    points = max(3, min(int(points), MAX_SAMPLE_POINTS))
+    grid = np.linspace(0.0, max_spend, min(9, points))
+    values = response(curve, grid)
+    span = max(float(np.max(values) - np.min(values)), 1e-12)
+
+    while len(grid) < points:
+        mids = 0.5 * (grid[:-1] + grid[1:])
+        mid_values = response(curve, mids)
+        error = np.abs(mid_values - 0.5 * (values[:-1] + values[1:])) / span
+        # Refine at most the worse half per round so points keep concentrating
+        take = min(max(1, len(mids) // 2), points - len(grid))
+        chosen = np.sort(np.argpartition(-error, take - 1)[:take])
+        grid = np.insert(grid, chosen + 1, mids[chosen])
+        values = np.insert(values, chosen + 1, mid_values[chosen])
+    return grid
+
+
+def sample_curve(curve: Dict[str, Any], points: int = DEFAULT_SAMPLE_POINTS,
+                 max_spend: Optional[float] = None) -> Dict[str, Any]:
+    """Sample response, mROI and ROI of a curve over an adaptive spend grid."""
+    family, scale, shape, top = curve_parameters(curve)
+    if max_spend is None or max_spend <= 0:
+        max_spend = scale * SAMPLE_RANGE_MULTIPLE
+    spend = adaptive_grid(curve, points, max_spend)
+    resp = response(curve, spend)
+    mroi = marginal(curve, spend)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi = np.where(spend > 0, resp / spend, 0.0)
+
+    return {
+        'curve_ref': curve_key(curve),
+        'curve_type': family,
+        'version': curve.get('updated_at'),
+        'parameters': {'scale': scale, 'shape': shape, 'max_response': top},
+        'points': len(spend),
+        'spend': np.round(spend, 2).tolist(),
+        'response': np.round(resp, 4).tolist(),
+        'mroi': [round(v, 8) if math.isfinite(v) else None for v in mroi.tolist()],
+        'roi': np.round(roi, 8).tolist(),
+    }
+
+
+_sample_cache = LRUCache('curve_samples', maxsize=1024)
+
+
+def cached_samples(curve: Dict[str, Any], points: int = DEFAULT_SAMPLE_POINTS,
+                   max_spend: Optional[float] = None) -> Dict[str, Any]:
+    """sample_curve() cached per curve version (updated_at and parameters)."""
+    key = (curve_key(curve), curve.get('updated_at'), curve_parameters(curve), int(points), max_spend)
+    return _sample_cache.get_or_compute(key, lambda: sample_curve(curve, points, max_spend))
@@ -6,14 +6,260 @@ SQLite database for storing results and metadata
 import sqlite3
 import json
 import os
+import re
+import time
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 import uuid
 
+from audit import AuditLogger
+from metrics import db_query_duration
+
+
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+NOT\s+EXISTS)?)\s+(\w+)', re.IGNORECASE)
+
+
+def _statement_labels(sql: str) -> Dict[str, str]:
+    """Derive low-cardinality metric labels (operation, table) from a SQL statement."""
+    stripped = sql.lstrip()
+    operation = stripped.split(None, 1)[0].lower() if stripped else 'unknown'
+    match = _TABLE_PATTERN.search(sql)
+    return {'operation': operation, 'table': match.group(1) if match else 'none'}
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records statement execution time in the metrics registry."""
+    
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            db_query_duration.observe(time.perf_counter() - start, **_statement_labels(sql))
+    
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            db_query_duration.observe(time.perf_counter() - start, **_statement_labels(sql))
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors are timed."""
+    
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+
+# ==========================================
+# SCHEMA MIGRATIONS
+# ==========================================
+# Migrations run once each, in order, tracked by PRAGMA user_version.
+# Append new migrations; never edit one that has already shipped.
+
+SCHEMA_V1 = [
+    # Results table
+    '''
+        CREATE TABLE IF NOT EXISTS results (
+            id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            model_id TEXT,
+            curve_type TEXT,
+            time_period TEXT,
+            source TEXT,
+            owner TEXT,
+            status TEXT DEFAULT 'draft',
+            data TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''',
+
+    # Audit log table
+    '''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            result_id TEXT,
+            action TEXT,
+            user TEXT,
+            timestamp TEXT,
+            details TEXT
+        )
+    ''',
+
+    # Optimizer Controls table (matches controls_workspace.csv)
+    '''
+        CREATE TABLE IF NOT EXISTS optimizer_controls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            setting_name TEXT NOT NULL UNIQUE,
+            setting_value TEXT NOT NULL,
+            description TEXT,
+            category TEXT,
+            updated_at TEXT
+        )
+    ''',
+
+    # Response Curves table (matches curves_workspace_internal.csv)
+    '''
+        CREATE TABLE IF NOT EXISTS response_curves (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            curve_ref INTEGER NOT NULL UNIQUE,
+            market TEXT,
+            category TEXT,
+            brand TEXT,
+            sub_brand TEXT,
+            variant TEXT,
+            campaign TEXT,
+            channel TEXT,
+            partner TEXT,
+            buy TEXT,
+            format TEXT,
+            curve_type TEXT DEFAULT 'hill',
+            adstock REAL DEFAULT 0.3,
+            param_a REAL,
+            param_b REAL,
+            param_c REAL,
+            param_d REAL,
+            param_e REAL,
+            param_f REAL,
+            param_g REAL,
+            param_h REAL,
+            param_i REAL,
+            param_j REAL,
+            updated_at TEXT
+        )
+    ''',
+
+    # Weekly Spend table (matches budget_workspace.csv)
+    '''
+        CREATE TABLE IF NOT EXISTS weekly_spend (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            curve_ref INTEGER NOT NULL,
+            week TEXT NOT NULL,
+            spend REAL DEFAULT 0,
+            UNIQUE(curve_ref, week)
+        )
+    ''',
+
+    # Weekly Constraints table (matches constraints_workspace.csv)
+    '''
+        CREATE TABLE IF NOT EXISTS weekly_constraints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            curve_ref INTEGER NOT NULL,
+            constraint_type TEXT NOT NULL CHECK(constraint_type IN ('Min', 'Max', 'Equal')),
+            week TEXT NOT NULL,
+            value REAL DEFAULT 0,
+            UNIQUE(curve_ref, constraint_type, week)
+        )
+    ''',
+
+    # Weekly CPMs table (matches cpm_workspace.csv)
+    '''
+        CREATE TABLE IF NOT EXISTS weekly_cpms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            curve_ref INTEGER NOT NULL,
+            week TEXT NOT NULL,
+            cpm REAL DEFAULT 0,
+            UNIQUE(curve_ref, week)
+        )
+    ''',
+
+    # Weekly Weights table (matches weights_workspace.csv)
+    '''
+        CREATE TABLE IF NOT EXISTS weekly_weights (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            curve_ref INTEGER NOT NULL,
+            week TEXT NOT NULL,
+            weight REAL DEFAULT 1.0,
+            UNIQUE(curve_ref, week)
+        )
+    ''',
+
+    # Hierarchy table (for cascading dropdowns)
+    '''
+        CREATE TABLE IF NOT EXISTS hierarchy (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            market TEXT NOT NULL,
+            brand TEXT NOT NULL,
+            sub_brand TEXT DEFAULT 'All',
+            channel TEXT NOT NULL,
+            is_active INTEGER DEFAULT 1
+        )
+    ''',
+
+    # Allocations table (optimization results)
+    '''
+        CREATE TABLE IF NOT EXISTS allocations (
+            id TEXT PRIMARY KEY,
+            result_id TEXT,
+            curve_ref INTEGER NOT NULL,
+            current_spend REAL NOT NULL,
+            optimized_spend REAL NOT NULL,
+            impressions REAL,
+            response REAL,
+            marginal_roi REAL,
+            roi REAL,
+            incr_volume REAL,
+            brand_lift REAL,
+            created_at TEXT,
+            FOREIGN KEY (result_id) REFERENCES results(id)
+        )
+    '''
+]
+
+SCHEMA_V2 = [
+    # Weekly observed KPI per curve, the target series for curve fitting
+    '''
+        CREATE TABLE IF NOT EXISTS weekly_response (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            curve_ref INTEGER NOT NULL,
+            week TEXT NOT NULL,
+            response REAL DEFAULT 0,
+            UNIQUE(curve_ref, week)
+        )
+    ''',
+
+    # Diagnostics of the latest fit of each curve
+    '''
+        CREATE TABLE IF NOT EXISTS curve_fits (
+            curve_ref INTEGER PRIMARY KEY,
+            curve_type TEXT,
+            adstock REAL,
+            weeks INTEGER,
+            r2 REAL,
+            rmse REAL,
+            iterations INTEGER,
+            converged INTEGER,
+            fitted_at TEXT
+        )
+    ''',
+]
+
+SCHEMA_V3 = [
+    # Standard errors of the fitted param_a / param_b / param_c
+    'ALTER TABLE curve_fits ADD COLUMN param_a_se REAL',
+    'ALTER TABLE curve_fits ADD COLUMN param_b_se REAL',
+    'ALTER TABLE curve_fits ADD COLUMN param_c_se REAL',
+]
+
+MIGRATIONS = [
+    # (version, description, statements)
+    (1, 'Initial schema', SCHEMA_V1),
+    (2, 'Weekly response history and curve fit diagnostics', SCHEMA_V2),
+    (3, 'Standard errors of fitted parameters in curve_fits', SCHEMA_V3),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
 
 class Database:
     """SQLite database manager for BAWT."""
     
+    # Database files already brought to SCHEMA_VERSION by this process
+    _migrated_paths = set()
+    
     def __init__(self, db_path: str = None):
         if db_path is None:
             db_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,176 +269,72 @@ class Database:
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
         self.db_path = db_path
-        self._init_db()
+        self.migrate()
+        # Audit events are written behind the foreground transaction
+        self.audit = AuditLogger(db_path)
     
     def _get_connection(self) -> sqlite3.Connection:
         """Get a database connection."""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, factory=TimedConnection)
         conn.row_factory = sqlite3.Row
         return conn
     
-    def _init_db(self):
-        """Initialize database tables."""
+    def schema_version(self) -> int:
+        """Current PRAGMA user_version of the database file."""
         conn = self._get_connection()
-        cursor = conn.cursor()
+        try:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            conn.close()
+    
+    def migrate(self) -> int:
+        """
+        Apply pending schema migrations.
         
-        # Results table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS results (
-                id TEXT PRIMARY KEY,
-                type TEXT NOT NULL,
-                name TEXT NOT NULL,
-                model_id TEXT,
-                curve_type TEXT,
-                time_period TEXT,
-                source TEXT,
-                owner TEXT,
-                status TEXT DEFAULT 'draft',
-                data TEXT,
-                created_at TEXT,
-                updated_at TEXT
-            )
-        ''')
-        
-        # Audit log table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                result_id TEXT,
-                action TEXT,
-                user TEXT,
-                timestamp TEXT,
-                details TEXT
-            )
-        ''')
-        
-        # Optimizer Controls table (matches controls_workspace.csv)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS optimizer_controls (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                setting_name TEXT NOT NULL UNIQUE,
-                setting_value TEXT NOT NULL,
-                description TEXT,
-                category TEXT,
-                updated_at TEXT
-            )
-        ''')
-        
-        # Response Curves table (matches curves_workspace_internal.csv)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS response_curves (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                curve_ref INTEGER NOT NULL UNIQUE,
-                market TEXT,
-                category TEXT,
-                brand TEXT,
-                sub_brand TEXT,
-                variant TEXT,
-                campaign TEXT,
-                channel TEXT,
-                partner TEXT,
-                buy TEXT,
-                format TEXT,
-                curve_type TEXT DEFAULT 'hill',
-                adstock REAL DEFAULT 0.3,
-                param_a REAL,
-                param_b REAL,
-                param_c REAL,
-                param_d REAL,
-                param_e REAL,
-                param_f REAL,
-                param_g REAL,
-                param_h REAL,
-                param_i REAL,
-                param_j REAL,
-                updated_at TEXT
-            )
-        ''')
-        
-        # Weekly Spend table (matches budget_workspace.csv)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS weekly_spend (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                curve_ref INTEGER NOT NULL,
-                week TEXT NOT NULL,
-                spend REAL DEFAULT 0,
-                UNIQUE(curve_ref, week)
-            )
-        ''')
-        
-        # Weekly Constraints table (matches constraints_workspace.csv)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS weekly_constraints (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                curve_ref INTEGER NOT NULL,
-                constraint_type TEXT NOT NULL CHECK(constraint_type IN ('Min', 'Max', 'Equal')),
-                week TEXT NOT NULL,
-                value REAL DEFAULT 0,
-                UNIQUE(curve_ref, constraint_type, week)
-            )
-        ''')
-        
-        # Weekly CPMs table (matches cpm_workspace.csv)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS weekly_cpms (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                curve_ref INTEGER NOT NULL,
-                week TEXT NOT NULL,
-                cpm REAL DEFAULT 0,
-                UNIQUE(curve_ref, week)
-            )
-        ''')
-        
-        # Weekly Weights table (matches weights_workspace.csv)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS weekly_weights (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                curve_ref INTEGER NOT NULL,
-                week TEXT NOT NULL,
-                weight REAL DEFAULT 1.0,
-                UNIQUE(curve_ref, week)
-            )
-        ''')
-        
-        # Hierarchy table (for cascading dropdowns)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS hierarchy (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                market TEXT NOT NULL,
-                brand TEXT NOT NULL,
-                sub_brand TEXT DEFAULT 'All',
-                channel TEXT NOT NULL,
-                is_active INTEGER DEFAULT 1
-            )
-        ''')
-        
-        # Allocations table (optimization results)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS allocations (
-                id TEXT PRIMARY KEY,
-                result_id TEXT,
-                curve_ref INTEGER NOT NULL,
-                current_spend REAL NOT NULL,
-                optimized_spend REAL NOT NULL,
-                impressions REAL,
-                response REAL,
-                marginal_roi REAL,
-                roi REAL,
-                incr_volume REAL,
-                brand_lift REAL,
-                created_at TEXT,
-                FOREIGN KEY (result_id) REFERENCES results(id)
-            )
-        ''')
+        A current database costs a single PRAGMA read (nothing at all for
+        later instances in the same process). Pending migrations run inside
+        one IMMEDIATE transaction, so concurrently starting workers cannot
+        apply them twice.
         
-        conn.commit()
-        conn.close()
+        Returns:
+            Schema version after migrating
+        """
+        if self.db_path in Database._migrated_paths:
+            return SCHEMA_VERSION
+        
+        conn = self._get_connection()
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < SCHEMA_VERSION:
+                conn.isolation_level = None
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    # Re-read under the write lock: another process may have migrated
+                    version = conn.execute('PRAGMA user_version').fetchone()[0]
+                    for target, description, statements in MIGRATIONS:
+                        if target <= version:
+                            continue
+                        for sql in statements:
+                            conn.execute(sql)
+                        conn.execute(f'PRAGMA user_version = {int(target)}')
+                        version = target
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+        finally:
+            conn.close()
         
-        # Insert sample data if empty
-        self._seed_data()
+        Database._migrated_paths.add(self.db_path)
+        return version
     
-    def _seed_data(self):
-        """Seed initial sample data matching template structures."""
+    def seed(self):
+        """
+        Seed sample data matching template structures.
+        
+        Explicit only (python backend/database.py seed); tables that already
+        contain rows are left untouched.
+        """
         conn = self._get_connection()
         cursor = conn.cursor()
         now = datetime.now().isoformat()
@@ -360,6 +502,15 @@ class Database:
         
         return [dict(row) for row in rows]
     
+    def get_curve(self, curve_ref: int) -> Optional[Dict[str, Any]]:
+        """Get a single response curve by curve_ref."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM response_curves WHERE curve_ref = ?', (curve_ref,))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
     def save_curve(self, curve: Dict[str, Any]) -> int:
         """Save or update a response curve."""
         conn = self._get_connection()
@@ -458,14 +609,25 @@ class Database:
     
     def save_weekly_spend(self, curve_ref: int, week: str, spend: float) -> None:
         """Save or update a weekly spend value."""
+        self.save_weekly_spends([{'curve_ref': curve_ref, 'week': week, 'spend': spend}])
+    
+    def save_weekly_spends(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Bulk upsert weekly spend rows ({curve_ref, week, spend}) in one transaction.
+        
+        Rows are stored as given, zeros included; readers treat a curve-week
+        without a row as zero spend. Returns the number of rows written.
+        """
+        values = [(int(r['curve_ref']), str(r['week']), float(r['spend'] or 0)) for r in rows]
         conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
+        cursor.executemany('''
             INSERT OR REPLACE INTO weekly_spend (curve_ref, week, spend)
             VALUES (?, ?, ?)
-        ''', (curve_ref, week, spend))
+        ''', values)
         conn.commit()
         conn.close()
+        return len(values)
     
     # ==========================================
     # WEEKLY CONSTRAINTS METHODS
@@ -525,6 +687,105 @@ class Database:
         conn.commit()
         conn.close()
     
+    # ==========================================
+    # CURVE FITTING METHODS
+    # ==========================================
+    
+    def get_weekly_response(self, curve_ref: int = None) -> List[Dict[str, Any]]:
+        """Get observed weekly KPI filtered by curve_ref."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        if curve_ref:
+            cursor.execute('SELECT * FROM weekly_response WHERE curve_ref = ? ORDER BY week', (curve_ref,))
+        else:
+            cursor.execute('SELECT * FROM weekly_response ORDER BY curve_ref, week')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+    
+    def save_weekly_responses(self, rows: List[Dict[str, Any]]) -> int:
+        """Bulk upsert observed weekly KPI rows ({curve_ref, week, response}) in one transaction."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO weekly_response (curve_ref, week, response)
+            VALUES (?, ?, ?)
+        ''', [(int(r['curve_ref']), str(r['week']), float(r['response'])) for r in rows])
+        conn.commit()
+        conn.close()
+        return len(rows)
+    
+    def get_fit_history(self, curve_refs: List[int] = None) -> List[Dict[str, Any]]:
+        """Observed KPI with that week's spend, one row per curve and observed week."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        # A week without a spend row had zero spend
+        query = '''
+            SELECT r.curve_ref, r.week, COALESCE(s.spend, 0) AS spend, r.response
+            FROM weekly_response r
+            LEFT JOIN weekly_spend s ON s.curve_ref = r.curve_ref AND s.week = r.week
+        '''
+        params: List[Any] = []
+        if curve_refs:
+            query += f' WHERE r.curve_ref IN ({", ".join("?" * len(curve_refs))})'
+            params.extend(int(ref) for ref in curve_refs)
+        query += ' ORDER BY r.curve_ref, r.week'
+        
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+    
+    def get_curve_fits(self, curve_ref: int = None) -> List[Dict[str, Any]]:
+        """Get fit diagnostics, for one curve or all."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        if curve_ref:
+            cursor.execute('SELECT * FROM curve_fits WHERE curve_ref = ?', (curve_ref,))
+        else:
+            cursor.execute('SELECT * FROM curve_fits ORDER BY curve_ref')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+    
+    def save_curve_fits(self, fits: List[Dict[str, Any]]) -> int:
+        """
+        Bulk write fitted parameters to response_curves, and diagnostics and
+        parameter standard errors (param_a_se..param_c_se) to curve_fits.
+        
+        Both statements run as executemany in a single transaction, so a refit
+        of the whole model is all-or-nothing. param_d..param_j are left as they are.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        now = datetime.now().isoformat()
+        try:
+            cursor.executemany('''
+                UPDATE response_curves
+                SET curve_type = ?, adstock = ?, param_a = ?, param_b = ?, param_c = ?, updated_at = ?
+                WHERE curve_ref = ?
+            ''', [(f['curve_type'], f['adstock'], f['param_a'], f['param_b'], f['param_c'],
+                   now, int(f['curve_ref'])) for f in fits])
+            cursor.executemany('''
+                INSERT OR REPLACE INTO curve_fits (curve_ref, curve_type, adstock, weeks, r2, rmse, iterations, converged,
+                                                   param_a_se, param_b_se, param_c_se, fitted_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(int(f['curve_ref']), f['curve_type'], f['adstock'], f['weeks'], f['r2'], f['rmse'],
+                   f['iterations'], int(bool(f['converged'])),
+                   f.get('param_a_se'), f.get('param_b_se'), f.get('param_c_se'), now) for f in fits])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return len(fits)
+    
     # ==========================================
     # HIERARCHY METHODS
     # ==========================================
@@ -629,6 +890,47 @@ class Database:
             }
         return None
     
+    def get_results_data(self, result_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Name, type, stored data and allocation rows of several results, for comparing them.
+        
+        Returns:
+            Dict of result id -> {'id', 'name', 'type', 'data', 'allocations'}; missing ids are absent
+        """
+        if not result_ids:
+            return {}
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(result_ids))
+        
+        cursor.execute(f'SELECT id, name, type, data FROM results WHERE id IN ({placeholders})', list(result_ids))
+        results = {}
+        for row in cursor.fetchall():
+            results[row['id']] = {
+                "id": row['id'],
+                "name": row['name'],
+                "type": row['type'],
+                "data": json.loads(row['data']) if row['data'] else {},
+                "allocations": []
+            }
+        
+        cursor.execute(f'''
+            SELECT result_id, curve_ref, current_spend, optimized_spend, response
+            FROM allocations WHERE result_id IN ({placeholders})
+            ORDER BY result_id, curve_ref
+        ''', list(result_ids))
+        for row in cursor.fetchall():
+            if row['result_id'] in results:
+                results[row['result_id']]['allocations'].append({
+                    "curve_id": row['curve_ref'],
+                    "current_spend": row['current_spend'],
+                    "optimized_spend": row['optimized_spend'],
+                    "response": row['response']
+                })
+        
+        conn.close()
+        return results
+    
     def save_result(self, result: Dict[str, Any]) -> str:
         """Save a new result."""
         conn = self._get_connection()
@@ -655,15 +957,11 @@ class Database:
             now
         ))
         
-        # Log audit
-        cursor.execute('''
-            INSERT INTO audit_log (result_id, action, user, timestamp, details)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (result_id, 'save', result.get('owner', 'User'), now, 'Result saved'))
-        
         conn.commit()
         conn.close()
         
+        self.audit.log(result_id, 'save', result.get('owner', 'User'), 'Result saved', timestamp=now)
+        
         return result_id
     
     def delete_result(self, result_id: str) -> bool:
@@ -674,20 +972,17 @@ class Database:
         cursor.execute('DELETE FROM results WHERE id = ?', (result_id,))
         deleted = cursor.rowcount > 0
         
-        if deleted:
-            now = datetime.now().isoformat()
-            cursor.execute('''
-                INSERT INTO audit_log (result_id, action, user, timestamp, details)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (result_id, 'delete', 'User', now, 'Result deleted'))
-        
         conn.commit()
         conn.close()
         
+        if deleted:
+            self.audit.log(result_id, 'delete', 'User', 'Result deleted')
+        
         return deleted
     
     def get_audit_log(self, result_id: str = None) -> List[Dict[str, Any]]:
-        """Get audit log entries."""
+        """Get audit log entries, including events still queued by this process."""
+        self.audit.flush()
         conn = self._get_connection()
         cursor = conn.cursor()
         
@@ -711,3 +1006,22 @@ class Database:
         
         conn.close()
         return logs
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='BAWT database management')
+    parser.add_argument('command', choices=['migrate', 'seed', 'version'],
+                        help='migrate: apply pending migrations; seed: migrate and load sample data; version: print schema version')
+    parser.add_argument('--db', default=None, help='Path to the SQLite file (default: backend/data/bawt.db)')
+    args = parser.parse_args()
+    
+    db = Database(args.db)
+    if args.command == 'seed':
+        db.seed()
+        print(f"Seeded sample data into {db.db_path}")
+    elif args.command == 'migrate':
+        print(f"{db.db_path} is at schema version {db.schema_version()}")
+    else:
+        print(db.schema_version())
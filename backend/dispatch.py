@@ -0,0 +1,456 @@
+"""
+BAWT Backend - Solver Dispatch
+Choosing the fastest solver that is valid for an allocation problem
+
+Callers used to pick a solver by endpoint or algorithm string. dispatch reads
+the problem's structure instead (number of curves, curve families and whether
+any is S-shaped, bounds, group constraints, objective and KPI, weekly
+campaigns and flighting rules), rules out the methods that cannot solve it,
+and runs the remaining one with the lowest estimated time:
+
+    curves     mroi        MMMOptimizer mROI shuffle (the only minimize_spend / incr_volume solver)
+               segments    groups.optimize_grouped, piecewise-linear model (the only group-constraint solver)
+               portfolio   portfolio.optimize_portfolio, dual decomposition
+               multistart  multistart.multistart, local solves from many starts
+    campaigns  flighting   flighting.optimize_flighting (weekly plans with burst rules)
+               nlopt:*     NLoptOptimizer with SLSQP, MMA or COBYLA
+               scipy:SLSQP NLoptOptimizer's SciPy fallback
+
+Estimates come from a calibration table written by benchmark.py, which runs
+every method on the same synthetic problems at several sizes and records
+each method's time and its shortfall against the best response found.
+Speed only counts among methods whose benchmark response was within
+DEFAULT_GAP of the best; otherwise the most accurate method is used.
+Uncalibrated methods are tried in FALLBACK_ORDER. Each result reports the
+chosen method, the reason, the features read and every candidate's
+estimate.
+
+Methods that can use the solver pool (portfolio, multistart) run here with
+workers=1, in-process, as they did when the built-in table was measured on
+one CPU; the estimates would not hold for a request's own worker count.
+"""
+
+import json
+import math
+import os
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from curves import CurveSet
+from flighting import optimize_flighting
+from groups import optimize_grouped
+from multistart import HAS_SCIPY, lookup, multistart
+from nlopt_optimizer import HAS_NLOPT, NLoptOptimizer
+from optimizer import optimizer
+from portfolio import optimize_portfolio
+
+
+CURVE_METHODS = ('segments', 'portfolio', 'multistart', 'mroi')
+# Annual spend per campaign (NLoptOptimizer), as chosen from by algorithm 'auto'
+NLOPT_METHODS = ('nlopt:SLSQP', 'nlopt:MMA', 'nlopt:COBYLA', 'nlopt:AUGLAG', 'nlopt:BOBYQA', 'scipy:SLSQP')
+CAMPAIGN_METHODS = ('flighting',) + NLOPT_METHODS
+FLIGHTING_FIELDS = ('min_weekly_spend', 'min_run_weeks', 'max_weekly_spend')
+
+# Uncalibrated methods, most dependable first
+FALLBACK_ORDER = ('segments', 'multistart', 'portfolio', 'mroi',
+                  'flighting', 'nlopt:SLSQP', 'scipy:SLSQP', 'nlopt:MMA', 'nlopt:COBYLA')
+
+DEFAULT_GAP = 1e-3  # benchmark response shortfall vs the best method that still counts as optimal
+
+CALIBRATION_PATH = os.environ.get('BAWT_SOLVER_CALIBRATION',
+                                  os.path.join(os.path.dirname(__file__), 'data', 'solver_calibration.json'))
+
+# Measured with `python benchmark.py`; a calibration file written by
+# benchmark.py --write on the serving machine takes precedence
+DEFAULT_CALIBRATION = {
+    'measured_at': '2026-10-19T19:02:17',
+    'machine': 'x86_64, 1 CPU, Python 3.11.7',
+    'curves': {
+        'concave': {
+            'segments': {'sizes': [5, 20, 60, 200, 600],
+                         'seconds': [0.001002, 0.003082, 0.006434, 0.010324, 0.06093],
+                         'gap': [0.0, 0.0, 0.0, 0.0, 0.0]},
+            'portfolio': {'sizes': [5, 20, 60, 200, 600],
+                          'seconds': [0.013037, 0.032575, 0.03061, 0.033643, 0.095114],
+                          'gap': [0.0, 0.0, 0.0, 0.0, 0.0]},
+            'multistart': {'sizes': [5, 20, 60, 200, 600],
+                           'seconds': [0.078488, 0.374026, 1.411252, 3.413071, 54.885817],
+                           'gap': [0.0, 0.0, 0.0, 5e-06, 0.000351]},
+            'mroi': {'sizes': [5, 20, 60, 200, 600],
+                     'seconds': [0.000517, 0.002622, 0.005615, 0.021341, 0.039774],
+                     'gap': [2.6e-05, 0.016117, 0.03621, 0.064987, 0.082345]},
+        },
+        's_shaped': {
+            'segments': {'sizes': [5, 20, 60, 200, 600],
+                         'seconds': [0.001112, 0.002146, 0.004763, 0.01304, 0.036729],
+                         'gap': [0.007493, 0.0, 0.0, 0.0, 0.0]},
+            'portfolio': {'sizes': [5, 20, 60, 200, 600],
+                          'seconds': [0.012206, 0.042358, 0.053399, 0.040331, 0.062902],
+                          'gap': [0.004337, 0.017302, 0.015463, 0.011317, 0.011913]},
+            'multistart': {'sizes': [5, 20, 60, 200],
+                           'seconds': [0.038213, 0.087423, 0.58166, 2.586491],
+                           'gap': [0.0, 0.005597, 0.005567, 0.070488]},
+            'mroi': {'sizes': [5, 20, 60, 200, 600],
+                     'seconds': [0.00019, 0.001473, 0.003836, 0.012401, 0.034656],
+                     'gap': [0.004339, 0.208208, 0.265766, 0.338754, 0.375535]},
+        },
+    },
+    'campaigns': {
+        'nlopt:SLSQP': {'sizes': [5, 20, 60, 200],
+                        'seconds': [0.000596, 0.003263, 0.041991, 2.062916],
+                        'gap': [0.00053, 0.000123, 0.000973, 0.000855]},
+        'nlopt:MMA': {'sizes': [5, 20, 60, 200, 600],
+                      'seconds': [0.0005, 0.001236, 0.00556, 0.021809, 0.05587],
+                      'gap': [0.0, 0.0, 0.0, 0.0, 0.0]},
+        'nlopt:COBYLA': {'sizes': [5, 20, 60],
+                         'seconds': [0.000943, 0.102795, 2.050103],
+                         'gap': [1e-06, 0.000932, 0.001589]},
+        'scipy:SLSQP': {'sizes': [5, 20, 60, 200, 600],
+                        'seconds': [0.010067, 0.039489, 0.196896, 1.131188, 16.777817],
+                        'gap': [0.0, 0.0, 0.0, 0.0, 0.0]},
+    },
+}
+
+_calibration: Optional[Dict[str, Any]] = None
+
+
+# ==========================================
+# CALIBRATION
+# ==========================================
+
+def calibration() -> Dict[str, Any]:
+    """Benchmark calibration: CALIBRATION_PATH if present, else the built-in table."""
+    global _calibration
+    if _calibration is None:
+        table = dict(DEFAULT_CALIBRATION, source='defaults')
+        if os.path.exists(CALIBRATION_PATH):
+            with open(CALIBRATION_PATH) as f:
+                table = dict(json.load(f), source=CALIBRATION_PATH)
+        _calibration = table
+    return _calibration
+
+
+def reload_calibration() -> Dict[str, Any]:
+    """Forget the loaded calibration (e.g. after benchmark.py --write)."""
+    global _calibration
+    _calibration = None
+    return calibration()
+
+
+def _interpolate(sizes: List[float], values: List[float], n: int) -> float:
+    """Log-log interpolation in problem size, extrapolated along the last measured slope."""
+    if len(sizes) == 1 or n <= sizes[0]:
+        return float(values[0])
+    x = np.log(sizes)
+    y = np.log(np.maximum(values, 1e-9))
+    if n <= sizes[-1]:
+        return float(np.exp(np.interp(math.log(n), x, y)))
+    slope = max((y[-1] - y[-2]) / (x[-1] - x[-2]), 0.0)
+    return float(np.exp(y[-1] + slope * (math.log(n) - x[-1])))
+
+
+def estimate(kind: str, problem_class: Optional[str], method: str, n: int) -> Optional[Tuple[float, float]]:
+    """
+    (estimated seconds, benchmark gap) of method on a problem of n curves or
+    campaigns, or None if the method has not been benchmarked.
+
+    The gap is the worse of the two measured sizes around n (the nearest one
+    outside the measured range).
+    """
+    table = calibration().get(kind, {})
+    if problem_class is not None:
+        table = table.get(problem_class, {})
+    entry = table.get(method)
+    if not entry or not entry.get('sizes'):
+        return None
+    sizes, gaps = entry['sizes'], entry['gap']
+    above = min(int(np.searchsorted(sizes, n)), len(sizes) - 1)
+    below = above if sizes[above] == n or above == 0 or n > sizes[above] else above - 1
+    return _interpolate(sizes, entry['seconds'], max(n, 1)), float(max(gaps[below], gaps[above]))
+
+
+# ==========================================
+# PROBLEM FEATURES
+# ==========================================
+
+def curve_features(
+    curves: List[Dict[str, Any]],
+    constraints: Optional[Dict[Any, Dict[str, float]]] = None,
+    groups: Optional[List[Dict[str, Any]]] = None,
+    objective: str = 'maximize_response',
+    kpi: str = 'response'
+) -> Dict[str, Any]:
+    """Structure of a curve allocation problem, as read by choose()."""
+    curve_set = CurveSet(curves)
+    s_shaped = int(np.sum(curve_set.shape > 1))
+    bounds = [lookup(constraints, cid) or {} for cid in curve_set.ids]
+    families: Dict[str, int] = {}
+    for family in curve_set.families:
+        families[family] = families.get(family, 0) + 1
+    return {
+        'kind': 'curves',
+        'size': len(curve_set),
+        'problem_class': 's_shaped' if s_shaped else 'concave',
+        'families': families,
+        's_shaped': s_shaped,
+        # MMMOptimizer reads {id, k, s, max_response} dicts only
+        'optimizer_curves': all('k' in c and 'max_response' in c for c in curves),
+        'bounded': sum(1 for b in bounds if float(b.get('min', 0) or 0) > 0 or b.get('max') is not None),
+        'groups': len(groups or []),
+        'partitions': len({(c.get('market'), c.get('brand')) for c in curves}),
+        'objective': objective,
+        'kpi': kpi,
+    }
+
+
+def campaign_features(campaigns: List[Dict[str, Any]], flighting: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Structure of a campaign (tanh, weekly seasonality) allocation problem."""
+    weeks = 0
+    for camp in campaigns:
+        if 'C' in camp:
+            weeks += int(np.sum(np.asarray(camp['C'], dtype=float) == 1))
+        else:
+            weeks += sum(1 for i in range(1, 53) if str(camp.get(f'C{i}', 1)) == '1')
+    rules = flighting is not None or any(camp.get(field) is not None
+                                         for camp in campaigns for field in FLIGHTING_FIELDS)
+    return {
+        'kind': 'campaigns',
+        'size': len(campaigns),
+        'problem_class': None,
+        'considered_weeks': weeks,
+        's_shaped': sum(1 for camp in campaigns if float(camp.get('beta', 1.0)) > 1),
+        'bounded': sum(1 for camp in campaigns if float(camp.get('spend_min', 0) or 0) > 0),
+        'flighting': rules,
+    }
+
+
+def rejection(method: str, features: Dict[str, Any]) -> Optional[str]:
+    """Why method cannot solve the problem described by features (None if it can)."""
+    if features['kind'] == 'curves':
+        if method not in CURVE_METHODS:
+            return 'not a curve allocation method'
+        if method == 'mroi':
+            if not features['optimizer_curves']:
+                return 'needs hill curves given as {id, k, s, max_response}'
+            if features['groups']:
+                return 'does not support group constraints'
+            return None
+        if features['objective'] != 'maximize_response':
+            return f"does not support the {features['objective']} objective"
+        if features['kpi'] != 'response':
+            return f"does not support the {features['kpi']} KPI"
+        if method == 'segments':
+            return 'group constraints require SciPy' if features['groups'] and not HAS_SCIPY else None
+        if features['groups']:
+            return 'does not support group constraints'
+        return None
+
+    if method not in CAMPAIGN_METHODS:
+        return 'not a campaign allocation method'
+    if method == 'flighting':
+        return None if features['flighting'] else 'plans weekly flights; the request sets no flighting rules'
+    if features['flighting']:
+        return 'optimizes annual spend and ignores flighting rules'
+    if method == 'scipy:SLSQP':
+        return None if HAS_SCIPY else 'SciPy is not installed'
+    if not HAS_NLOPT:
+        return 'NLopt is not installed'
+    if method == 'nlopt:BOBYQA':
+        return 'supports bound constraints only, not the budget constraint'
+    if method == 'nlopt:AUGLAG':
+        return 'needs a subsidiary local optimizer, which NLoptOptimizer does not set'
+    return None
+
+
+# ==========================================
+# DISPATCH
+# ==========================================
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def choose(features: Dict[str, Any], method: Optional[str] = None, gap: float = DEFAULT_GAP,
+           methods: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    """
+    Pick the method to run.
+
+    Args:
+        features: curve_features() or campaign_features()
+        method: Run this method (after checking it can solve the problem)
+        gap: Largest benchmark shortfall vs the best method that counts as optimal
+        methods: Candidates (default: every method of the problem's kind)
+
+    Returns:
+        {'method', 'reason', 'features', 'candidates', 'gap', 'calibration'}
+    """
+    kind = features['kind']
+    n = features['size']
+    methods = methods or (CURVE_METHODS if kind == 'curves' else CAMPAIGN_METHODS)
+
+    candidates = []
+    for name in methods:
+        rejected = rejection(name, features)
+        estimated = estimate(kind, features['problem_class'], name, n) if rejected is None else None
+        candidates.append({
+            'method': name,
+            'valid': rejected is None,
+            'rejected': rejected,
+            'estimated_ms': _ms(estimated[0]) if estimated else None,
+            'benchmark_gap': round(estimated[1], 6) if estimated else None,
+        })
+    valid = [c for c in candidates if c['valid']]
+    if not valid:
+        raise ValueError("No solver can handle this problem: "
+                         + '; '.join(f"{c['method']} {c['rejected']}" for c in candidates))
+
+    size = f"{n} {'curves' if kind == 'curves' else 'campaigns'}"
+    if features.get('problem_class'):
+        size = f"{n} {features['problem_class'].replace('_', '-')} curves"
+    if method is not None:
+        chosen = next((c for c in candidates if c['method'] == method), None)
+        if chosen is None:
+            raise ValueError(f"Unknown method '{method}', expected one of {', '.join(methods)}")
+        if not chosen['valid']:
+            raise ValueError(f"Method '{method}' {chosen['rejected']}")
+        reason = 'requested'
+    elif len(valid) == 1:
+        chosen = valid[0]
+        rejected = '; '.join(f"{c['method']} {c['rejected']}" for c in candidates if not c['valid'])
+        reason = f"only valid method ({rejected})"
+    else:
+        calibrated = [c for c in valid if c['estimated_ms'] is not None]
+        optimal = [c for c in calibrated if c['benchmark_gap'] <= gap]
+        if optimal:
+            chosen = min(optimal, key=lambda c: c['estimated_ms'])
+            others = sorted((c for c in optimal if c is not chosen), key=lambda c: c['estimated_ms'])
+            within = f"within {gap:.2%} of the best benchmark response for {size}"
+            if others:
+                reason = (f"fastest of {len(optimal)} methods {within} (est. {chosen['estimated_ms']} ms "
+                          f"vs {others[0]['method']} {others[0]['estimated_ms']} ms)")
+            else:
+                reason = f"only method {within} (est. {chosen['estimated_ms']} ms)"
+        elif calibrated:
+            chosen = min(calibrated, key=lambda c: (c['benchmark_gap'], c['estimated_ms']))
+            reason = (f"no method came within {gap:.2%} of the best benchmark response for {size}; "
+                      f"smallest shortfall ({chosen['benchmark_gap']:.2%})")
+        else:
+            chosen = min(valid, key=lambda c: FALLBACK_ORDER.index(c['method'])
+                         if c['method'] in FALLBACK_ORDER else len(FALLBACK_ORDER))
+            reason = 'no benchmark calibration for the valid methods; default preference order'
+
+    table = calibration()
+    return {
+        'method': chosen['method'],
+        'reason': reason,
+        'features': features,
+        'candidates': candidates,
+        'gap': gap,
+        'calibration': {'source': table['source'], 'measured_at': table.get('measured_at')},
+    }
+
+
+def run_curves(
+    method: str,
+    curves: List[Dict[str, Any]],
+    total_budget: float,
+    constraints: Optional[Dict[Any, Dict[str, float]]] = None,
+    groups: Optional[List[Dict[str, Any]]] = None,
+    current_allocations: Optional[Dict[Any, float]] = None,
+    objective: str = 'maximize_response',
+    target: Optional[float] = None,
+    kpi: str = 'response'
+) -> Dict[str, Any]:
+    """Run one curve allocation method with its default settings."""
+    if method == 'mroi':
+        if not current_allocations:
+            current_allocations = {c['id']: total_budget / len(curves) for c in curves}
+        # MMMOptimizer fills in default bounds in place
+        bounds = {cid: dict(b) for cid, b in (constraints or {}).items()}
+        return optimizer.optimize(curves=curves, current_allocations=current_allocations,
+                                  total_budget=total_budget, constraints=bounds, objective=objective,
+                                  target=target, kpi=kpi)
+    if method == 'segments':
+        return optimize_grouped(curves, total_budget, constraints, groups, current_allocations)
+    if method == 'portfolio':
+        return optimize_portfolio(curves, total_budget, constraints, current_allocations, workers=1)
+    if method == 'multistart':
+        return multistart(curves, total_budget, constraints, current_allocations, workers=1)
+    raise ValueError(f"Unknown curve method '{method}'")
+
+
+def run_campaigns(
+    method: str,
+    campaigns: List[Dict[str, Any]],
+    total_budget: float,
+    flighting: Optional[Dict[str, Any]] = None,
+    options: Optional[Dict[str, float]] = None,
+    trace: bool = False,
+    sensitivity: bool = False
+) -> Dict[str, Any]:
+    """Run one campaign allocation method."""
+    if method == 'flighting':
+        return optimize_flighting(campaigns, total_budget, flighting, trace)
+    library, _, algorithm = method.partition(':')
+    if library not in ('nlopt', 'scipy') or not algorithm:
+        raise ValueError(f"Unknown campaign method '{method}'")
+    solver = NLoptOptimizer(campaigns, total_budget, algorithm, options, trace, sensitivity)
+    return solver.optimize_nlopt() if library == 'nlopt' else solver.optimize_scipy()
+
+
+def optimize_curves(
+    curves: List[Dict[str, Any]],
+    total_budget: float,
+    constraints: Optional[Dict[Any, Dict[str, float]]] = None,
+    groups: Optional[List[Dict[str, Any]]] = None,
+    current_allocations: Optional[Dict[Any, float]] = None,
+    objective: str = 'maximize_response',
+    target: Optional[float] = None,
+    kpi: str = 'response',
+    method: Optional[str] = None,
+    gap: float = DEFAULT_GAP
+) -> Dict[str, Any]:
+    """
+    Allocate a budget over response curves with the fastest valid method.
+
+    Returns:
+        The method's result, with summary['dispatch'] from choose() plus elapsed_ms
+    """
+    if not curves:
+        raise ValueError("No curves to optimize")
+    started = time.perf_counter()
+    decision = choose(curve_features(curves, constraints, groups, objective, kpi), method, gap)
+    result = run_curves(decision['method'], curves, total_budget, constraints, groups,
+                        current_allocations, objective, target, kpi)
+    decision['elapsed_ms'] = _ms(time.perf_counter() - started)
+    result['summary']['dispatch'] = decision
+    return result
+
+
+def optimize_campaigns(
+    campaigns: List[Dict[str, Any]],
+    total_budget: float,
+    flighting: Optional[Dict[str, Any]] = None,
+    options: Optional[Dict[str, float]] = None,
+    trace: bool = False,
+    sensitivity: bool = False,
+    method: Optional[str] = None,
+    gap: float = DEFAULT_GAP,
+    methods: Optional[Tuple[str, ...]] = None
+) -> Dict[str, Any]:
+    """
+    Allocate a budget over tanh campaigns with the fastest valid method.
+
+    Returns:
+        The method's results, with results['dispatch'] from choose() plus elapsed_ms
+    """
+    if not campaigns:
+        raise ValueError("No campaign data provided")
+    started = time.perf_counter()
+    decision = choose(campaign_features(campaigns, flighting), method, gap, methods)
+    results = run_campaigns(decision['method'], campaigns, total_budget, flighting, options, trace, sensitivity)
+    decision['elapsed_ms'] = _ms(time.perf_counter() - started)
+    results['dispatch'] = decision
+    return results
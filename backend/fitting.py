@@ -0,0 +1,383 @@
+"""
+BAWT Backend - Curve Fitting
+Batch least-squares fitting of response curves to weekly spend and KPI history
+
+Each curve's weekly spend x_t is carried over with geometric adstock,
+a_t = x_t + rate * a_{t-1}, and the observed KPI is modelled as
+
+    y_t = top * f((a_t / scale)^shape)
+
+for the curve's family f (see curves.FAMILIES). For fixed scale and shape the
+model is linear in top, so top is solved in closed form (variable projection)
+and only (log scale, log shape) are searched, by Levenberg-Marquardt with
+2x2 normal equations. Every curve and every candidate adstock rate is fitted
+at once as one (rates x weeks x curves) array; the best rate per curve wins.
+
+Fitted scale is stored in steady-state weekly spend units (a constant weekly
+spend x adstocks to x / (1 - rate)), so the curves stay directly usable by the
+optimizers; the rate itself goes to response_curves.adstock. Fit diagnostics
+and the standard errors of the stored parameters (param_a_se / param_b_se /
+param_c_se, see the uncertainty module) go to curve_fits.
+"""
+
+import math
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from curves import FAMILIES, CurveSet
+import shared
+from shared import SharedPayload, load
+from uncertainty import PARAMETER_COLUMNS, STANDARD_ERROR_COLUMNS
+
+
+ADSTOCK_GRID = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8)
+SHAPE_BOUNDS = (0.3, 5.0)
+SCALE_BOUNDS = (1e-3, 1e2)  # multiples of each curve's largest adstocked spend
+MIN_WEEKS = 8
+DEFAULT_MAX_ITERATIONS = 100
+CURVES_PER_WORKER = 50  # below this, a worker process costs more than it saves
+
+# Starting (scale multiple of median adstocked spend, shape) pairs tried before LM
+_STARTS = [(m, s) for m in (0.3, 1.0, 3.0) for s in (0.7, 1.0, 2.0)]
+
+
+def adstock(spend: np.ndarray, rates: np.ndarray) -> np.ndarray:
+    """Geometric carryover of spend (weeks x curves) for every rate: (rates x weeks x curves)."""
+    out = np.empty((len(rates),) + spend.shape)
+    carry = np.zeros((len(rates), spend.shape[1]))
+    rates = np.asarray(rates, dtype=float)[:, None]
+    for t in range(spend.shape[0]):
+        carry = spend[t] + rates * carry
+        out[:, t] = carry
+    return out
+
+
+class FamilyFit:
+    """Variable-projection least squares of one family over many curves and adstock rates."""
+
+    def __init__(self, family: str, carried: np.ndarray, observed: np.ndarray, mask: np.ndarray):
+        self.carried = carried  # rates x weeks x curves
+        self.observed = observed  # weeks x curves
+        self.mask = mask  # weeks x curves, 1 where the week is observed
+        n = observed.shape[1]
+        template = {'curve_type': family, 'param_a': 1.0, 'param_b': 1.0, 'param_c': 1.0}
+        self.curve_set = CurveSet([dict(template, curve_ref=i) for i in range(n)])
+        reach = np.max(carried, axis=1)  # rates x curves
+        reach = np.where(reach > 0, reach, 1.0)
+        self.log_bounds = (
+            np.stack([np.log(reach * SCALE_BOUNDS[0]), np.full_like(reach, math.log(SHAPE_BOUNDS[0]))], axis=-1),
+            np.stack([np.log(reach * SCALE_BOUNDS[1]), np.full_like(reach, math.log(SHAPE_BOUNDS[1]))], axis=-1),
+        )
+        positive = np.where(carried > 0, carried, np.nan)
+        with np.errstate(all='ignore'):
+            self.typical = np.nan_to_num(np.nanmedian(positive, axis=1), nan=1.0)
+
+    def basis(self, params: np.ndarray) -> np.ndarray:
+        """Unit-top response f((a/scale)^shape) for log params (rates x curves x 2)."""
+        scale = np.exp(params[..., 0])[:, None, :]
+        shape = np.exp(params[..., 1])[:, None, :]
+        return self.curve_set.with_parameters(scale=scale, shape=shape, top=1.0).response(self.carried)
+
+    def project(self, basis: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Least-squares top (clipped at 0) and masked residuals for a basis."""
+        gy = np.sum(self.mask * basis * self.observed, axis=1)
+        gg = np.sum(self.mask * basis * basis, axis=1)
+        top = np.maximum(np.where(gg > 0, gy / np.where(gg > 0, gg, 1.0), 0.0), 0.0)
+        return top, self.mask * (self.observed - top[:, None, :] * basis)
+
+    def residuals(self, params: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        top, resid = self.project(self.basis(params))
+        return top, resid, np.sum(resid * resid, axis=1)
+
+    def start(self) -> np.ndarray:
+        """Best of a small grid of (scale, shape) starts, per rate and curve."""
+        best, best_sse = None, None
+        for multiple, shape in _STARTS:
+            params = np.stack([np.log(self.typical * multiple), np.full_like(self.typical, math.log(shape))], axis=-1)
+            params = np.clip(params, *self.log_bounds)
+            _, _, sse = self.residuals(params)
+            if best is None:
+                best, best_sse = params, sse
+            else:
+                better = sse < best_sse
+                best = np.where(better[..., None], params, best)
+                best_sse = np.where(better, sse, best_sse)
+        return best
+
+    def solve(self, max_iterations: int = DEFAULT_MAX_ITERATIONS) -> Dict[str, np.ndarray]:
+        params = self.start()
+        top, resid, sse = self.residuals(params)
+        damping = np.full(sse.shape, 1e-3)
+        active = np.ones(sse.shape, dtype=bool)
+        iterations = np.zeros(sse.shape, dtype=int)
+        step = 1e-6
+        for _ in range(max_iterations):
+            if not active.any():
+                break
+            # Forward-difference Jacobian of the projected residuals: rates x weeks x curves x 2
+            jac = np.stack([
+                (self.residuals(params + step * np.eye(2)[k])[1] - resid) / step for k in range(2)
+            ], axis=-1)
+            jtj = np.einsum('rtci,rtcj->rcij', jac, jac)
+            jtr = np.einsum('rtci,rtc->rci', jac, resid)
+            # Solve (JtJ + damping * diag(JtJ)) delta = -Jtr in closed form (2x2)
+            a = jtj[..., 0, 0] * (1 + damping)
+            d = jtj[..., 1, 1] * (1 + damping)
+            b = jtj[..., 0, 1]
+            det = a * d - b * b
+            det = np.where(np.abs(det) > 1e-300, det, 1e-300)
+            delta = np.stack([-(d * jtr[..., 0] - b * jtr[..., 1]) / det,
+                              -(a * jtr[..., 1] - b * jtr[..., 0]) / det], axis=-1)
+            candidate = np.clip(params + np.where(active[..., None], delta, 0.0), *self.log_bounds)
+            new_top, new_resid, new_sse = self.residuals(candidate)
+            improved = active & (new_sse < sse)
+            iterations += active
+            params = np.where(improved[..., None], candidate, params)
+            top = np.where(improved, new_top, top)
+            resid = np.where(improved[:, None, :], new_resid, resid)
+            gain = np.where(sse > 0, (sse - new_sse) / np.maximum(sse, 1e-300), 0.0)
+            sse = np.where(improved, new_sse, sse)
+            damping = np.where(improved, damping / 3, damping * 4)
+            moved = np.max(np.abs(delta), axis=-1)
+            # Stop a fit once it stops improving or the step collapses
+            active &= ~((improved & (gain < 1e-10)) | (moved < 1e-10) | (damping > 1e12))
+        return {'params': params, 'top': top, 'sse': sse, 'iterations': iterations, 'converged': ~active}
+
+    def standard_errors(self, rate: np.ndarray, params: np.ndarray, top: np.ndarray, sse: np.ndarray,
+                        weeks: np.ndarray) -> np.ndarray:
+        """Standard errors of (scale, shape, top) at the chosen rate, from the Gauss-Newton covariance."""
+        columns = np.arange(params.shape[0])
+        carried = self.carried[rate, :, columns].T  # weeks x curves
+        theta = np.stack([np.exp(params[:, 0]), np.exp(params[:, 1]), top], axis=-1)  # curves x 3
+
+        def model(values: np.ndarray) -> np.ndarray:
+            drawn = self.curve_set.with_parameters(scale=values[:, 0], shape=values[:, 1], top=values[:, 2])
+            return self.mask * drawn.response(carried)
+
+        base = model(theta)
+        jac = np.empty(base.shape + (3,))
+        for k in range(3):
+            h = 1e-6 * np.maximum(np.abs(theta[:, k]), 1e-12)
+            shifted = theta.copy()
+            shifted[:, k] += h
+            jac[..., k] = (model(shifted) - base) / h
+        jtj = np.einsum('tci,tcj->cij', jac, jac)
+        dof = np.maximum(weeks - 3, 1)
+        sigma2 = sse / dof
+        errors = np.full((len(sse), 3), np.nan)
+        for c in range(len(sse)):
+            try:
+                cov = np.linalg.inv(jtj[c]) * sigma2[c]
+                errors[c] = np.sqrt(np.maximum(np.diag(cov), 0.0))
+            except np.linalg.LinAlgError:
+                pass
+        return errors
+
+
+def _fit_chunk(series: List[Dict[str, Any]], families: List[str], rates: Tuple[float, ...],
+               max_iterations: int) -> List[Dict[str, Any]]:
+    """Fit a chunk of curves; series[i] is {curve_ref, spend, response} and families[i] its candidates."""
+    length = max(len(s['spend']) for s in series)
+    n = len(series)
+    spend = np.zeros((length, n))
+    observed = np.zeros((length, n))
+    mask = np.zeros((length, n))
+    for i, s in enumerate(series):
+        # Right-align so every series ends in the latest week and adstock starts from zero carry
+        t = len(s['spend'])
+        spend[length - t:, i] = s['spend']
+        observed[length - t:, i] = s['response']
+        mask[length - t:, i] = 1.0
+    rate_grid = np.asarray(rates, dtype=float)
+    carried = adstock(spend, rate_grid)
+    weeks = mask.sum(axis=0)
+    mean = np.sum(mask * observed, axis=0) / np.maximum(weeks, 1)
+    total = np.sum(mask * (observed - mean) ** 2, axis=0)
+
+    best: Dict[int, Dict[str, Any]] = {}
+    for family in FAMILIES:
+        members = [i for i, candidates in enumerate(families) if family in candidates]
+        if not members:
+            continue
+        fit = FamilyFit(family, carried[:, :, members], observed[:, members], mask[:, members])
+        solved = fit.solve(max_iterations)
+        rate = np.argmin(solved['sse'], axis=0)
+        columns = np.arange(len(members))
+        params = solved['params'][rate, columns]
+        top = solved['top'][rate, columns]
+        sse = solved['sse'][rate, columns]
+        errors = fit.standard_errors(rate, params, top, sse, weeks[members])
+        for j, i in enumerate(members):
+            if i in best and best[i]['sse'] <= sse[j]:
+                continue
+            best[i] = {
+                'family': family, 'rate': float(rate_grid[rate[j]]), 'scale': float(np.exp(params[j, 0])),
+                'shape': float(np.exp(params[j, 1])), 'top': float(top[j]), 'sse': float(sse[j]),
+                'errors': errors[j], 'iterations': int(solved['iterations'][rate[j], j]),
+                'converged': bool(solved['converged'][rate[j], j]),
+            }
+
+    fits = []
+    for i, s in enumerate(series):
+        b = best[i]
+        # Store scale in steady-state weekly spend units
+        steady = 1.0 - b['rate']
+        values = {'scale': b['scale'] * steady, 'shape': b['shape'], 'top': b['top']}
+        errors = dict(zip(('scale', 'shape', 'top'), b['errors'] * np.array([steady, 1.0, 1.0])))
+        columns = PARAMETER_COLUMNS['tanh' if b['family'] == 'tanh' else 'default']
+        fit = {
+            'curve_ref': s['curve_ref'],
+            'curve_type': b['family'],
+            'adstock': b['rate'],
+            'weeks': int(weeks[i]),
+            'r2': round(float(1.0 - b['sse'] / total[i]), 6) if total[i] > 0 else None,
+            'rmse': round(math.sqrt(b['sse'] / max(weeks[i], 1)), 6),
+            'iterations': b['iterations'],
+            'converged': b['converged'],
+        }
+        for name, column in columns.items():
+            fit[column] = values[name]
+            error = errors[name]
+            fit[STANDARD_ERROR_COLUMNS[column]] = float(error) if np.isfinite(error) else None
+        fits.append(fit)
+    return fits
+
+
+def _pack(series: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """All series end to end: series i is spend/response[starts[i]:starts[i + 1]]."""
+    return {
+        'curve_ref': [s['curve_ref'] for s in series],
+        'starts': np.concatenate(([0], np.cumsum([len(s['spend']) for s in series]))),
+        'spend': np.concatenate([np.asarray(s['spend'], dtype=float) for s in series]),
+        'response': np.concatenate([np.asarray(s['response'], dtype=float) for s in series]),
+    }
+
+
+def _unpack(history: Dict[str, Any], first: int, end: int) -> List[Dict[str, Any]]:
+    starts = history['starts']
+    return [{'curve_ref': history['curve_ref'][i],
+             'spend': history['spend'][starts[i]:starts[i + 1]],
+             'response': history['response'][starts[i]:starts[i + 1]]}
+            for i in range(first, end)]
+
+
+def _worker_fit(payload: tuple, first: int, end: int, families: List[List[str]], rates: Tuple[float, ...],
+                max_iterations: int) -> List[Dict[str, Any]]:
+    return _fit_chunk(_unpack(load(payload), first, end), families, rates, max_iterations)
+
+
+def fit_curves(
+    series: List[Dict[str, Any]],
+    family: Optional[str] = None,
+    rates: Tuple[float, ...] = ADSTOCK_GRID,
+    workers: Optional[int] = None,
+    max_iterations: int = DEFAULT_MAX_ITERATIONS
+) -> List[Dict[str, Any]]:
+    """
+    Fit curves to weekly history.
+
+    Args:
+        series: [{curve_ref, curve_type, spend: [...], response: [...]}] with
+            spend and response aligned week by week
+        family: Family to fit for every curve, 'auto' to keep the best of all
+            families, or None to refit each curve's own curve_type
+        rates: Candidate adstock rates
+        workers: Curve chunks fitted at once on the shared solver pool (default 1:
+            in-process; at most shared.POOL_WORKERS and one per CURVES_PER_WORKER curves)
+        max_iterations: Levenberg-Marquardt iteration cap
+
+    Returns:
+        One fit per series: curve_type, adstock, param_a..param_c (response_curves
+        layout), their standard errors param_a_se..param_c_se and diagnostics
+    """
+    if family is not None and family != 'auto' and family not in FAMILIES:
+        raise ValueError(f"Unknown family '{family}', expected 'auto' or one of {', '.join(FAMILIES)}")
+    if not series:
+        return []
+    for s in series:
+        if len(s['spend']) != len(s['response']):
+            raise ValueError(f"Curve {s['curve_ref']}: spend and response have different lengths")
+        if len(s['spend']) < MIN_WEEKS:
+            raise ValueError(f"Curve {s['curve_ref']}: at least {MIN_WEEKS} weeks of history are needed")
+    if any(not 0 <= r < 1 for r in rates):
+        raise ValueError("Adstock rates must be in [0, 1)")
+
+    families = []
+    for s in series:
+        if family == 'auto':
+            families.append(list(FAMILIES))
+        else:
+            chosen = (family or s.get('curve_type') or 'hill').lower()
+            if chosen not in FAMILIES:
+                raise ValueError(f"Curve {s['curve_ref']}: unknown curve type '{chosen}'")
+            families.append([chosen])
+
+    workers = min(shared.pool_workers(workers), math.ceil(len(series) / CURVES_PER_WORKER))
+    size = math.ceil(len(series) / workers)
+    if workers == 1:
+        results = [_fit_chunk(series, families, tuple(rates), max_iterations)]
+    else:
+        # History goes to the workers once, in shared memory; tasks only name their curve range
+        pool = shared.solver_pool()
+        with SharedPayload(_pack(series)) as payload:
+            futures = [pool.submit(_worker_fit, payload.payload, i, min(i + size, len(series)),
+                                   families[i:i + size], tuple(rates), max_iterations)
+                       for i in range(0, len(series), size)]
+            results = [f.result() for f in futures]
+    return [fit for chunk in results for fit in chunk]
+
+
+def history_series(history: List[Dict[str, Any]], curves: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """
+    Group joined spend/response rows into per-curve series.
+
+    Returns:
+        (series with at least MIN_WEEKS weeks, curve_refs skipped for too little history)
+    """
+    types = {c['curve_ref']: c.get('curve_type') for c in curves}
+    grouped: Dict[int, Dict[str, Any]] = {}
+    for row in history:
+        ref = row['curve_ref']
+        if ref not in types:
+            continue
+        entry = grouped.setdefault(ref, {'curve_ref': ref, 'curve_type': types[ref], 'spend': [], 'response': []})
+        entry['spend'].append(float(row['spend'] or 0))
+        entry['response'].append(float(row['response'] or 0))
+    series = [s for s in grouped.values() if len(s['spend']) >= MIN_WEEKS]
+    skipped = sorted(set(types) - {s['curve_ref'] for s in series})
+    return series, skipped
+
+
+def refit(db, curve_refs: Optional[List[int]] = None, family: Optional[str] = None,
+          workers: Optional[int] = None, write: bool = True) -> Dict[str, Any]:
+    """
+    Refit curves from the weekly_spend / weekly_response history in the database
+    and bulk-write parameters and diagnostics back.
+
+    Returns:
+        {'fits': [...], 'summary': {...}}
+    """
+    started = time.perf_counter()
+    curves = db.get_curves()
+    if curve_refs:
+        wanted = {int(ref) for ref in curve_refs}
+        curves = [c for c in curves if c['curve_ref'] in wanted]
+    series, skipped = history_series(db.get_fit_history(curve_refs), curves)
+    fits = fit_curves(series, family, workers=workers)
+    if write and fits:
+        db.save_curve_fits(fits)
+
+    r2 = [f['r2'] for f in fits if f['r2'] is not None]
+    return {
+        'fits': fits,
+        'summary': {
+            'fitted': len(fits),
+            'skipped': skipped,
+            'written': bool(write and fits),
+            'median_r2': round(float(np.median(r2)), 4) if r2 else None,
+            'converged': sum(1 for f in fits if f['converged']),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        },
+    }
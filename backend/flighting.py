@@ -0,0 +1,401 @@
+"""
+BAWT Backend - Flighting Optimizer
+Weekly on/off scheduling of campaigns under the tanh response curve
+
+Each campaign's annual curve (see nlopt_optimizer.TanhResponseCurve) is split
+into one curve per considered week so that spending evenly across all
+considered weeks reproduces the annual model:
+
+    profit_t = tanh(a * spend_t^beta) * scale_factor * W_t / K
+    a        = alpha * (K / spend_max)^beta        (K = number of weeks with C_t = 1)
+
+Weeks with C_t = 0 are never funded. A flighting plan additionally requires a
+minimum spend in every active week and active weeks to come in runs of at
+least min_run_weeks consecutive weeks.
+
+The solver is a continuous relaxation followed by rounding and local repair:
+
+1. Relaxation: equalize marginal profit (lambda) across all campaign-weeks,
+   ignoring burst rules; each campaign-week's spend at a given lambda is read
+   from a per-campaign table of the inverse marginal, so a solve is a
+   bisection on lambda with every cell updated at once.
+2. Rounding: weeks whose relaxed spend reaches half the minimum burst are
+   switched on; short runs are extended towards the stronger neighbouring
+   weeks (or dropped when the eligible stretch is too short).
+3. Repair: re-solve with the active weeks fixed at >= the minimum burst, then
+   drop runs whose profit does not cover their spend at the marginal price,
+   and repeat.
+
+Only campaign-weeks that can ever be funded are represented: cells with
+C_t = 0, and every week of a campaign with spend_max = 0 or
+max_weekly_spend = 0, are dropped up front (see sparse.SparseWeeks), so every step works on flat per-cell
+vectors whose length is the number of active cells, not campaigns x 52.
+"""
+
+import time
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+import numpy as np
+
+from sparse import WEEKS, SparseWeeks, weekly_matrix
+from telemetry import SolverTrace
+
+
+SCALE_FACTOR = 1000000  # TanhResponseCurve default
+
+# z = a * spend^beta grid for the inverse-marginal tables (tanh is flat beyond ~20)
+Z_GRID = np.geomspace(1e-8, 40.0, 600)
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) week indices, inclusive, of consecutive True stretches."""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return [(int(s), int(e) - 1) for s, e in zip(edges[::2], edges[1::2])]
+
+
+class FlightingOptimizer:
+    """
+    Decides which weeks each campaign is on and how much it spends in each.
+    Maximizes total profit subject to the budget, campaign spend_min/spend_max,
+    consideration flags, minimum weekly spend and minimum run length.
+    """
+
+    # Defaults for campaigns without their own min_weekly_spend / min_run_weeks / max_weekly_spend
+    DEFAULT_OPTIONS = {'min_weekly_spend': 0.0, 'min_run_weeks': 1, 'max_weekly_spend': None, 'max_repairs': 5}
+
+    def __init__(self, campaigns: List[Dict[str, Any]],
+                 total_budget: float,
+                 options: Dict[str, Any] = None,
+                 trace: bool = False):
+        """
+        Initialize optimizer.
+
+        Args:
+            campaigns: Campaign dicts as for NLoptOptimizer (alpha, beta, spend_max,
+                spend_min, W1-W52, C1-C52 or 'W' / 'C' arrays), optionally with
+                min_weekly_spend, min_run_weeks and max_weekly_spend
+            total_budget: Total budget constraint
+            options: Defaults for the flighting rules and max_repairs
+            trace: Record profit and constraint violation per repair pass
+        """
+        if not campaigns:
+            raise ValueError("No campaigns to schedule")
+        self.campaigns = campaigns
+        self.total_budget = float(total_budget)
+        self.n_campaigns = len(campaigns)
+        self.options = {**self.DEFAULT_OPTIONS, **(options or {})}
+        self.trace = SolverTrace({'solver': 'Flighting', **self.options}) if trace else None
+
+        self._extract_parameters()
+        self._build_tables()
+
+    def _extract_parameters(self):
+        """Extract curve parameters, weekly vectors and flighting rules."""
+        opts = self.options
+        self.names = [camp.get('campaignproduct', 'Unknown') for camp in self.campaigns]
+        self.alpha = np.array([float(c.get('alpha', 1.0)) for c in self.campaigns])
+        self.beta = np.array([float(c.get('beta', 1.0)) for c in self.campaigns])
+        self.spend_max = np.array([float(c.get('spend_max', 100000)) for c in self.campaigns])
+        self.spend_min = np.array([float(c.get('spend_min', 0)) for c in self.campaigns])
+        if np.any(self.spend_max < 0) or np.any(self.beta <= 0):
+            raise ValueError("spend_max must be non-negative and beta positive for every campaign")
+
+        seasonality = weekly_matrix(self.campaigns, 'W', 1.0)
+        eligible = weekly_matrix(self.campaigns, 'C', 1.0) == 1
+        self.weeks_considered = eligible.sum(axis=1)
+
+        self.min_weekly = np.array([float(c.get('min_weekly_spend', opts['min_weekly_spend']) or 0)
+                                    for c in self.campaigns])
+        self.min_run = np.array([max(1, int(c.get('min_run_weeks', opts['min_run_weeks']) or 1))
+                                 for c in self.campaigns])
+        caps = [c.get('max_weekly_spend', opts['max_weekly_spend']) for c in self.campaigns]
+        caps = np.minimum([np.inf if cap in (None, '') else float(cap) for cap in caps], self.spend_max)
+        self.week_cap = np.maximum(caps, self.min_weekly)
+
+        # Structurally zero cells (not considered, or a zero spend or weekly cap) are never stored
+        fundable = eligible & (caps > 0)[:, None]
+        self.grid = SparseWeeks.from_dense(seasonality, mask=fundable)
+        self.row = self.grid.row
+        self.funded = np.flatnonzero(np.diff(self.grid.indptr))
+
+        k = np.maximum(self.weeks_considered, 1)
+        self.a = self.alpha * (k / np.where(self.spend_max > 0, self.spend_max, 1.0)) ** self.beta
+        self.top = SCALE_FACTOR * self.grid.values / k[self.row]
+
+    def _build_tables(self):
+        """Per-campaign marginal h(z) = d tanh(a x^beta)/dx on Z_GRID, from its peak onward."""
+        z = Z_GRID[None, :]
+        b = self.beta[:, None]
+        with np.errstate(over='ignore'):
+            self.h_table = b * self.a[:, None] ** (1 / b) * z ** ((b - 1) / b) / np.cosh(z) ** 2
+        # beta > 1 makes the weekly curve S-shaped: marginal rises up to the peak, then falls
+        self.peak = np.argmax(self.h_table, axis=1)
+        self.h_peak = self.h_table[np.arange(self.n_campaigns), self.peak]
+        self.lambda_high = (float(np.max(self.h_peak[self.row] * self.top)) * 4 if len(self.top) else 0.0) or 1.0
+
+    def _per_campaign(self, values: np.ndarray) -> np.ndarray:
+        """Per-campaign total of a per-cell vector."""
+        return self.grid.row_sums(values)
+
+    # ==========================================
+    # CONTINUOUS SOLVE
+    # ==========================================
+
+    def profit(self, spend: np.ndarray) -> np.ndarray:
+        """Profit per active cell."""
+        return self.top * np.tanh(self.a[self.row] * spend ** self.beta[self.row])
+
+    def _spend(self, lam: np.ndarray, active: np.ndarray, lower: np.ndarray) -> np.ndarray:
+        """Spend per cell where marginal profit equals the campaign's lambda."""
+        spend = np.zeros_like(self.top)
+        for c in self.funded:
+            span = self.grid.cells(c)
+            cells = span.start + np.flatnonzero(active[span])
+            if not len(cells):
+                continue
+            p = self.peak[c]
+            with np.errstate(divide='ignore'):
+                target = lam[c] / self.top[cells]
+            # Falling branch of the marginal, reversed so np.interp sees increasing values
+            z = np.interp(target, self.h_table[c, p:][::-1], Z_GRID[p:][::-1])
+            x = (z / self.a[c]) ** (1 / self.beta[c])
+            lo = lower[cells]
+            x = np.where(target > self.h_peak[c], lo, np.maximum(x, lo))
+            spend[cells] = np.minimum(x, np.maximum(self.week_cap[c], lo))
+        return spend
+
+    def _campaign_lambda(self, totals_target: np.ndarray, active: np.ndarray, lower: np.ndarray,
+                         at_least: bool) -> np.ndarray:
+        """Per-campaign lambda at which campaign spend meets totals_target (log bisection)."""
+        lo = np.full(self.n_campaigns, np.log(self.lambda_high) - 70.0)
+        hi = np.full(self.n_campaigns, np.log(self.lambda_high))
+        for _ in range(60):
+            mid = 0.5 * (lo + hi)
+            over = self._per_campaign(self._spend(np.exp(mid), active, lower)) > totals_target
+            lo = np.where(over, mid, lo)
+            hi = np.where(over, hi, mid)
+        return np.exp(lo if at_least else hi)
+
+    def _solve(self, active: np.ndarray, lower: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Spend that equalizes marginal profit over the active cells, within the budget
+        and campaign totals. Returns (spend, per-campaign lambda) or None if the
+        lower bounds alone exceed the budget.
+        """
+        tiny = np.full(self.n_campaigns, self.lambda_high * 1e-30)
+        most = self._per_campaign(self._spend(tiny, active, lower))
+        least = self._per_campaign(lower * active)
+
+        # Campaign caps bind below lambda_cap; spend_min binds above lambda_min
+        lam_cap = np.zeros(self.n_campaigns)
+        capped = most > self.spend_max
+        if capped.any():
+            lam_cap = np.where(capped, self._campaign_lambda(self.spend_max, active, lower, at_least=False), 0.0)
+        lam_min = np.full(self.n_campaigns, np.inf)
+        floored = (self.spend_min > least) & (self._per_campaign(active.astype(float)) > 0)
+        if floored.any():
+            reachable = np.minimum(self.spend_min, most)
+            lam_min = np.where(floored, self._campaign_lambda(reachable, active, lower, at_least=True), np.inf)
+
+        def spend_at(lam: float) -> Tuple[np.ndarray, np.ndarray]:
+            effective = np.minimum(np.maximum(lam, lam_cap), lam_min)
+            return self._spend(effective, active, lower), effective
+
+        spend, effective = spend_at(self.lambda_high * 1e-30)
+        if spend.sum() <= self.total_budget:
+            return spend, effective
+        floor_spend, floor_lambda = spend_at(np.inf)
+        if floor_spend.sum() > self.total_budget * (1 + 1e-9):
+            return None
+
+        spend, effective = floor_spend, floor_lambda
+        log_lo, log_hi = np.log(self.lambda_high) - 70.0, np.log(self.lambda_high)
+        for _ in range(80):
+            mid = 0.5 * (log_lo + log_hi)
+            candidate, candidate_lambda = spend_at(np.exp(mid))
+            if candidate.sum() <= self.total_budget:
+                spend, effective, log_hi = candidate, candidate_lambda, mid
+            else:
+                log_lo = mid
+            if log_hi - log_lo < 1e-10:
+                break
+        return spend, effective
+
+    # ==========================================
+    # ROUNDING AND REPAIR
+    # ==========================================
+
+    def _round(self, relaxed: np.ndarray) -> np.ndarray:
+        """Active cells from the relaxed plan, with short runs extended or dropped."""
+        active = np.zeros(len(self.top), dtype=bool)
+        for c in self.funded:
+            span = self.grid.cells(c)
+            weeks = self.grid.week[span]
+            threshold = 0.5 * self.min_weekly[c] if self.min_weekly[c] > 0 else 1e-9 * self.spend_max[c]
+            length = self.min_run[c]
+            if length == 1:
+                active[span] = relaxed[span] >= threshold
+                continue
+            # Run rules need the campaign's weeks side by side: expand just this row
+            eligible = np.zeros(WEEKS, dtype=bool)
+            eligible[weeks] = True
+            top = self.grid.dense_row(c, self.top)
+            on = eligible & (self.grid.dense_row(c, relaxed) >= threshold)
+            for seg_start, seg_end in _runs(eligible):
+                if seg_end - seg_start + 1 < length:
+                    on[seg_start:seg_end + 1] = False
+                    continue
+                for start, end in _runs(on[seg_start:seg_end + 1]):
+                    start, end = start + seg_start, end + seg_start
+                    while end - start + 1 < length:
+                        # Grow towards the stronger neighbouring week inside the segment
+                        left = top[start - 1] if start > seg_start else -1.0
+                        right = top[end + 1] if end < seg_end else -1.0
+                        if right >= left:
+                            end += 1
+                        else:
+                            start -= 1
+                    on[start:end + 1] = True
+            active[span] = on[weeks]
+        return active
+
+    def _flights(self, active: np.ndarray) -> List[Tuple[int, int, int]]:
+        """(campaign, first cell, end cell) of every active run."""
+        return self.grid.runs(active)
+
+    def _fit_budget(self, active: np.ndarray, relaxed: np.ndarray) -> np.ndarray:
+        """Drop the weakest runs until the minimum bursts fit in the budget."""
+        required = (active * self.min_weekly[self.row]).sum()
+        if required <= self.total_budget:
+            return active
+        profit = self.profit(relaxed)
+        scored = []
+        for c, s, e in self._flights(active):
+            spend = max(relaxed[s:e].sum(), self.min_weekly[c] * (e - s), 1e-12)
+            scored.append((profit[s:e].sum() / spend, c, s, e))
+        for _, c, s, e in sorted(scored):
+            if required <= self.total_budget:
+                break
+            active[s:e] = False
+            required -= self.min_weekly[c] * (e - s)
+        return active
+
+    def optimize(self) -> Dict[str, Any]:
+        """Run relaxation, rounding and repair; return NLopt-style results with weekly plans."""
+        spend, active, relaxed_profit, passes, elapsed = self.solve()
+        results = self.summary(spend, active, relaxed_profit, passes, elapsed)
+        results['campaigns'] = list(self.iter_campaigns(spend, active))
+        return results
+
+    def solve(self) -> Tuple[np.ndarray, np.ndarray, float, int, float]:
+        """
+        Run relaxation, rounding and repair.
+
+        Returns:
+            (spend per cell, active cells, relaxed profit, repair passes, elapsed seconds)
+        """
+        started = time.perf_counter()
+        zeros = np.zeros_like(self.top)
+
+        relaxed_solution = self._solve(np.ones(len(self.top), dtype=bool), zeros)
+        if relaxed_solution is None:
+            raise ValueError("Campaign spend_min totals exceed the total budget")
+        relaxed, _ = relaxed_solution
+        relaxed_profit = float(self.profit(relaxed).sum())
+
+        active = self._fit_budget(self._round(relaxed), relaxed)
+        lower = self.min_weekly[self.row].astype(float)
+
+        spend = zeros
+        passes = 0
+        for passes in range(1, int(self.options['max_repairs']) + 2):
+            solution = self._solve(active, lower)
+            if solution is None:
+                active = self._fit_budget(active, relaxed)
+                continue
+            spend, lam = solution
+            profit = self.profit(spend)
+            if self.trace is not None:
+                violation = max(0.0, spend.sum() - self.total_budget)
+                self.trace.record(float(profit.sum()), 0.0, violation)
+
+            # A run is worth keeping if its profit covers its spend at the campaign's marginal price
+            surplus = profit - np.where(np.isfinite(lam), lam, 0.0)[self.row] * spend
+            losing = [(c, s, e) for c, s, e in self._flights(active) if surplus[s:e].sum() < 0]
+            if not losing or passes > int(self.options['max_repairs']):
+                break
+            for c, s, e in losing:
+                active[s:e] = False
+
+        return spend, active, relaxed_profit, passes, time.perf_counter() - started
+
+    def summary(self, spend: np.ndarray, active: np.ndarray, relaxed_profit: float,
+                passes: int, elapsed: float) -> Dict[str, Any]:
+        """Top-level result fields like NLoptOptimizer, without the campaign rows."""
+        profit = self.profit(spend)
+        total_profit = float(profit.sum())
+        total_spend = float(spend.sum())
+        results = {
+            'solver': 'Flighting',
+            'iterations': passes,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'total_budget': self.total_budget,
+            'total_spend': total_spend,
+            'total_profit': total_profit,
+            'average_roi': total_profit / total_spend if total_spend > 0 else 0,
+            # Profit of the plan without burst/run rules (an upper bound)
+            'relaxed_profit': relaxed_profit,
+            'relaxation_gap_pct': round((relaxed_profit - total_profit) / relaxed_profit * 100, 2) if relaxed_profit > 0 else 0,
+            'active_cells': len(self.top),
+        }
+        if self.trace is not None:
+            results['trace'] = self.trace.to_dict()
+        return results
+
+    def iter_campaigns(self, spend: np.ndarray, active: np.ndarray) -> Iterator[Dict[str, Any]]:
+        """
+        Campaign result rows with weekly spend and flights, built one at a time
+        from the sparse cells, so a full plan never has to exist as 52-week lists.
+        """
+        profit = self.profit(spend)
+        total_profit = float(profit.sum())
+        campaign_spends = self._per_campaign(spend)
+        campaign_profits = self._per_campaign(profit)
+        on_weeks = self._per_campaign(active.astype(float))
+        flights: Dict[int, List[List[int]]] = {}
+        for c, s, e in self._flights(active):
+            flights.setdefault(c, []).append([int(self.grid.week[s]) + 1, int(self.grid.week[e - 1]) + 1])
+        for c in range(self.n_campaigns):
+            campaign_spend = float(campaign_spends[c])
+            campaign_profit = float(campaign_profits[c])
+            yield {
+                'name': self.names[c],
+                'net_spend': round(campaign_spend, 2),
+                'profit': round(campaign_profit, 2),
+                'roi': round(campaign_profit / campaign_spend, 4) if campaign_spend > 0 else 0,
+                'spend_share': round(campaign_spend / self.total_budget * 100, 1) if self.total_budget > 0 else 0,
+                'profit_share': round(campaign_profit / total_profit * 100, 1) if total_profit > 0 else 0,
+                'active_weeks': int(on_weeks[c]),
+                'flights': flights.get(c, []),
+                'weekly_spend': np.round(self.grid.dense_row(c, spend), 2).tolist(),
+            }
+
+
+def optimize_flighting(campaigns: List[Dict[str, Any]],
+                       total_budget: float,
+                       options: Dict[str, Any] = None,
+                       trace: bool = False) -> Dict[str, Any]:
+    """
+    Main entry point for flighting optimization.
+
+    Args:
+        campaigns: Campaign data with parameters and weekly vectors
+        total_budget: Total budget to allocate
+        options: Default min_weekly_spend, min_run_weeks, max_weekly_spend; max_repairs
+        trace: Include a per-pass trace in the results
+
+    Returns:
+        Results with per-campaign weekly spend and flights (1-based week ranges)
+    """
+    return FlightingOptimizer(campaigns, total_budget, options, trace).optimize()
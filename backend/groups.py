@@ -0,0 +1,283 @@
+"""
+BAWT Backend - Group Constraints
+Budget caps and floors on groups of curves at any hierarchy level
+
+A group selects curves by their hierarchy fields (market, category, brand,
+sub_brand, channel, partner, or any other curve field); a value may be a
+string or a list of alternatives:
+
+    {"name": "UK Digital floor", "where": {"market": "UK", "channel": "Digital"}, "min": 2000000}
+    {"name": "TV <= 40% of Brand A", "where": {"brand": "Brand A", "channel": "TV"},
+     "max_share": 0.4, "of": {"brand": "Brand A"}}
+
+Every group is one row of a sparse aggregation matrix G (curves x groups), so
+all group constraints together read lower <= G @ spend <= upper. A share
+constraint "group <= s * parent" is the row 1[group] - s * 1[parent] <= 0.
+
+optimize_grouped() solves the allocation as a linear program over a
+piecewise-linear (concave envelope) model of each curve, with the group rows
+applied to the segment variables through the same sparse aggregation, and
+then refines the breakpoints around the solution. Without groups the LP
+reduces to filling segments in order of slope.
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from multistart import Problem, allocation_results, lookup
+
+# Sparse matrices and the HiGHS LP solver come from SciPy
+try:
+    import scipy.sparse as sparse
+    from scipy.optimize import linprog
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+
+# Segments of the first (geometric) pass and of each refinement pass. LP time grows
+# faster than linearly in segments, so a few narrow passes beat one fine pass.
+COARSE_SEGMENTS = 12
+FINE_SEGMENTS = 12
+REFINEMENTS = 4
+MIN_FRACTION = 1e-4  # first coarse breakpoint, as a fraction of each curve's range
+
+
+def membership(curves: List[Dict[str, Any]], where: Dict[str, Any]) -> np.ndarray:
+    """Boolean mask of curves whose fields match every condition in where."""
+    mask = np.ones(len(curves), dtype=bool)
+    for field, wanted in (where or {}).items():
+        values = {str(v) for v in (wanted if isinstance(wanted, (list, tuple)) else [wanted])}
+        mask &= np.array([str(curve.get(field)) in values for curve in curves])
+    return mask
+
+
+def _describe(where: Dict[str, Any]) -> str:
+    return ', '.join(f'{k}={v}' for k, v in (where or {}).items()) or 'all curves'
+
+
+class GroupConstraints:
+    """Group specs compiled to a sparse matrix with per-row lower/upper bounds."""
+
+    def __init__(self, curves: List[Dict[str, Any]], specs: Optional[List[Dict[str, Any]]] = None):
+        rows, lower, upper, self.groups = [], [], [], []
+        for spec in specs or []:
+            where = spec.get('where', {})
+            members = membership(curves, where)
+            name = spec.get('name') or _describe(where)
+            if not members.any():
+                raise ValueError(f"Group '{name}' matches no curves")
+
+            if spec.get('min') is not None or spec.get('max') is not None:
+                rows.append(members.astype(float))
+                lower.append(float(spec['min']) if spec.get('min') is not None else -np.inf)
+                upper.append(float(spec['max']) if spec.get('max') is not None else np.inf)
+                self.groups.append({'name': name, 'kind': 'amount', 'members': members,
+                                    'min': spec.get('min'), 'max': spec.get('max')})
+
+            for key, bound in (('max_share', 'max'), ('min_share', 'min')):
+                if spec.get(key) is None:
+                    continue
+                share = float(spec[key])
+                parent = membership(curves, spec.get('of', {}))
+                rows.append(members.astype(float) - share * parent)
+                lower.append(0.0 if bound == 'min' else -np.inf)
+                upper.append(0.0 if bound == 'max' else np.inf)
+                self.groups.append({'name': name, 'kind': 'share', 'members': members, 'parent': parent,
+                                    'min': share if bound == 'min' else None,
+                                    'max': share if bound == 'max' else None})
+
+        n = len(curves)
+        self.lower = np.array(lower, dtype=float)
+        self.upper = np.array(upper, dtype=float)
+        if rows and HAS_SCIPY:
+            self.matrix = sparse.csr_matrix(np.vstack(rows))
+        elif rows:
+            raise ValueError("Group constraints require SciPy")
+        else:
+            self.matrix = None
+        self.shape = (len(rows), n)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def evaluate(self, spend: np.ndarray) -> np.ndarray:
+        """Row values G @ spend."""
+        return self.matrix @ spend if len(self) else np.zeros(0)
+
+    def violation(self, spend: np.ndarray) -> float:
+        """Total amount by which spend breaks the group bounds."""
+        values = self.evaluate(spend)
+        return float(np.sum(np.maximum(self.lower - values, 0)) + np.sum(np.maximum(values - self.upper, 0)))
+
+    def inequalities(self, aggregation=None) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rows as A_ub @ v <= b_ub for variables v with spend = aggregation @ v.
+
+        Returns:
+            (A_ub, b_ub, row index of each inequality, +1 for upper / -1 for lower bounds)
+        """
+        matrix = self.matrix if aggregation is None else (self.matrix @ aggregation).tocsr()
+        has_upper = np.flatnonzero(np.isfinite(self.upper))
+        has_lower = np.flatnonzero(np.isfinite(self.lower))
+        a_ub = sparse.vstack([matrix[has_upper], -matrix[has_lower]]).tocsr()
+        b_ub = np.concatenate([self.upper[has_upper], -self.lower[has_lower]])
+        index = np.concatenate([has_upper, has_lower])
+        sign = np.concatenate([np.ones(len(has_upper)), -np.ones(len(has_lower))])
+        return a_ub, b_ub, index, sign
+
+    def report(self, spend: np.ndarray, prices: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Per-group spend, bounds, slack and (when known) shadow price."""
+        values = self.evaluate(spend)
+        out = []
+        for j, group in enumerate(self.groups):
+            group_spend = float(spend[group['members']].sum())
+            slack = float(min(self.upper[j] - values[j], values[j] - self.lower[j]))
+            entry = {
+                'name': group['name'],
+                'kind': group['kind'],
+                'spend': round(group_spend, 2),
+                'min': group['min'],
+                'max': group['max'],
+                'slack': round(slack, 2),
+                'binding': bool(slack <= 1e-6 * max(group_spend, 1.0)),
+            }
+            if group['kind'] == 'share':
+                parent_spend = float(spend[group['parent']].sum())
+                entry['share'] = round(group_spend / parent_spend, 4) if parent_spend > 0 else None
+            if prices is not None:
+                # Response gained per unit the binding bound is relaxed
+                entry['shadow_price'] = round(float(prices[j]), 6)
+            out.append(entry)
+        return out
+
+
+# ==========================================
+# PIECEWISE-LINEAR SOLVE
+# ==========================================
+
+def concave_slopes(spend: np.ndarray, response: np.ndarray) -> np.ndarray:
+    """
+    Segment slopes of each curve's least concave majorant.
+
+    spend / response are breakpoints shaped (segments + 1, n_curves); slopes
+    that increase (the convex part of S-curves) are pooled with their
+    neighbours, weighted by segment width, until they are non-increasing.
+    """
+    widths = np.diff(spend, axis=0)
+    raw = np.diff(response, axis=0) / np.maximum(widths, 1e-300)
+    slopes = np.empty_like(raw)
+    for i in range(raw.shape[1]):
+        values, weights, counts = [], [], []
+        for k in range(raw.shape[0]):
+            value, weight, count = raw[k, i], widths[k, i], 1
+            while values and values[-1] < value:
+                prev_value, prev_weight = values.pop(), weights.pop()
+                total = weight + prev_weight
+                value = (value * weight + prev_value * prev_weight) / total if total > 0 else max(value, prev_value)
+                weight = total
+                count += counts.pop()
+            values.append(value)
+            weights.append(weight)
+            counts.append(count)
+        slopes[:, i] = np.repeat(values, counts)
+    return slopes
+
+
+def _solve_segments(problem: Problem, groups: GroupConstraints, lower: np.ndarray, upper: np.ndarray,
+                    grid: np.ndarray) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+    """
+    Optimal spend over the piecewise-linear model on [lower, upper].
+
+    Returns:
+        (spend, budget price, group shadow prices or None)
+    """
+    n = len(problem.ids)
+    breakpoints = lower[None, :] + (upper - lower)[None, :] * grid[:, None]
+    slopes = concave_slopes(breakpoints, problem.curve_set.response(breakpoints))
+    widths = np.diff(breakpoints, axis=0)
+    segments = len(grid) - 1
+    remaining = problem.total_budget - lower.sum()
+
+    if not len(groups):
+        # Concave segments fill in order of slope: a fractional knapsack
+        order = np.argsort(-slopes.ravel(), kind='stable')
+        filled = np.cumsum(widths.ravel()[order])
+        take = np.clip(remaining - (filled - widths.ravel()[order]), 0, widths.ravel()[order])
+        amounts = np.zeros(slopes.size)
+        amounts[order] = take
+        last = np.searchsorted(filled, remaining)
+        price = float(slopes.ravel()[order[min(last, len(order) - 1)]])
+        return lower + amounts.reshape(segments, n).sum(axis=0), price, None
+
+    # Variables are ordered curve-major: v[i * segments + k]
+    aggregation = sparse.kron(sparse.identity(n, format='csr'), np.ones((1, segments)), format='csr')
+    a_ub, b_ub, index, sign = groups.inequalities(aggregation)
+    b_ub = b_ub - sign * groups.evaluate(lower)[index]
+    result = linprog(
+        -slopes.T.ravel(),
+        A_ub=a_ub, b_ub=b_ub,
+        A_eq=sparse.csr_matrix(np.ones((1, n * segments))), b_eq=[remaining],
+        bounds=np.column_stack([np.zeros(n * segments), widths.T.ravel()]),
+        method='highs'
+    )
+    if result.status != 0:
+        raise ValueError(f"Group constraints are infeasible with this budget ({result.message})")
+
+    prices = np.zeros(len(groups))
+    np.add.at(prices, index, -result.ineqlin.marginals)
+    return lower + result.x.reshape(n, segments).sum(axis=1), float(-result.eqlin.marginals[0]), prices
+
+
+def optimize_grouped(
+    curves: List[Dict[str, Any]],
+    total_budget: float,
+    constraints: Optional[Dict[Any, Dict[str, float]]] = None,
+    groups: Optional[List[Dict[str, Any]]] = None,
+    current_allocations: Optional[Dict[Any, float]] = None
+) -> Dict[str, Any]:
+    """
+    Allocate the full budget subject to per-curve and group constraints.
+
+    Args:
+        curves: Response curves (optimizer dicts or response_curves rows)
+        total_budget: Budget to allocate in full
+        constraints: Dict of curve id -> {min, max}
+        groups: Group specs (see module docstring)
+        current_allocations: Dict of curve id -> spend, for comparison
+
+    Returns:
+        {'allocations': {...}, 'summary': {...}, 'groups': [...]} with a
+        shadow price per group (response per unit of relaxed bound)
+    """
+    if not curves:
+        raise ValueError("No curves to optimize")
+    problem = Problem(curves, total_budget, constraints)
+    group_constraints = GroupConstraints(curves, groups)
+    if len(group_constraints) and not HAS_SCIPY:
+        raise ValueError("Group constraints require SciPy")
+
+    # Coarse geometric pass over [min, max], then linear passes in a window of one
+    # segment either side of the previous solution
+    coarse = np.concatenate([[0.0], np.geomspace(MIN_FRACTION, 1.0, COARSE_SEGMENTS)])
+    spend, price, prices = _solve_segments(problem, group_constraints, problem.lower, problem.upper, coarse)
+    span = problem.upper - problem.lower
+    ratio = MIN_FRACTION ** (-1.0 / (COARSE_SEGMENTS - 1))
+    width = np.maximum((spend - problem.lower) * (ratio - 1), MIN_FRACTION * span)
+    fine = np.linspace(0.0, 1.0, FINE_SEGMENTS + 1)
+    for _ in range(REFINEMENTS):
+        window_lower = np.maximum(problem.lower, spend - width)
+        window_upper = np.minimum(problem.upper, spend + width)
+        spend, price, prices = _solve_segments(problem, group_constraints, window_lower, window_upper, fine)
+        width = (window_upper - window_lower) / FINE_SEGMENTS
+
+    current = np.array([float(lookup(current_allocations, cid) or 0) for cid in problem.ids])
+    result = allocation_results(problem, spend, current)
+    result['summary'].update({
+        'budget_price': round(price, 6),
+        'group_constraints': len(group_constraints),
+        'group_violation': round(group_constraints.violation(spend), 2) if len(group_constraints) else 0.0,
+    })
+    result['groups'] = group_constraints.report(spend, prices)
+    return result
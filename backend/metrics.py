@@ -0,0 +1,343 @@
+"""
+BAWT Backend - Metrics
+In-process metrics registry rendered in Prometheus text exposition format
+"""
+
+import math
+import threading
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+
+# Default latency buckets (seconds) - tuned for API calls from ~1ms to ~30s solves
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Solver work buckets (iterations / function evaluations per run)
+WORK_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects."""
+    if value == float('inf'):
+        return '+Inf'
+    if value == -float('inf'):
+        return '-Inf'
+    if isinstance(value, float) and math.isnan(value):
+        return 'NaN'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...],
+                   extra: Dict[str, str] = None) -> str:
+    """Render a {name="value",...} label block."""
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.extend(extra.items())
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Metric:
+    """Base class for labelled metrics."""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}'
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    metric_type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def _render_sample(self, key: Tuple[str, ...], state: Dict[str, Any]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, {'le': _format_value(float(bound))})
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key, {'le': '+Inf'})
+        lines.append(f'{self.name}_bucket{labels} {state["count"]}')
+        plain = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{plain} {_format_value(state["sum"])}')
+        lines.append(f'{self.name}_count{plain} {state["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics of this process and renders them."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render every metric in Prometheus text format (version 0.0.4)."""
+        _update_cache_ratios()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Singleton registry
+registry = MetricsRegistry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# ==========================================
+# METRIC DEFINITIONS
+# ==========================================
+
+http_request_duration = registry.histogram(
+    'bawt_http_request_duration_seconds',
+    'API request latency by route',
+    ('method', 'route', 'status')
+)
+http_requests_in_flight = registry.gauge(
+    'bawt_http_requests_in_flight',
+    'API requests currently being served',
+    ('route',)
+)
+solver_runs = registry.counter(
+    'bawt_solver_runs_total',
+    'Optimization runs by solver',
+    ('solver',)
+)
+solver_iterations = registry.histogram(
+    'bawt_solver_iterations',
+    'Solver iterations per optimization run',
+    ('solver',),
+    WORK_BUCKETS
+)
+solver_evaluations = registry.histogram(
+    'bawt_solver_function_evaluations',
+    'Objective/gradient evaluations per optimization run',
+    ('solver',),
+    WORK_BUCKETS
+)
+solver_failures = registry.counter(
+    'bawt_solver_convergence_failures_total',
+    'Runs that did not converge or fell back to an equal allocation',
+    ('solver',)
+)
+solver_duration = registry.histogram(
+    'bawt_solver_duration_seconds',
+    'Wall time spent inside the solver',
+    ('solver',)
+)
+cache_requests = registry.counter(
+    'bawt_cache_requests_total',
+    'Cache lookups by cache and result (hit/miss)',
+    ('cache', 'result')
+)
+cache_hit_ratio = registry.gauge(
+    'bawt_cache_hit_ratio',
+    'Fraction of cache lookups served from the cache',
+    ('cache',)
+)
+db_query_duration = registry.histogram(
+    'bawt_db_query_duration_seconds',
+    'SQLite statement execution time',
+    ('operation', 'table')
+)
+audit_queue_depth = registry.gauge(
+    'bawt_audit_queue_depth',
+    'Audit events queued and not yet written'
+)
+audit_events = registry.counter(
+    'bawt_audit_events_total',
+    'Audit events by outcome (written/dropped)',
+    ('result',)
+)
+audit_flush_duration = registry.histogram(
+    'bawt_audit_flush_duration_seconds',
+    'Time to write one batch of audit events'
+)
+
+
+# ==========================================
+# RECORDING HELPERS
+# ==========================================
+
+def observe_solver(solver: str, duration: float, iterations: Optional[int] = None,
+                   evaluations: Optional[int] = None, converged: bool = True) -> None:
+    """Record one optimization run."""
+    solver_runs.inc(solver=solver)
+    solver_duration.observe(duration, solver=solver)
+    if iterations is not None:
+        solver_iterations.observe(iterations, solver=solver)
+    if evaluations is not None:
+        solver_evaluations.observe(evaluations, solver=solver)
+    if not converged:
+        solver_failures.inc(solver=solver)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Record a cache lookup."""
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def observe_audit_flush(written: int, duration: float, dropped: int = 0) -> None:
+    """Record one audit batch write (or events dropped from a full queue)."""
+    if written:
+        audit_events.inc(written, result='written')
+        audit_flush_duration.observe(duration)
+    if dropped:
+        audit_events.inc(dropped, result='dropped')
+
+
+def _update_cache_ratios() -> None:
+    """Derive hit ratios from the hit/miss counters."""
+    with cache_requests._lock:
+        totals: Dict[str, List[float]] = {}
+        for (cache, result), value in cache_requests._values.items():
+            entry = totals.setdefault(cache, [0, 0])
+            entry[0 if result == 'hit' else 1] += value
+    for cache, (hits, misses) in totals.items():
+        lookups = hits + misses
+        cache_hit_ratio.set(hits / lookups if lookups else 0, cache=cache)
+
+
+# ==========================================
+# FLASK INTEGRATION
+# ==========================================
+
+def init_app(app) -> None:
+    """Install request hooks that record per-route latency and in-flight counts."""
+    from flask import g, request
+
+    def _route() -> str:
+        rule = request.url_rule
+        return rule.rule if rule is not None else 'unmatched'
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        g._metrics_route = _route()
+        http_requests_in_flight.inc(route=g._metrics_route)
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        route = g.pop('_metrics_route', 'unmatched')
+        status = g.pop('_metrics_status', 500)
+        http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method, route=route, status=status
+        )
+        http_requests_in_flight.dec(route=route)
@@ -0,0 +1,405 @@
+"""
+BAWT Backend - Multi-start Global Search
+Parallel multi-start budget optimization for non-concave response curves
+
+Hill curves with s > 1 and 'scurve' curves are convex below their knee, so a
+local solver started from an equal split can strand channels at zero spend.
+multistart() runs a local solver from a diverse set of starting allocations
+(heuristic starts plus a Latin hypercube sample) and keeps the best
+allocation found within a wall-clock budget. Solves run in-process unless the
+caller asks for workers, which then run on the shared solver pool.
+
+Curves may be optimizer dicts ({id, k, s, max_response}) or response_curves
+rows of any family in curves.FAMILIES.
+"""
+
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from curves import CurveSet, curve_key
+import shared
+from shared import SharedPayload, load
+
+# Try to use SciPy's SLSQP as the local solver, fall back to the mROI shuffle
+try:
+    from scipy.optimize import minimize
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+
+LOCAL_SOLVERS = ('slsqp', 'shuffle')
+
+DEFAULT_STARTS = 16
+DEFAULT_TIME_BUDGET = 2.0  # seconds
+MAX_STARTS = 256
+STOP_GRACE = 1.0  # seconds to wait past the budget for pooled solves to return
+
+# Spend grid (multiples of each curve's scale) used to find its best average ROI
+_ROI_GRID = np.geomspace(1e-2, 1e2, 200)
+
+
+def lookup(mapping: Optional[Dict[Any, Any]], cid: Any) -> Any:
+    """mapping[cid], also matching JSON's string keys for integer curve_refs."""
+    if not mapping:
+        return None
+    if cid in mapping:
+        return mapping[cid]
+    return mapping.get(str(cid))
+
+
+class Problem:
+    """Curves, bounds and budget of one allocation problem (picklable)."""
+
+    def __init__(self, curves: List[Dict[str, Any]], total_budget: float,
+                 constraints: Optional[Dict[Any, Dict[str, float]]] = None):
+        self.curves = curves
+        self.curve_set = CurveSet(curves)
+        self.ids = self.curve_set.ids
+        self.total_budget = float(total_budget)
+        bounds = [lookup(constraints, cid) or {} for cid in self.ids]
+        self.lower = np.array([float(b.get('min', 0)) for b in bounds])
+        upper = np.array([float(b.get('max', float('inf'))) for b in bounds])
+        self.upper = np.maximum(np.minimum(upper, self.total_budget), self.lower)
+        if self.lower.sum() > self.total_budget * (1 + 1e-9):
+            raise ValueError("Minimum spend constraints exceed the total budget")
+        if self.upper.sum() < self.total_budget * (1 - 1e-9):
+            raise ValueError("Maximum spend constraints cannot absorb the total budget")
+
+    def value(self, spend: np.ndarray) -> float:
+        return float(np.sum(self.curve_set.response(spend)))
+
+    def gradient(self, spend: np.ndarray) -> np.ndarray:
+        """d(value)/d(spend) per curve."""
+        return self.curve_set.marginal(spend)
+
+    def project(self, weights: np.ndarray) -> np.ndarray:
+        """Feasible allocation clip(c * weights, lower, upper) summing to the budget."""
+        weights = np.maximum(np.asarray(weights, dtype=float), 0.0)
+        if not np.any(weights > 0):
+            weights = np.ones_like(weights)
+        lo, hi = 0.0, 1.0
+        while np.clip(hi * weights, self.lower, self.upper).sum() < self.total_budget and hi < 1e300:
+            hi *= 2.0
+        for _ in range(100):
+            mid = 0.5 * (lo + hi)
+            if np.clip(mid * weights, self.lower, self.upper).sum() < self.total_budget:
+                lo = mid
+            else:
+                hi = mid
+        spend = np.clip(hi * weights, self.lower, self.upper)
+        # Spread any rounding residue over channels with room to move
+        residue = self.total_budget - spend.sum()
+        room = (self.upper - spend) if residue > 0 else (spend - self.lower)
+        if room.sum() > 0:
+            spend += residue * room / room.sum()
+        return spend
+
+
+# ==========================================
+# STARTING POINTS
+# ==========================================
+
+def best_roi_spend(curve_set: CurveSet) -> Tuple[np.ndarray, np.ndarray]:
+    """Per curve, the spend with the highest average ROI (response / spend) and that ROI."""
+    spend = _ROI_GRID[:, None] * curve_set.scale[None, :]
+    roi = curve_set.response(spend) / spend
+    best = np.argmax(roi, axis=0)
+    columns = np.arange(len(curve_set))
+    return spend[best, columns], roi[best, columns]
+
+
+def threshold_start(problem: Problem) -> np.ndarray:
+    """
+    Fund curves in order of their best average ROI at that spend level, leaving
+    curves below the threshold (those the budget cannot lift past their knee) at
+    their minimum.
+    """
+    spend_at_best, roi = best_roi_spend(problem.curve_set)
+    weights = np.zeros(len(problem.ids))
+    remaining = problem.total_budget - problem.lower.sum()
+    for i in np.argsort(-roi):
+        need = max(spend_at_best[i] - problem.lower[i], 0.0)
+        if need > remaining:
+            continue
+        weights[i] = spend_at_best[i]
+        remaining -= need
+    return problem.project(weights)
+
+
+def latin_hypercube(samples: int, dims: int, rng: np.random.Generator) -> np.ndarray:
+    """samples x dims Latin hypercube on [0, 1): one point per stratum in every dimension."""
+    strata = np.argsort(rng.random((samples, dims)), axis=0)
+    return (strata + rng.random((samples, dims))) / samples
+
+
+def starting_points(problem: Problem, starts: int, seed: Optional[int] = None,
+                    current: Optional[np.ndarray] = None) -> List[Tuple[str, np.ndarray]]:
+    """Labelled, feasible starting allocations: heuristics first, then Latin hypercube samples."""
+    points = [('equal', problem.project(np.ones(len(problem.ids))))]
+    if current is not None and np.sum(current) > 0:
+        points.append(('current', problem.project(current)))
+    points.append(('knee', problem.project(problem.curve_set.scale)))
+    points.append(('threshold', threshold_start(problem)))
+
+    remaining = max(starts - len(points), 0)
+    if remaining:
+        rng = np.random.default_rng(seed)
+        samples = latin_hypercube(remaining, len(problem.ids), rng)
+        for i, u in enumerate(samples):
+            if i % 2:
+                # Every other sample funds only a random subset of curves
+                u = np.where(u >= np.median(u), u, 0.0)
+            points.append((f'lhs-{i + 1}', problem.project(u * problem.curve_set.scale)))
+    return points[:max(starts, 1)]
+
+
+# ==========================================
+# LOCAL SOLVERS
+# ==========================================
+
+def solve_slsqp(problem: Problem, x0: np.ndarray, max_iterations: int = 200,
+                deadline: Optional[float] = None) -> Dict[str, Any]:
+    """SLSQP from x0 with analytic gradients (requires SciPy); stops at the time.time() deadline."""
+    scale = max(problem.total_budget, 1.0)
+    last = {'x': x0 / scale, 'nit': 0}
+
+    def objective(x):
+        return -problem.value(x * scale) / scale
+
+    def gradient(x):
+        grad = problem.gradient(x * scale)
+        return -np.where(np.isfinite(grad), grad, 1e6)
+
+    def callback(x):
+        last['x'], last['nit'] = np.array(x), last['nit'] + 1
+        if deadline is not None and time.time() >= deadline:
+            raise StopIteration
+
+    try:
+        result = minimize(
+            objective,
+            x0 / scale,
+            method='SLSQP',
+            jac=gradient,
+            bounds=list(zip(problem.lower / scale, problem.upper / scale)),
+            constraints={'type': 'eq', 'fun': lambda x: np.sum(x) - problem.total_budget / scale,
+                         'jac': lambda x: np.ones_like(x)},
+            options={'maxiter': max_iterations, 'ftol': 1e-10},
+            callback=callback
+        )
+        x, iterations, success = result.x, int(result.nit), bool(result.success)
+    except StopIteration:
+        # SciPy < 1.11 lets the callback's StopIteration escape
+        x, iterations, success = last['x'], last['nit'], False
+    spend = problem.project(np.clip(x * scale, problem.lower, problem.upper))
+    return {'spend': spend, 'value': problem.value(spend), 'iterations': iterations, 'success': success}
+
+
+def solve_shuffle(problem: Problem, x0: np.ndarray, max_iterations: int = 2000,
+                  step_size: float = 0.05, epsilon: float = 1e-3,
+                  deadline: Optional[float] = None) -> Dict[str, Any]:
+    """mROI equalization (as in MMMOptimizer) from x0, for environments without SciPy."""
+    spend = x0.copy()
+    iteration = 0
+    converged = False
+    for iteration in range(1, max_iterations + 1):
+        if deadline is not None and time.time() >= deadline:
+            break
+        mroi = problem.gradient(spend)
+        can_take = spend < problem.upper
+        can_give = spend > problem.lower
+        if not can_take.any() or not can_give.any():
+            converged = True
+            break
+        hi = int(np.argmax(np.where(can_take, mroi, -np.inf)))
+        lo = int(np.argmin(np.where(can_give, mroi, np.inf)))
+        if hi == lo or (mroi[hi] - mroi[lo]) / max(mroi[hi], 0.01) < epsilon:
+            converged = True
+            break
+        shift = min(spend[lo] * step_size, spend[lo] - problem.lower[lo], problem.upper[hi] - spend[hi])
+        if shift <= 0:
+            converged = True
+            break
+        spend[lo] -= shift
+        spend[hi] += shift
+    return {'spend': spend, 'value': problem.value(spend), 'iterations': iteration, 'success': converged}
+
+
+def _local_solve(problem: Problem, x0: np.ndarray, local_solver: str, max_iterations: Optional[int],
+                 deadline: Optional[float] = None) -> Dict[str, Any]:
+    kwargs = {'max_iterations': max_iterations} if max_iterations else {}
+    if local_solver == 'slsqp':
+        return solve_slsqp(problem, x0, deadline=deadline, **kwargs)
+    return solve_shuffle(problem, x0, deadline=deadline, **kwargs)
+
+
+def _worker_solve(payload: tuple, x0: np.ndarray, local_solver: str, max_iterations: Optional[int],
+                  deadline: float) -> Dict[str, Any]:
+    return _local_solve(load(payload), x0, local_solver, max_iterations, deadline)
+
+
+# ==========================================
+# MULTI-START
+# ==========================================
+
+def multistart(
+    curves: List[Dict[str, Any]],
+    total_budget: float,
+    constraints: Optional[Dict[Any, Dict[str, float]]] = None,
+    current_allocations: Optional[Dict[Any, float]] = None,
+    starts: int = DEFAULT_STARTS,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    workers: Optional[int] = None,
+    local_solver: Optional[str] = None,
+    max_iterations: Optional[int] = None,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Run a local solver from many starting allocations and keep the best.
+
+    Args:
+        curves: Response curves (optimizer dicts or response_curves rows)
+        total_budget: Budget to allocate in full
+        constraints: Dict of curve id -> {min, max}
+        current_allocations: Dict of curve id -> spend (also used as a start)
+        starts: Number of starting points (heuristics + Latin hypercube)
+        time_budget: Seconds for all solves; running solves stop at the deadline
+            and starts not yet begun are dropped
+        workers: Solves to run at once on the shared solver pool (default 1:
+            in-process; capped at shared.POOL_WORKERS)
+        local_solver: 'slsqp' (default with SciPy) or 'shuffle'
+        max_iterations: Iteration cap per local solve
+        seed: Seed for the Latin hypercube sample
+
+    Returns:
+        {'allocations': {curve_id: {...}}, 'summary': {..., 'multistart': {...}}}
+    """
+    if not curves:
+        raise ValueError("No curves to optimize")
+    local_solver = local_solver or ('slsqp' if HAS_SCIPY else 'shuffle')
+    if local_solver not in LOCAL_SOLVERS:
+        raise ValueError(f"Unknown local solver '{local_solver}', expected one of {', '.join(LOCAL_SOLVERS)}")
+    if local_solver == 'slsqp' and not HAS_SCIPY:
+        raise ValueError("The slsqp local solver requires SciPy")
+    starts = max(1, min(int(starts), MAX_STARTS))
+    workers = shared.pool_workers(workers)
+
+    started = time.perf_counter()
+    deadline = time.time() + float(time_budget)
+    problem = Problem(curves, total_budget, constraints)
+    current = np.array([float(lookup(current_allocations, cid) or 0) for cid in problem.ids])
+    points = starting_points(problem, starts, seed, current)
+
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * len(points)
+    if workers == 1 or len(points) == 1:
+        for i, (_, x0) in enumerate(points):
+            if i and time.time() >= deadline:
+                break
+            outcomes[i] = _local_solve(problem, x0, local_solver, max_iterations, deadline)
+    else:
+        pool = shared.solver_pool()
+        with SharedPayload(problem) as payload:
+            # At most `workers` solves in flight; the rest start as those finish
+            queue = iter(enumerate(points))
+            futures = {}
+            for i, (_, x0) in queue:
+                futures[pool.submit(_worker_solve, payload.payload, x0, local_solver, max_iterations, deadline)] = i
+                if len(futures) == workers:
+                    break
+            pending = set(futures)
+            while pending:
+                # Running solves return at the deadline; give up on any still queued behind other requests
+                timeout = deadline - time.time() + STOP_GRACE
+                done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    for future in pending:
+                        future.cancel()
+                    break
+                for future in done:
+                    outcomes[futures[future]] = future.result()
+                    if time.time() < deadline:
+                        for i, (_, x0) in queue:
+                            future = pool.submit(_worker_solve, payload.payload, x0, local_solver,
+                                                 max_iterations, deadline)
+                            futures[future] = i
+                            pending.add(future)
+                            break
+        if all(o is None for o in outcomes):
+            # Always return an answer: polish the first start for what is left of the budget
+            outcomes[0] = _local_solve(problem, points[0][1], local_solver, max_iterations, deadline)
+
+    completed = [(i, o) for i, o in enumerate(outcomes) if o is not None]
+    best_index, best = max(completed, key=lambda item: item[1]['value'])
+    values = np.array([o['value'] for _, o in completed])
+    elapsed = time.perf_counter() - started
+
+    result = allocation_results(problem, best['spend'], current)
+    result['summary'].update({
+        'iterations': sum(o['iterations'] for _, o in completed),
+        'converged': bool(best['success']),
+        'multistart': {
+            'local_solver': local_solver,
+            'workers': workers,
+            'starts': len(points),
+            'completed': len(completed),
+            'timed_out': len(completed) < len(points),
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'best_start': points[best_index][0],
+            'spread': {
+                'best': round(float(values.max()), 2),
+                'worst': round(float(values.min()), 2),
+                'mean': round(float(values.mean()), 2),
+                'std': round(float(values.std()), 2),
+                # Share of starts that ended within 0.1% of the best objective
+                'hit_rate': round(float(np.mean(values >= values.max() * (1 - 1e-3))), 3),
+            },
+            'columns': {
+                'start': [points[i][0] for i, _ in completed],
+                'objective': [round(o['value'], 2) for _, o in completed],
+                'converged': [bool(o['success']) for _, o in completed],
+            },
+        },
+    })
+    return result
+
+
+def allocation_results(problem: Problem, spend: np.ndarray, current: np.ndarray) -> Dict[str, Any]:
+    """Per-curve rows and totals in the same shape as MMMOptimizer.optimize."""
+    curve_set = problem.curve_set
+    optimized_response = curve_set.response(spend)
+    current_response = curve_set.response(current)
+    mroi = curve_set.marginal(spend)
+
+    allocations = {}
+    for i, curve in enumerate(problem.curves):
+        cid = curve_key(curve)
+        change = spend[i] - current[i]
+        allocations[cid] = {
+            'curve_id': cid,
+            'channel': curve.get('channel', cid),
+            'current_spend': round(float(current[i]), 2),
+            'optimized_spend': round(float(spend[i]), 2),
+            'change_amount': round(float(change), 2),
+            'change_pct': round(float(change) / max(float(current[i]), 1) * 100, 1),
+            'current_response': round(float(current_response[i]), 2),
+            'optimized_response': round(float(optimized_response[i]), 2),
+            'marginal_roi': round(float(mroi[i]), 4) if math.isfinite(mroi[i]) else None,
+            'roi': round(float(optimized_response[i]) / max(float(spend[i]), 1), 4),
+        }
+
+    total_current = float(current_response.sum())
+    total_optimized = float(optimized_response.sum())
+    return {
+        'allocations': allocations,
+        'summary': {
+            'total_budget': round(problem.total_budget, 2),
+            'total_current_response': round(total_current, 2),
+            'total_optimized_response': round(total_optimized, 2),
+            'response_lift_pct': round((total_optimized - total_current) / max(total_current, 1) * 100, 1),
+        },
+    }
@@ -10,6 +10,10 @@ Output: net_spends, profit, ROI
 import numpy as np
 from typing import Dict, List, Any, Optional
 
+from sensitivity import shadow_prices
+from sparse import SparseWeeks, weekly_matrix
+from telemetry import SolverTrace, relative_spread
+
 # Try to import nlopt, fall back to scipy if not available
 try:
     import nlopt
@@ -19,6 +23,17 @@ except ImportError:
     from scipy.optimize import minimize
 
 
+# Human-readable nlopt return codes
+NLOPT_RESULT_CODES = {
+    1: 'SUCCESS',
+    2: 'STOPVAL_REACHED',
+    3: 'FTOL_REACHED',
+    4: 'XTOL_REACHED',
+    5: 'MAXEVAL_REACHED',
+    6: 'MAXTIME_REACHED',
+}
+
+
 class TanhResponseCurve:
     """
     Tanh-based response curve model.
@@ -80,9 +95,15 @@ class NLoptOptimizer:
     Maximizes total profit subject to budget and channel constraints.
     """
     
+    # Default termination settings (overridable per call)
+    DEFAULT_OPTIONS = {'xtol_rel': 1e-6, 'ftol_rel': 1e-6, 'maxeval': 1000}
+    
     def __init__(self, campaigns: List[Dict[str, Any]], 
                  total_budget: float,
-                 algorithm: str = 'SLSQP'):
+                 algorithm: str = 'SLSQP',
+                 options: Dict[str, float] = None,
+                 trace: bool = False,
+                 sensitivity: bool = False):
         """
         Initialize optimizer.
         
@@ -92,45 +113,38 @@ class NLoptOptimizer:
                 - alpha, beta, spend_max, n
                 - W1-W52 (seasonality factors)
                 - C1-C52 (consideration flags, 0/1)
+                (or 'W' / 'C' arrays from the columnar request format)
             total_budget: Total budget constraint
             algorithm: Optimization algorithm (SLSQP, COBYLA, etc.)
+            options: Overrides for xtol_rel, ftol_rel and maxeval
+            trace: Record a per-evaluation convergence trace
+            sensitivity: Add shadow prices of the budget and binding spend bounds
         """
         self.campaigns = campaigns
         self.total_budget = total_budget
         self.algorithm = algorithm
         self.n_campaigns = len(campaigns)
+        self.options = {**self.DEFAULT_OPTIONS, **(options or {})}
+        self.trace = SolverTrace({'algorithm': algorithm, **self.options}) if trace else None
+        self.sensitivity = sensitivity
         
         # Extract parameters
         self._extract_parameters()
     
     def _extract_parameters(self):
         """Extract optimization parameters from campaign data."""
-        self.alphas = []
-        self.betas = []
-        self.spend_maxs = []
-        self.spend_mins = []  # Minimum spend per campaign
-        self.seasonalities = []  # Average seasonality across considered weeks
-        self.names = []
+        self.alphas = [float(camp.get('alpha', 1.0)) for camp in self.campaigns]
+        self.betas = [float(camp.get('beta', 1.0)) for camp in self.campaigns]
+        self.spend_maxs = [float(camp.get('spend_max', 100000)) for camp in self.campaigns]
+        self.spend_mins = [float(camp.get('spend_min', 0)) for camp in self.campaigns]  # Minimum spend per campaign
+        self.names = [camp.get('campaignproduct', 'Unknown') for camp in self.campaigns]
         
-        for camp in self.campaigns:
-            self.alphas.append(float(camp.get('alpha', 1.0)))
-            self.betas.append(float(camp.get('beta', 1.0)))
-            self.spend_maxs.append(float(camp.get('spend_max', 100000)))
-            self.spend_mins.append(float(camp.get('spend_min', 0)))
-            self.names.append(camp.get('campaignproduct', 'Unknown'))
-            
-            # Calculate average seasonality for considered weeks
-            total_seasonality = 0
-            weeks_considered = 0
-            for i in range(1, 53):
-                consider = camp.get(f'C{i}', 1)
-                if consider == 1 or consider == '1':
-                    seasonality = float(camp.get(f'W{i}', 1.0))
-                    total_seasonality += seasonality
-                    weeks_considered += 1
-            
-            avg_seasonality = total_seasonality / weeks_considered if weeks_considered > 0 else 1.0
-            self.seasonalities.append(avg_seasonality)
+        # Average seasonality across considered weeks, summed over the considered
+        # (C = 1) cells only; campaigns with none considered default to 1.0
+        considered = SparseWeeks.from_dense(weekly_matrix(self.campaigns, 'W', 1.0),
+                                            mask=weekly_matrix(self.campaigns, 'C', 1.0) == 1)
+        counts = np.diff(considered.indptr)
+        self.seasonalities = np.where(counts > 0, considered.row_sums() / np.maximum(counts, 1), 1.0).tolist()
     
     def objective_function(self, spends: np.ndarray) -> float:
         """
@@ -168,6 +182,16 @@ class NLoptOptimizer:
         """Budget constraint: sum(spends) - total_budget <= 0"""
         return np.sum(spends) - self.total_budget
     
+    def _record_trace(self, spends: np.ndarray, objective_value: float, gradient: np.ndarray) -> None:
+        """Record one evaluation: profit, mROI spread over free campaigns, constraint violation."""
+        lower = np.array(self.spend_mins)
+        upper = np.array(self.spend_maxs)
+        free = (spends > lower + 1e-6) & (spends < upper - 1e-6)
+        spread = relative_spread(list(-gradient[free]))
+        violation = max(0.0, self.budget_constraint(spends)) + \
+            float(np.sum(np.maximum(lower - spends, 0)) + np.sum(np.maximum(spends - upper, 0)))
+        self.trace.record(-objective_value, spread, violation)
+    
     def optimize_nlopt(self) -> Dict[str, Any]:
         """Run optimization using NLopt library."""
         if not HAS_NLOPT:
@@ -193,9 +217,14 @@ class NLoptOptimizer:
         
         # Set objective
         def nlopt_objective(x, grad):
-            if grad.size > 0:
-                grad[:] = self.gradient_function(x)
-            return self.objective_function(x)
+            value = self.objective_function(x)
+            if grad.size > 0 or self.trace is not None:
+                gradient = self.gradient_function(x)
+                if grad.size > 0:
+                    grad[:] = gradient
+                if self.trace is not None:
+                    self._record_trace(x, value, gradient)
+            return value
         
         opt.set_min_objective(nlopt_objective)
         
@@ -208,9 +237,9 @@ class NLoptOptimizer:
         opt.add_inequality_constraint(nlopt_constraint, 1e-8)
         
         # Termination conditions
-        opt.set_xtol_rel(1e-6)
-        opt.set_ftol_rel(1e-6)
-        opt.set_maxeval(1000)
+        opt.set_xtol_rel(float(self.options['xtol_rel']))
+        opt.set_ftol_rel(float(self.options['ftol_rel']))
+        opt.set_maxeval(int(self.options['maxeval']))
         
         # Initial guess: equal allocation
         x0 = np.full(self.n_campaigns, self.total_budget / self.n_campaigns)
@@ -221,10 +250,17 @@ class NLoptOptimizer:
             optimal_spends = opt.optimize(x0)
             min_val = opt.last_optimum_value()
             
-            return self._format_results(optimal_spends, -min_val, 'NLopt-' + self.algorithm)
+            results = self._format_results(optimal_spends, -min_val, 'NLopt-' + self.algorithm,
+                                           evaluations=opt.get_numevals())
+            results['termination'] = NLOPT_RESULT_CODES.get(opt.last_optimize_result(), 'UNKNOWN')
+            return results
         except Exception as e:
-            # Fall back to equal allocation
-            return self._format_results(x0, -self.objective_function(x0), 'Fallback')
+            # Fall back to equal allocation, but report why
+            results = self._format_results(x0, -self.objective_function(x0), 'Fallback',
+                                           evaluations=opt.get_numevals())
+            results['termination'] = 'EXCEPTION'
+            results['error'] = f'{type(e).__name__}: {e}'
+            return results
     
     def optimize_scipy(self) -> Dict[str, Any]:
         """Fallback optimization using scipy."""
@@ -247,24 +283,40 @@ class NLoptOptimizer:
         x0 = np.full(self.n_campaigns, self.total_budget / self.n_campaigns)
         x0 = np.clip(x0, self.spend_mins, self.spend_maxs)
         
+        def objective(x):
+            value = self.objective_function(x)
+            if self.trace is not None:
+                self._record_trace(x, value, self.gradient_function(x))
+            return value
+        
         # Optimize
         result = minimize(
-            self.objective_function,
+            objective,
             x0,
             method='SLSQP',
             jac=self.gradient_function,
             bounds=bounds,
-            constraints={'type': 'ineq', 'fun': lambda x: self.total_budget - np.sum(x)}
+            constraints={'type': 'ineq', 'fun': lambda x: self.total_budget - np.sum(x)},
+            options={'ftol': float(self.options['ftol_rel']), 'maxiter': int(self.options['maxeval'])}
         )
         
-        return self._format_results(result.x, -result.fun, 'SciPy-SLSQP')
+        results = self._format_results(result.x, -result.fun, 'SciPy-SLSQP',
+                                       evaluations=int(result.nfev), iterations=int(result.nit))
+        results['termination'] = 'SUCCESS' if result.success else 'FAILURE'
+        if not result.success:
+            results['error'] = str(result.message)
+        return results
     
     def _format_results(self, optimal_spends: np.ndarray, 
                         total_profit: float, 
-                        solver: str) -> Dict[str, Any]:
+                        solver: str,
+                        evaluations: Optional[int] = None,
+                        iterations: Optional[int] = None) -> Dict[str, Any]:
         """Format optimization results."""
         results = {
             'solver': solver,
+            'evaluations': evaluations,
+            'iterations': iterations,
             'total_budget': self.total_budget,
             'total_spend': float(np.sum(optimal_spends)),
             'total_profit': float(total_profit),
@@ -292,6 +344,16 @@ class NLoptOptimizer:
                 'profit_share': round(profit / total_profit * 100, 1) if total_profit > 0 else 0,
             })
         
+        if self.trace is not None:
+            results['trace'] = self.trace.to_dict()
+        if self.sensitivity:
+            spends = np.asarray(optimal_spends, dtype=float)
+            results['sensitivity'] = shadow_prices(
+                self.names, spends, -self.gradient_function(spends),
+                np.array(self.spend_mins), np.array(self.spend_maxs),
+                budget=self.total_budget, budget_equality=False
+            )
+        
         return results
     
     def optimize(self) -> Dict[str, Any]:
@@ -304,7 +366,10 @@ class NLoptOptimizer:
 
 def optimize_budget(campaigns: List[Dict[str, Any]], 
                     total_budget: float,
-                    algorithm: str = 'SLSQP') -> Dict[str, Any]:
+                    algorithm: str = 'SLSQP',
+                    options: Dict[str, float] = None,
+                    trace: bool = False,
+                    sensitivity: bool = False) -> Dict[str, Any]:
     """
     Main entry point for budget optimization.
     
@@ -312,11 +377,14 @@ def optimize_budget(campaigns: List[Dict[str, Any]],
         campaigns: Campaign data with parameters
         total_budget: Total budget to allocate
         algorithm: Optimization algorithm
+        options: Termination overrides (xtol_rel, ftol_rel, maxeval)
+        trace: Include a per-evaluation convergence trace in the results
+        sensitivity: Include shadow prices of the budget and binding spend bounds
     
     Returns:
         Optimization results with net_spends, profit, ROI
     """
-    optimizer = NLoptOptimizer(campaigns, total_budget, algorithm)
+    optimizer = NLoptOptimizer(campaigns, total_budget, algorithm, options, trace, sensitivity)
     return optimizer.optimize()
 
 
@@ -3,9 +3,22 @@ BAWT Backend - MMM Optimizer
 Marginal ROI-based budget optimization algorithm
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 import math
 
+import numpy as np
+
+from curves import CurveSet
+from sensitivity import shadow_prices
+from telemetry import SolverTrace
+
+
+OBJECTIVES = ('maximize_response', 'minimize_spend')
+KPIS = ('response', 'incr_volume')
+
+# Unbounded channels are capped where every curve family is >99.9% saturated
+SATURATION_MULTIPLE = 1e3
+
 
 class MMMOptimizer:
     """
@@ -77,7 +90,12 @@ class MMMOptimizer:
         total_budget: float,
         cpms: Dict[str, float] = None,
         constraints: Dict[str, Dict[str, float]] = None,
-        objective: str = 'maximize_response'
+        objective: str = 'maximize_response',
+        options: Dict[str, float] = None,
+        trace: bool = False,
+        target: float = None,
+        kpi: str = 'response',
+        sensitivity: bool = False
     ) -> Dict[str, Any]:
         """
         Run marginal ROI optimization.
@@ -95,7 +113,16 @@ class MMMOptimizer:
             total_budget: Total budget to allocate
             cpms: Dict of curve_id -> CPM (optional, for impressions calculation)
             constraints: Dict of curve_id -> {min: float, max: float}
-            objective: 'maximize_response' or 'minimize_spend'
+            objective: 'maximize_response' or 'minimize_spend' (cheapest allocation
+                reaching target; total_budget is then ignored)
+            options: Per-call overrides for epsilon, max_iterations and step_size
+                (and target_tolerance for minimize_spend)
+            trace: Record objective, mROI spread, constraint violation and wall
+                time per iteration (returned as summary['trace'])
+            target: Total KPI to reach (required for minimize_spend)
+            kpi: 'response' or 'incr_volume' (response x volume_coefficient)
+            sensitivity: Add shadow prices of the budget (or target) and of
+                binding min/max bounds (returned as summary['sensitivity'])
         
         Returns:
             {
@@ -103,6 +130,16 @@ class MMMOptimizer:
                 'summary': {total_response, total_response_change, iterations}
             }
         """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {', '.join(OBJECTIVES)}")
+        options = options or {}
+        epsilon = float(options.get('epsilon', self.epsilon))
+        max_iterations = int(options.get('max_iterations', self.max_iterations))
+        step_size = float(options.get('step_size', self.step_size))
+        solver_trace = SolverTrace({
+            'epsilon': epsilon, 'max_iterations': max_iterations, 'step_size': step_size
+        }) if trace else None
+        
         # Initialize allocations
         allocations = {c['id']: current_allocations.get(c['id'], 0) for c in curves}
         curve_params = {c['id']: c for c in curves}
@@ -121,6 +158,10 @@ class MMMOptimizer:
                 if cid in constraints and 'max_spend' in cpms.get(cid, {}):
                     constraints[cid]['max'] = min(constraints[cid]['max'], cpms[cid]['max_spend'])
         
+        if objective == 'minimize_spend':
+            return self._minimize_spend(curves, current_allocations, cpms, constraints, target, kpi, options, trace,
+                                        sensitivity)
+        
         # Ensure total budget is respected
         current_total = sum(allocations.values())
         if current_total > 0:
@@ -132,12 +173,15 @@ class MMMOptimizer:
             allocations = {c['id']: per_channel for c in curves}
         
         # Optimization loop
-        for iteration in range(self.max_iterations):
+        evaluations = 0
+        iteration = 0
+        for iteration in range(max_iterations):
             # Calculate mROI for each channel
             mrois = {}
             for cid, spend in allocations.items():
                 params = curve_params[cid]
                 mrois[cid] = self.marginal_roi(spend, params['k'], params['s'], params['max_response'])
+            evaluations += len(mrois)
             
             # Find channels with highest and lowest mROI (that can still shift)
             max_mroi_channel = None
@@ -159,17 +203,21 @@ class MMMOptimizer:
                     min_mroi = mroi
                     min_mroi_channel = cid
             
+            if solver_trace is not None:
+                self._record_trace(solver_trace, allocations, curve_params, constraints, total_budget,
+                                   max_mroi, min_mroi, max_mroi_channel, min_mroi_channel)
+            
             # Check convergence (mROI equalized within epsilon)
             if max_mroi_channel is None or min_mroi_channel is None:
                 break
             if max_mroi_channel == min_mroi_channel:
                 break
-            if (max_mroi - min_mroi) / max(max_mroi, 0.01) < self.epsilon:
+            if (max_mroi - min_mroi) / max(max_mroi, 0.01) < epsilon:
                 break
             
             # Shift budget from lowest mROI to highest mROI
             shift_amount = min(
-                allocations[min_mroi_channel] * self.step_size,  # Don't shift too much
+                allocations[min_mroi_channel] * step_size,  # Don't shift too much
                 allocations[min_mroi_channel] - constraints[min_mroi_channel].get('min', 0),  # Respect min
                 constraints[max_mroi_channel].get('max', float('inf')) - allocations[max_mroi_channel]  # Respect max
             )
@@ -181,6 +229,47 @@ class MMMOptimizer:
             allocations[max_mroi_channel] += shift_amount
         
         # Calculate final metrics
+        results, total_current_response, total_optimized_response = self._allocation_results(
+            curve_params, allocations, current_allocations, cpms
+        )
+        
+        summary = {
+            'total_budget': round(total_budget, 2),
+            'total_current_response': round(total_current_response, 2),
+            'total_optimized_response': round(total_optimized_response, 2),
+            'response_lift_pct': round((total_optimized_response - total_current_response) / max(total_current_response, 1) * 100, 1),
+            'iterations': iteration + 1,
+            'evaluations': evaluations,
+            'converged': iteration < max_iterations - 1
+        }
+        if solver_trace is not None:
+            summary['trace'] = solver_trace.to_dict()
+        if sensitivity:
+            ids = list(allocations)
+            summary['sensitivity'] = shadow_prices(
+                ids,
+                np.array([allocations[cid] for cid in ids]),
+                np.array([self.marginal_roi(allocations[cid], curve_params[cid]['k'], curve_params[cid]['s'],
+                                            curve_params[cid]['max_response']) for cid in ids]),
+                np.array([constraints[cid].get('min', 0) for cid in ids], dtype=float),
+                np.array([constraints[cid].get('max', float('inf')) for cid in ids], dtype=float),
+                budget=total_budget,
+                labels=[curve_params[cid].get('channel', cid) for cid in ids]
+            )
+        
+        return {
+            'allocations': results,
+            'summary': summary
+        }
+    
+    def _allocation_results(
+        self,
+        curve_params: Dict[str, Dict[str, Any]],
+        allocations: Dict[str, float],
+        current_allocations: Dict[str, float],
+        cpms: Dict[str, float] = None
+    ) -> Tuple[Dict[str, Dict[str, Any]], float, float]:
+        """Per-curve result rows plus total current and optimized response."""
         results = {}
         total_current_response = 0
         total_optimized_response = 0
@@ -226,18 +315,183 @@ class MMMOptimizer:
             total_current_response += current_response
             total_optimized_response += optimized_response
         
+        return results, total_current_response, total_optimized_response
+    
+    def _minimize_spend(
+        self,
+        curves: List[Dict[str, Any]],
+        current_allocations: Dict[str, float],
+        cpms: Dict[str, float],
+        constraints: Dict[str, Dict[str, float]],
+        target: Optional[float],
+        kpi: str,
+        options: Dict[str, float],
+        trace: bool,
+        sensitivity: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Cheapest allocation whose total KPI reaches target.
+        
+        At the optimum every channel off its bounds earns the same marginal KPI
+        per unit of spend, lambda. For a given lambda each channel's spend follows
+        from its own curve (the point on the concave branch where mROI = lambda),
+        and total KPI falls monotonically as lambda rises, so bisecting on lambda
+        (with every channel solved at once) walks the budget->response frontier
+        directly instead of re-running the shuffle for each trial budget.
+        
+        With S-shaped curves (s > 1) a channel is either left at its minimum or
+        funded past the point of peak mROI, so the result can overshoot the
+        target slightly when switching a channel on is a discrete jump.
+        """
+        if target is None or target <= 0:
+            raise ValueError("minimize_spend requires a positive target")
+        if kpi not in KPIS:
+            raise ValueError(f"Unknown kpi '{kpi}', expected one of {', '.join(KPIS)}")
+        tolerance = float(options.get('target_tolerance', 1e-4))
+        max_iterations = int(options.get('max_iterations', self.max_iterations))
+        solver_trace = SolverTrace({
+            'target': target, 'kpi': kpi, 'target_tolerance': tolerance, 'max_iterations': max_iterations
+        }) if trace else None
+        
+        curve_set = CurveSet(curves)
+        ids = curve_set.ids
+        weights = np.array([
+            float(c.get('volume_coefficient', 1.0)) if kpi == 'incr_volume' else 1.0 for c in curves
+        ])
+        lower = np.array([float(constraints[cid].get('min', 0)) for cid in ids])
+        upper = np.array([float(constraints[cid].get('max', float('inf'))) for cid in ids])
+        upper = np.maximum(np.minimum(upper, curve_set.scale * SATURATION_MULTIPLE), lower)
+        
+        # Below its mROI peak an S-shaped curve's mROI is rising
+        branch = np.clip(curve_set.peak_spend(), lower, upper)
+        
+        evaluations = 0
+        
+        def kpi_at(spend: np.ndarray) -> float:
+            return float(np.sum(weights * curve_set.response(spend)))
+        
+        def marginal_at(spend: np.ndarray) -> np.ndarray:
+            return weights * curve_set.marginal(spend)
+        
+        m_branch = marginal_at(branch)
+        m_upper = marginal_at(upper)
+        
+        def spend_for(lam: float, floor: np.ndarray, ceiling: np.ndarray) -> np.ndarray:
+            """Per-channel spend where marginal KPI falls to lam, searched within [floor, ceiling]."""
+            nonlocal evaluations
+            lo = np.maximum(branch, floor)
+            hi = np.maximum(np.minimum(upper, ceiling), lo)
+            for _ in range(60):
+                mid = 0.5 * (lo + hi)
+                above = marginal_at(mid) > lam
+                evaluations += 1
+                lo = np.where(above, mid, lo)
+                hi = np.where(above, hi, mid)
+                if np.all(hi - lo <= 1e-9 * np.maximum(hi, 1.0)):
+                    break
+            # hi keeps marginal <= lam, so it never under-spends the exact solution
+            spend = np.where(m_upper >= lam, upper, hi)
+            return np.where(m_branch < lam, lower, spend)
+        
+        floor_value = kpi_at(lower)
+        ceiling_value = kpi_at(upper)
+        if target > ceiling_value * (1 + tolerance):
+            raise ValueError(
+                f"Target {target:,.2f} exceeds the maximum achievable {kpi} of {ceiling_value:,.2f} under the constraints"
+            )
+        
+        spend = lower
+        lam = float('inf')
+        iteration = 0
+        converged = True
+        if floor_value < target:
+            # Bracket lambda: above the largest marginal nothing is funded, below the smallest everything is maxed
+            start = np.maximum(branch, 1e-9 * curve_set.scale)
+            lam_high = float(np.max(marginal_at(start))) * 2
+            lam_low = max(float(np.min(m_upper)) / 2, 1e-300)
+            spend, lam = upper, lam_low
+            # Spend falls as lambda rises: warm-start each solve inside the current bracket
+            spend_floor = lower
+            converged = False
+            for iteration in range(1, max_iterations + 1):
+                mid = math.sqrt(lam_low * lam_high)
+                candidate = spend_for(mid, spend_floor, spend)
+                value = kpi_at(candidate)
+                if value >= target:
+                    spend, lam, lam_low = candidate, mid, mid
+                    gap = value - target
+                else:
+                    spend_floor, lam_high = candidate, mid
+                    gap = None
+                if solver_trace is not None:
+                    funded = (candidate > lower) & (candidate < upper)
+                    m = marginal_at(candidate)[funded]
+                    spread = float((m.max() - m.min()) / max(m.max(), 0.01)) if len(m) > 1 else 0.0
+                    solver_trace.record(float(np.sum(candidate)), spread, max(0.0, target - value))
+                if gap is not None and gap <= tolerance * target:
+                    converged = True
+                    break
+                if lam_high / lam_low - 1 < 1e-12:
+                    converged = True
+                    break
+        
+        allocations = dict(zip(ids, spend.tolist()))
+        curve_params = {c['id']: c for c in curves}
+        results, total_current_response, total_optimized_response = self._allocation_results(
+            curve_params, allocations, current_allocations, cpms
+        )
+        achieved = kpi_at(spend)
+        total_spend = float(np.sum(spend))
+        
+        summary = {
+            'objective': 'minimize_spend',
+            'kpi': kpi,
+            'target': round(target, 2),
+            'achieved': round(achieved, 2),
+            'total_budget': round(total_spend, 2),
+            'current_budget': round(sum(current_allocations.get(cid, 0) for cid in ids), 2),
+            'marginal_cost': round(1 / lam, 6) if 0 < lam < float('inf') else None,
+            'total_current_response': round(total_current_response, 2),
+            'total_optimized_response': round(total_optimized_response, 2),
+            'response_lift_pct': round((total_optimized_response - total_current_response) / max(total_current_response, 1) * 100, 1),
+            'iterations': iteration,
+            'evaluations': evaluations * len(ids),
+            'converged': converged
+        }
+        if solver_trace is not None:
+            summary['trace'] = solver_trace.to_dict()
+        if sensitivity:
+            # Report against the requested caps, not the saturation cap used while solving
+            requested_upper = np.array([float(constraints[cid].get('max', float('inf'))) for cid in ids])
+            summary['sensitivity'] = shadow_prices(
+                ids, spend, marginal_at(spend), lower, requested_upper,
+                labels=[curve_params[cid].get('channel', cid) for cid in ids],
+                objective='spend'
+            )
+        
         return {
             'allocations': results,
-            'summary': {
-                'total_budget': round(total_budget, 2),
-                'total_current_response': round(total_current_response, 2),
-                'total_optimized_response': round(total_optimized_response, 2),
-                'response_lift_pct': round((total_optimized_response - total_current_response) / max(total_current_response, 1) * 100, 1),
-                'iterations': iteration + 1,
-                'converged': iteration < self.max_iterations - 1
-            }
+            'summary': summary
         }
     
+    def _record_trace(self, solver_trace: SolverTrace, allocations: Dict[str, float],
+                      curve_params: Dict[str, Dict[str, Any]], constraints: Dict[str, Dict[str, float]],
+                      total_budget: float, max_mroi: float, min_mroi: float,
+                      max_mroi_channel: Optional[str], min_mroi_channel: Optional[str]) -> None:
+        """Record objective, mROI spread and constraint violation for the current iterate."""
+        objective_value = 0.0
+        violation = abs(sum(allocations.values()) - total_budget)
+        for cid, spend in allocations.items():
+            params = curve_params[cid]
+            objective_value += self.hill_response(spend, params['k'], params['s'], params['max_response'])
+            cons = constraints[cid]
+            violation += max(0.0, cons.get('min', 0) - spend) + max(0.0, spend - cons.get('max', float('inf')))
+        
+        spread = 0.0
+        if max_mroi_channel is not None and min_mroi_channel is not None and max_mroi_channel != min_mroi_channel:
+            spread = (max_mroi - min_mroi) / max(max_mroi, 0.01)
+        solver_trace.record(objective_value, spread, violation)
+    
     def simulate(
         self,
         curves: List[Dict[str, Any]],
@@ -255,8 +509,24 @@ class MMMOptimizer:
         Returns:
             Same structure as optimize() but without optimization
         """
+        summary: Dict[str, float] = {}
+        results = {row['curve_id']: row for row in self.iter_simulate(curves, allocations, cpms, summary)}
+        return {'results': results, 'summary': summary}
+    
+    def iter_simulate(
+        self,
+        curves: List[Dict[str, Any]],
+        allocations: Dict[str, float],
+        cpms: Dict[str, float] = None,
+        summary: Dict[str, float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield simulate() result rows one curve at a time, for streaming.
+        
+        If summary is given, it is filled with simulate()'s summary once the
+        last row has been produced.
+        """
         curve_params = {c['id']: c for c in curves}
-        results = {}
         total_response = 0
         
         for cid, spend in allocations.items():
@@ -278,7 +548,9 @@ class MMMOptimizer:
                 cpm_value = cpms[cid].get('cpm', cpms[cid]) if isinstance(cpms[cid], dict) else cpms[cid]
                 impressions = (spend / cpm_value) * 1000 if cpm_value > 0 else 0
             
-            results[cid] = {
+            total_response += response
+            
+            yield {
                 'curve_id': cid,
                 'channel': params.get('channel', cid),
                 'spend': round(spend, 2),
@@ -289,16 +561,12 @@ class MMMOptimizer:
                 'incr_volume': round(incr_volume, 2),
                 'brand_lift': round(brand_lift, 2)
             }
-            
-            total_response += response
         
-        return {
-            'results': results,
-            'summary': {
+        if summary is not None:
+            summary.update({
                 'total_spend': round(sum(allocations.values()), 2),
                 'total_response': round(total_response, 2)
-            }
-        }
+            })
 
 
 # Singleton instance
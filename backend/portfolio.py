@@ -0,0 +1,262 @@
+"""
+BAWT Backend - Portfolio Optimization
+Global budget allocation across markets by dual decomposition
+
+A global plan couples every market only through the shared budget. Pricing
+that budget at lambda (response per unit of spend) splits the problem: each
+partition (by default one market/brand pair) independently spends on every
+curve up to the point where its marginal ROI falls to lambda, and total spend
+falls monotonically as lambda rises. The coordinator only searches for the
+price at which the partitions' spend adds up to the budget.
+
+Each coordination round prices a whole grid of lambdas at once, so the
+partitions can be evaluated in parallel on the shared solver pool with one
+round trip per round, and the price bracket shrinks by the grid size every
+round (4-6 rounds for 60 to 2,000 curves). Work per round is proportional to
+the number of curves, so the solve scales with cores as long as there are
+more partitions than workers.
+
+S-shaped curves (shape > 1) are either left at their minimum or funded past
+their peak mROI, as in MMMOptimizer's minimize_spend. When switching such a
+curve on is a discrete jump, the final bracket is interpolated to use the
+budget in full.
+"""
+
+import math
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from curves import CurveSet
+from multistart import Problem, allocation_results, lookup
+from optimizer import SATURATION_MULTIPLE
+import shared
+from shared import SharedPayload, load
+
+
+PARTITION_FIELDS = ('market', 'brand')
+
+PRICES_PER_ROUND = 16
+POOLED_PRICES_PER_ROUND = 32  # a finer grid per round trip when partitions run on the pool
+MAX_ROUNDS = 40
+DEFAULT_TOLERANCE = 1e-6  # budget imbalance, relative to the total budget
+TABLE_POINTS = 48  # mROI lookup points per curve
+
+
+class Partition:
+    """One independent subproblem: the curves of a market/brand and their bounds (picklable)."""
+
+    def __init__(self, key: Dict[str, Any], curves: List[Dict[str, Any]], index: np.ndarray,
+                 lower: np.ndarray, upper: np.ndarray):
+        self.key = key
+        self.index = index
+        self.curve_set = CurveSet(curves)
+        self.lower = lower
+        self.upper = np.maximum(np.minimum(upper, self.curve_set.scale * SATURATION_MULTIPLE), lower)
+
+        # Below its mROI peak an S-shaped curve's mROI is rising
+        self.branch = np.clip(self.curve_set.peak_spend(), self.lower, self.upper)
+        start = np.maximum(self.branch, 1e-9 * self.curve_set.scale)
+        self.m_branch = self.curve_set.marginal(start)
+        self.m_upper = self.curve_set.marginal(self.upper)
+
+        # log mROI on a geometric spend grid over the concave branch, to bracket each solve
+        steps = np.linspace(0.0, 1.0, TABLE_POINTS)[:, None]
+        self.log_spend = np.log(start) + steps * np.log(np.maximum(self.upper, start) / start)
+        with np.errstate(divide='ignore'):
+            self.log_marginal = np.log(self.curve_set.marginal(np.exp(self.log_spend)))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def price_range(self) -> Tuple[float, float]:
+        """Prices at which this partition spends everything / nothing above its minimums."""
+        return float(np.min(self.m_upper)), float(np.max(self.m_branch))
+
+    def spend(self, prices: np.ndarray) -> np.ndarray:
+        """Spend per curve (len(prices) x curves) where marginal ROI falls to each price."""
+        lam = np.asarray(prices, dtype=float)[:, None]
+        target = np.log(lam)
+
+        # Table cell containing the price, then Illinois (regula falsi) on log spend
+        cell = np.sum(self.log_marginal[None, :, :] > target[:, :, None], axis=1)
+        cell = np.clip(cell, 1, TABLE_POINTS - 1)
+        columns = np.arange(len(self))
+        a, b = self.log_spend[cell - 1, columns], self.log_spend[cell, columns]
+        fa, fb = self.log_marginal[cell - 1, columns] - target, self.log_marginal[cell, columns] - target
+        # Curves priced out of (or fully into) their branch are set from the bounds below
+        clamped = (self.m_branch < lam) | (self.m_upper >= lam)
+        x = b
+        for _ in range(50):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                x = np.where(fa != fb, b - fb * (b - a) / (fb - fa), 0.5 * (a + b))
+            x = np.where(np.isfinite(x), x, 0.5 * (a + b))
+            with np.errstate(divide='ignore', over='ignore'):
+                fx = np.log(self.curve_set.marginal(np.exp(x))) - target
+            keep = np.sign(fx) == np.sign(fb)
+            # Illinois step: halve the stale end's value so both ends keep moving
+            fa = np.where(keep, fa * 0.5, fb)
+            a = np.where(keep, a, b)
+            b, fb = x, fx
+            if np.all(clamped | (np.abs(fx) < 1e-9) | (np.abs(b - a) < 1e-9)):
+                break
+        with np.errstate(over='ignore'):
+            spend = np.minimum(np.exp(x), self.upper)
+        spend = np.where(self.m_upper >= lam, self.upper, spend)
+        return np.where(self.m_branch < lam, self.lower, spend)
+
+    def demand(self, prices: np.ndarray) -> np.ndarray:
+        """Total spend of the partition at each price."""
+        return self.spend(prices).sum(axis=1)
+
+
+def partition(curves: List[Dict[str, Any]], total_budget: float,
+              constraints: Optional[Dict[Any, Dict[str, float]]] = None,
+              fields: Tuple[str, ...] = PARTITION_FIELDS) -> Tuple[Problem, List[Partition]]:
+    """Validate the global problem and split it into partitions by the given curve fields."""
+    problem = Problem(curves, total_budget, constraints)
+    members: Dict[Tuple, List[int]] = {}
+    for i, curve in enumerate(curves):
+        members.setdefault(tuple(curve.get(f) for f in fields), []).append(i)
+
+    partitions = []
+    for values, rows in members.items():
+        index = np.array(rows)
+        partitions.append(Partition(dict(zip(fields, values)), [curves[i] for i in rows], index,
+                                    problem.lower[index], problem.upper[index]))
+    return problem, partitions
+
+
+def balanced_chunks(partitions: List[Partition], chunks: int) -> List[List[int]]:
+    """Assign partitions to chunks, largest first to the lightest chunk, so workers get equal curves."""
+    loads = [0] * chunks
+    assigned: List[List[int]] = [[] for _ in range(chunks)]
+    for p in sorted(range(len(partitions)), key=lambda p: -len(partitions[p])):
+        lightest = loads.index(min(loads))
+        assigned[lightest].append(p)
+        loads[lightest] += len(partitions[p])
+    return [chunk for chunk in assigned if chunk]
+
+
+def _chunk_demand(partitions: List[Partition], chunk: List[int], prices: np.ndarray) -> np.ndarray:
+    """Demand (partitions in chunk x prices)."""
+    return np.array([partitions[p].demand(prices) for p in chunk])
+
+
+def _worker_demand(payload: tuple, chunk: List[int], prices: np.ndarray) -> np.ndarray:
+    return _chunk_demand(load(payload), chunk, prices)
+
+
+def optimize_portfolio(
+    curves: List[Dict[str, Any]],
+    total_budget: float,
+    constraints: Optional[Dict[Any, Dict[str, float]]] = None,
+    current_allocations: Optional[Dict[Any, float]] = None,
+    partition_by: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    max_rounds: int = MAX_ROUNDS
+) -> Dict[str, Any]:
+    """
+    Allocate a global budget by coordinating per-partition solves through one price.
+
+    Args:
+        curves: Response curves (optimizer dicts or response_curves rows)
+        total_budget: Budget to allocate in full
+        constraints: Dict of curve id -> {min, max}
+        current_allocations: Dict of curve id -> spend, for comparison
+        partition_by: Curve fields that define a subproblem (default market, brand)
+        workers: Partition chunks evaluated at once on the shared solver pool
+            (default 1: in-process; capped at shared.POOL_WORKERS)
+        tolerance: Stop once spend is within tolerance * total_budget of the budget
+        max_rounds: Cap on coordination rounds
+
+    Returns:
+        {'allocations': {...}, 'summary': {..., 'portfolio': {...}}, 'partitions': [...]}
+    """
+    if not curves:
+        raise ValueError("No curves to optimize")
+    fields = tuple(partition_by or PARTITION_FIELDS)
+    started = time.perf_counter()
+    problem, partitions = partition(curves, total_budget, constraints, fields)
+    budget = problem.total_budget
+    workers = min(shared.pool_workers(workers), len(partitions))
+    chunks = balanced_chunks(partitions, workers)
+    prices_per_round = PRICES_PER_ROUND if workers == 1 else POOLED_PRICES_PER_ROUND
+
+    # Above the highest peak mROI nothing is funded; below the lowest capped mROI everything is maxed
+    ranges = np.array([p.price_range() for p in partitions])
+    lam_low = max(float(ranges[:, 0].min()) / 2, 1e-300)
+    lam_high = float(ranges[:, 1].max()) * 2
+    demand_low, demand_high = float(sum(p.upper.sum() for p in partitions)), float(problem.lower.sum())
+
+    pool = payload = None
+    if workers > 1:
+        pool = shared.solver_pool()
+        payload = SharedPayload(partitions)
+
+    def total_demand(prices: np.ndarray) -> np.ndarray:
+        if pool is None:
+            return _chunk_demand(partitions, list(range(len(partitions))), prices).sum(axis=0)
+        futures = [pool.submit(_worker_demand, payload.payload, chunk, prices) for chunk in chunks]
+        return sum(f.result().sum(axis=0) for f in futures)
+
+    rounds = 0
+    converged = demand_high >= budget * (1 - tolerance)
+    try:
+        while not converged and rounds < max_rounds:
+            rounds += 1
+            prices = np.geomspace(lam_low, lam_high, prices_per_round + 2)[1:-1]
+            demand = total_demand(prices)
+            # Demand falls as the price rises: keep the bracket around the budget
+            funded = np.nonzero(demand >= budget)[0]
+            if len(funded):
+                lam_low, demand_low = float(prices[funded[-1]]), float(demand[funded[-1]])
+            above = funded[-1] + 1 if len(funded) else 0
+            if above < len(prices):
+                lam_high, demand_high = float(prices[above]), float(demand[above])
+            converged = (budget - demand_high <= tolerance * budget) or lam_high / lam_low - 1 < 1e-12
+    finally:
+        if payload is not None:
+            payload.close()
+
+    # Spend at both ends of the final bracket, interpolated to use the budget in full
+    spend = np.zeros(len(problem.ids))
+    spend_low = np.zeros(len(problem.ids))
+    for p in partitions:
+        at = p.spend(np.array([lam_high, lam_low]))
+        spend[p.index], spend_low[p.index] = at[0], at[1]
+    gap = float(spend_low.sum() - spend.sum())
+    if gap > 0:
+        spend += (spend_low - spend) * min(max((budget - spend.sum()) / gap, 0.0), 1.0)
+
+    current = np.array([float(lookup(current_allocations, cid) or 0) for cid in problem.ids])
+    result = allocation_results(problem, spend, current)
+    response = problem.curve_set.response(spend)
+    price = math.sqrt(lam_low * lam_high)
+    result['summary'].update({
+        'iterations': rounds,
+        'converged': bool(converged),
+        'portfolio': {
+            'partition_by': list(fields),
+            'partitions': len(partitions),
+            'workers': workers,
+            'rounds': rounds,
+            'prices_per_round': prices_per_round,
+            'price': round(price, 8),
+            'imbalance': round(float(spend.sum()) - budget, 2),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        },
+    })
+    result['partitions'] = [
+        {
+            **p.key,
+            'curves': len(p),
+            'spend': round(float(spend[p.index].sum()), 2),
+            'share': round(float(spend[p.index].sum()) / max(budget, 1), 4),
+            'response': round(float(response[p.index].sum()), 2),
+        }
+        for p in partitions
+    ]
+    return result
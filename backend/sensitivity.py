@@ -0,0 +1,118 @@
+"""
+BAWT Backend - Sensitivity Report
+Shadow prices of the budget and of binding spend bounds, read off a solved allocation
+
+At an optimum of "maximize response s.t. sum(spend) = budget, min <= spend <= max"
+the KKT conditions give every curve strictly inside its bounds the same
+marginal response, the budget price lambda. A curve held at its cap has
+marginal response >= lambda, and the difference is what one more unit of cap
+would earn; a curve held at its floor has marginal response <= lambda, and
+the difference is what the floor costs per unit. So the dual values follow
+from the final spend and gradient alone, without re-solving.
+
+The prices are first-order: they predict the effect of small relaxations,
+as long as the set of binding constraints does not change.
+"""
+
+from typing import Dict, List, Any, Optional, Sequence
+
+import numpy as np
+
+
+RELAXATION = 0.1  # "what if this bound moved by 10%?"
+BINDING_TOLERANCE = 1e-6  # distance to a bound, relative to the budget
+
+
+def shadow_prices(
+    ids: Sequence[Any],
+    spend: np.ndarray,
+    gradient: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    budget: Optional[float] = None,
+    labels: Optional[Sequence[Any]] = None,
+    objective: str = 'response',
+    budget_equality: bool = True
+) -> Dict[str, Any]:
+    """
+    Dual values of the budget (or KPI target) and of every binding min/max bound.
+
+    Args:
+        ids: Identifier of each curve or campaign
+        spend: Final spend
+        gradient: Marginal objective (response, KPI or profit) per unit of spend at spend
+        lower, upper: Spend bounds (0 / inf when unconstrained)
+        budget: Total budget; None for a KPI target (objective='spend')
+        labels: Display name per id (e.g. channel)
+        objective: 'response' when maximizing response under a budget, 'spend'
+            when minimizing spend under a KPI target (prices are then in spend units)
+        budget_equality: False when the budget is only an upper limit (spend <= budget)
+
+    Returns:
+        {'budget': {...}, 'constraints': [...], 'stationarity': float}
+    """
+    spend = np.asarray(spend, dtype=float)
+    gradient = np.where(np.isfinite(gradient), np.asarray(gradient, dtype=float), np.finfo(float).max)
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    tolerance = BINDING_TOLERANCE * max(float(budget if budget is not None else spend.sum()), 1.0)
+    at_lower = spend - lower <= tolerance
+    at_upper = (upper - spend <= tolerance) & ~at_lower
+    free = ~at_lower & ~at_upper
+
+    budget_binding = budget is None or budget_equality or spend.sum() >= budget - tolerance
+    if not budget_binding:
+        lam = 0.0
+    elif free.any():
+        lam = float(np.median(gradient[free]))
+    else:
+        # Any lambda between the floored curves' and the capped curves' marginals satisfies KKT
+        low = float(gradient[at_lower].max()) if at_lower.any() else 0.0
+        high = float(gradient[at_upper].min()) if at_upper.any() else low
+        lam = 0.5 * (low + high) if high >= low else float(gradient.mean())
+
+    # Relative spread of marginals over free curves: 0 at an exact KKT point
+    stationarity = 0.0
+    if free.sum() > 1:
+        stationarity = float((gradient[free].max() - gradient[free].min()) / max(abs(gradient[free].max()), 1e-12))
+
+    if objective == 'spend':
+        # Minimizing spend: a unit of KPI target costs 1/lambda, a bound saves (g - lambda)/lambda
+        budget_entry = {'constraint': 'target', 'shadow_price': round(1 / lam, 8) if lam > 0 else None,
+                        'units': 'spend per unit of KPI'}
+        convert = (lambda value: -value / lam) if lam > 0 else (lambda value: 0.0)
+        units = 'spend per unit of bound'
+    else:
+        budget_entry = {'constraint': 'budget', 'shadow_price': round(lam, 8), 'binding': bool(budget_binding),
+                        'units': 'response per unit of budget'}
+        if budget is not None:
+            budget_entry['relaxed_by_10pct'] = round(lam * RELAXATION * budget, 2)
+        convert = lambda value: value  # noqa: E731
+        units = 'response per unit of bound'
+
+    constraints: List[Dict[str, Any]] = []
+    for i in np.nonzero(at_lower | at_upper)[0]:
+        is_max = bool(at_upper[i])
+        bound = float(upper[i] if is_max else lower[i])
+        if not is_max and bound <= 0:
+            continue  # non-negativity, not a planner constraint
+        # d(objective)/d(bound): positive for a cap worth raising, negative for a costly floor
+        price = convert(float(gradient[i]) - lam)
+        constraints.append({
+            'id': ids[i],
+            'name': labels[i] if labels is not None else ids[i],
+            'bound': 'max' if is_max else 'min',
+            'value': round(bound, 2),
+            'spend': round(float(spend[i]), 2),
+            'shadow_price': round(price, 8),
+            # Objective change if the bound is relaxed by 10% (cap raised, floor lowered)
+            'relaxed_by_10pct': round((price if is_max else -price) * RELAXATION * bound, 2),
+        })
+    constraints.sort(key=lambda c: -abs(c['relaxed_by_10pct']))
+
+    return {
+        'budget': budget_entry,
+        'constraints': constraints,
+        'units': units,
+        'stationarity': round(stationarity, 6),
+    }
@@ -0,0 +1,274 @@
+"""
+BAWT Backend - Serialization
+Fast JSON encoding (NumPy-aware) and the opt-in columnar wire format
+
+Columnar payloads replace lists of per-row objects with one array per field:
+
+    rows:     [{"curve_id": "A", "spend": 1.0}, {"curve_id": "B", "spend": 2.0}]
+    columnar: {"curve_id": ["A", "B"], "spend": [1.0, 2.0]}
+
+Weekly campaign inputs travel as matrices instead of 104 W1-W52/C1-C52 keys:
+
+    {"columns": {"campaignproduct": [...], "alpha": [...], ...},
+     "W": [[w1, ..., w52], ...],
+     "C": [[c1, ..., c52], ...]}
+
+Large results can instead be streamed as NDJSON, one JSON document per line,
+so the first rows leave the server before the last ones are built:
+
+    {"type": "row", "data": {...}}          one per curve / campaign
+    {"type": "summary", "data": {...}}      last line: totals and solver fields
+    {"type": "error", "error": "..."}       replaces the summary if a row fails
+"""
+
+import base64
+import binascii
+import json
+import math
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Union
+
+import numpy as np
+
+# Try to use orjson, fall back to the standard library encoder
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+from flask.json.provider import DefaultJSONProvider
+
+
+COLUMNAR = 'columnar'
+NDJSON = 'ndjson'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+WEEKS = 52
+
+
+def _default(obj: Any) -> Any:
+    """Encode NumPy values; anything else as Flask's default provider does (dates, Decimal, UUID, dataclasses)."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return DefaultJSONProvider.default(obj)
+
+
+def _finite(obj: Any) -> Any:
+    """Copy of obj with NaN and infinities replaced by None, as orjson writes them."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return _finite(obj.tolist())
+    return obj
+
+
+def dumps(obj: Any, **kwargs) -> bytes:
+    """
+    Serialize to compact JSON bytes; NumPy arrays and scalars are handled natively.
+
+    kwargs are json.dumps options (sort_keys, indent, ...). NaN and infinities
+    are written as null with or without orjson.
+    """
+    if HAS_ORJSON and set(kwargs) <= {'sort_keys', 'indent'} and kwargs.get('indent') in (None, 2):
+        option = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+                  | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        if kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    kwargs.setdefault('default', _default)
+    kwargs.setdefault('allow_nan', False)
+    if kwargs.get('indent') is None:
+        kwargs.setdefault('separators', (',', ':'))
+    try:
+        return json.dumps(obj, **kwargs).encode('utf-8')
+    except ValueError:
+        # Out-of-range floats: retry with them nulled (cheaper than scanning every payload)
+        return json.dumps(_finite(obj), **kwargs).encode('utf-8')
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes or str."""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (when installed) with NumPy support."""
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return dumps(obj, **kwargs).decode('utf-8')
+
+    def loads(self, s: Any, **kwargs) -> Any:
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        # Same key order and layout as DefaultJSONProvider.response (sorted, indented in debug)
+        obj = self._prepare_response_obj(args, kwargs)
+        options = {'sort_keys': self.sort_keys}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            options['indent'] = 2
+        return self._app.response_class(dumps(obj, **options) + b'\n', mimetype=self.mimetype)
+
+
+# ==========================================
+# COLUMNAR RESPONSES
+# ==========================================
+
+def rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Convert a list of homogeneous dicts into parallel arrays (one per field)."""
+    if not rows:
+        return {}
+    fields = list(rows[0].keys())
+    return {field: [row.get(field) for row in rows] for field in fields}
+
+
+def columnar_optimization(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Columnar form of MMMOptimizer.optimize / simulate output."""
+    out = dict(result)
+    for key in ('allocations', 'results'):
+        if isinstance(result.get(key), dict):
+            out[key] = rows_to_columns(list(result[key].values()))
+    out['format'] = COLUMNAR
+    return out
+
+
+def columnar_campaign_results(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Columnar form of NLoptOptimizer results."""
+    out = dict(result)
+    out['campaigns'] = rows_to_columns(result.get('campaigns', []))
+    out['format'] = COLUMNAR
+    return out
+
+
+# ==========================================
+# COLUMNAR REQUESTS
+# ==========================================
+
+def is_columnar(payload: Any) -> bool:
+    """True for a columnar block ({"columns": {...}, ...}) rather than a list of rows."""
+    return isinstance(payload, dict) and 'columns' in payload
+
+
+def campaigns_from_columnar(block: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Expand a columnar campaign block into campaign dicts.
+
+    Weekly vectors are kept as arrays under 'W' and 'C' (rows of the
+    seasonality / consideration matrices) instead of W1-W52 / C1-C52 keys.
+    """
+    columns = block.get('columns', {})
+    n = len(next(iter(columns.values()), []))
+    seasonality = _weekly_matrix(block.get('W'), n, 1.0)
+    consideration = _weekly_matrix(block.get('C'), n, 1.0)
+
+    campaigns = []
+    for i in range(n):
+        camp = {field: values[i] for field, values in columns.items()}
+        if seasonality is not None:
+            camp['W'] = seasonality[i]
+        if consideration is not None:
+            camp['C'] = consideration[i]
+        campaigns.append(camp)
+    return campaigns
+
+
+def decode_matrix(payload: Any) -> np.ndarray:
+    """
+    2-D float matrix from nested lists, or from a compact binary block:
+
+        {"shape": [rows, columns], "dtype": "float32" | "float64", "data": "<base64>"}
+
+    where data is the row-major little-endian buffer.
+    """
+    if isinstance(payload, dict) and 'data' in payload:
+        dtype = np.dtype(payload.get('dtype', 'float64')).newbyteorder('<')
+        if dtype.kind != 'f':
+            raise ValueError("Compact matrices must be float32 or float64")
+        try:
+            raw = base64.b64decode(payload['data'], validate=True)
+        except (binascii.Error, TypeError) as e:
+            raise ValueError(f"Invalid base64 matrix data: {e}")
+        shape = tuple(int(n) for n in payload.get('shape', ()))
+        if len(shape) != 2 or shape[0] * shape[1] * dtype.itemsize != len(raw):
+            raise ValueError(f"Matrix data of {len(raw)} bytes does not match shape {list(shape)} of {dtype.name}")
+        return np.frombuffer(raw, dtype=dtype).reshape(shape).astype(float)
+    try:
+        matrix = np.asarray(payload, dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError("Matrix must be a list of equal-length numeric rows")
+    if matrix.ndim != 2:
+        raise ValueError("Matrix must be a list of equal-length numeric rows")
+    return matrix
+
+
+def encode_matrix(matrix: np.ndarray, compact: bool = False, dtype: str = 'float64') -> Any:
+    """Nested lists, or the compact binary block read by decode_matrix."""
+    matrix = np.asarray(matrix)
+    if not compact:
+        return matrix
+    data = np.ascontiguousarray(matrix, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {'shape': list(matrix.shape), 'dtype': np.dtype(dtype).name,
+            'data': base64.b64encode(data.tobytes()).decode('ascii')}
+
+
+def is_compact_matrix(payload: Any) -> bool:
+    """True for a {"shape", "dtype", "data"} block rather than nested lists."""
+    return isinstance(payload, dict) and 'data' in payload
+
+
+def _weekly_matrix(rows: Optional[List[List[float]]], n: int, default: float) -> Optional[np.ndarray]:
+    """Campaigns x weeks float matrix, padding short rows with the default."""
+    if rows is None:
+        return None
+    matrix = np.full((n, WEEKS), default, dtype=float)
+    for i, row in enumerate(rows[:n]):
+        values = np.asarray(row, dtype=float)[:WEEKS]
+        matrix[i, :len(values)] = values
+    return matrix
+
+
+# ==========================================
+# STREAMED (NDJSON) RESPONSES
+# ==========================================
+
+def ndjson_lines(rows: Iterable[Dict[str, Any]],
+                 summary: Union[Dict[str, Any], Callable[[], Dict[str, Any]]]) -> Iterator[bytes]:
+    """
+    Encode rows one line at a time, then the summary.
+
+    rows may be a generator that computes each row on demand, and summary a
+    callable evaluated after the last row (e.g. totals accumulated while
+    streaming), so neither the rows nor their encoding are ever held at once.
+    An exception while producing rows ends the stream with an error line.
+    """
+    count = 0
+    try:
+        for row in rows:
+            yield dumps({'type': 'row', 'data': row}) + b'\n'
+            count += 1
+        tail = summary() if callable(summary) else summary
+    except Exception as e:
+        yield dumps({'type': 'error', 'error': str(e), 'rows': count}) + b'\n'
+        return
+    yield dumps({'type': 'summary', 'rows': count, 'data': tail}) + b'\n'
+
+
+def ndjson_optimization(result: Dict[str, Any]) -> Iterator[bytes]:
+    """NDJSON form of MMMOptimizer.optimize / simulate output: allocation rows, then the rest."""
+    key = 'allocations' if isinstance(result.get('allocations'), dict) else 'results'
+    rows = result.get(key) or {}
+    return ndjson_lines(rows.values(), {k: v for k, v in result.items() if k != key})
+
+
+def ndjson_campaign_results(result: Dict[str, Any]) -> Iterator[bytes]:
+    """NDJSON form of NLoptOptimizer results: campaign rows, then the rest."""
+    return ndjson_lines(result.get('campaigns', []), {k: v for k, v in result.items() if k != 'campaigns'})
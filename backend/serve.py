@@ -0,0 +1,288 @@
+"""
+BAWT Backend - Production Server
+Pre-forking multi-worker WSGI server for the Flask API
+
+The parent process imports NumPy/SciPy, opens the Database and warms the
+curve data once, binds the listening socket, then forks the workers so they
+share that state copy-on-write. Each worker serves requests from a bounded
+thread pool, so a CPU-bound solve only occupies one thread of one worker.
+Connections are closed after one response, so idle clients never hold a pool
+thread, and at most `queue` accepted connections wait for one; the rest stay
+in the listen backlog.
+
+Run with: python backend/serve.py --workers 4 --threads 8 --port 5000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+# Defaults (overridable via environment or command line)
+DEFAULTS = {
+    'host': os.environ.get('BAWT_HOST', '0.0.0.0'),
+    'port': int(os.environ.get('BAWT_PORT', 5000)),
+    'workers': int(os.environ.get('BAWT_WORKERS', os.cpu_count() or 2)),
+    'threads': int(os.environ.get('BAWT_THREADS', 8)),
+    'graceful_timeout': float(os.environ.get('BAWT_GRACEFUL_TIMEOUT', 30)),
+    'queue': int(os.environ.get('BAWT_QUEUE', 16)),
+    'request_timeout': float(os.environ.get('BAWT_REQUEST_TIMEOUT', 5)),
+    'backlog': int(os.environ.get('BAWT_BACKLOG', 2048)),
+}
+
+
+class RequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 handler (for chunked streaming) that serves one request per connection."""
+
+    protocol_version = 'HTTP/1.1'
+    # A client that connects but sends nothing releases its thread after this
+    timeout = DEFAULTS['request_timeout']
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # No keep-alive: an idle connection would hold a pool thread until it timed out
+        self.close_connection = True
+
+    def log_request(self, code='-', size='-'):
+        # Access logging is left to the reverse proxy in production
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server that dispatches connections to a fixed-size thread pool with a bounded queue."""
+
+    multithread = True
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, app, threads: int, queue: int = DEFAULTS['queue'],
+                 fd: Optional[int] = None):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='bawt-worker')
+        # Connections being served or waiting for a thread; once all are taken the
+        # accept loop blocks and new connections wait in the listen backlog
+        self._slots = threading.BoundedSemaphore(threads + max(0, queue))
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        try:
+            self._pool.submit(self._process_request_thread, request, client_address)
+        except RuntimeError:
+            # Pool already shut down
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def drain(self) -> None:
+        """Stop accepting and wait for in-flight requests to complete."""
+        self._pool.shutdown(wait=True)
+
+
+def preload() -> Any:
+    """
+    Import heavy modules and build shared state before forking.
+
+    Returns:
+        The Flask application
+    """
+    import numpy  # noqa: F401
+    try:
+        import scipy.optimize  # noqa: F401
+    except ImportError:
+        pass
+
+    import app as app_module
+    import nlopt_optimizer  # noqa: F401  (pulls in nlopt or the SciPy fallback)
+
+    # Touch the database so schema setup and page cache warm-up happen once
+    db = app_module.db
+    db.get_controls()
+
+    # Pre-sample every curve so chart requests hit a warm cache in all workers
+    import curves
+    for curve in db.get_curves():
+        try:
+            curves.cached_samples(curve)
+        except ValueError:
+            pass
+
+    # Move everything allocated so far into the permanent generation so the
+    # garbage collector does not write to (and un-share) these pages in workers
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    return app_module.app
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    """Create the listening socket shared by all workers."""
+    sock = socket.create_server((host, port), backlog=backlog, reuse_port=False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, config: Dict[str, Any]) -> None:
+    """Worker main loop: serve until SIGTERM, then drain in-flight requests."""
+    import audit
+    import shared
+
+    server = PooledWSGIServer(config['host'], config['port'], app, config['threads'], config['queue'],
+                              fd=sock.fileno())
+
+    def _stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it off the main thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the master decides on shutdown
+
+    try:
+        server.serve_forever()
+    finally:
+        server.drain()
+        server.server_close()
+        # os._exit() skips atexit, so write queued audit events and stop the solver pool here
+        audit.close_all()
+        shared.shutdown_pool()
+
+
+def _spawn(app, sock: socket.socket, config: Dict[str, Any]) -> int:
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            run_worker(app, sock, config)
+        except Exception:
+            status = 1
+        finally:
+            os._exit(status)
+    return pid
+
+
+def run_master(app, config: Dict[str, Any]) -> None:
+    """Fork workers, restart any that die, and shut down gracefully on SIGTERM/SIGINT."""
+    sock = bind_socket(config['host'], config['port'], config['backlog'])
+    workers = {_spawn(app, sock, config) for _ in range(config['workers'])}
+    stopping = threading.Event()
+
+    def _stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"  Serving on http://{config['host']}:{config['port']} "
+          f"({config['workers']} workers x {config['threads']} threads)")
+
+    while not stopping.is_set():
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in workers:
+            workers.discard(pid)
+            if not stopping.is_set():
+                print(f"  Worker {pid} exited, restarting")
+                workers.add(_spawn(app, sock, config))
+        stopping.wait(0.5)
+
+    print("\n  Shutting down, draining in-flight requests...")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + config['graceful_timeout']
+    while workers and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            workers.discard(pid)
+        else:
+            time.sleep(0.1)
+
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    sock.close()
+    print("  Server stopped.")
+
+
+def run_single(app, config: Dict[str, Any]) -> None:
+    """Single-process fallback for platforms without fork (e.g. Windows)."""
+    server = PooledWSGIServer(config['host'], config['port'], app, config['threads'], config['queue'])
+    print(f"  Serving on http://{config['host']}:{config['port']} "
+          f"(1 process x {config['threads']} threads)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.drain()
+        server.server_close()
+        print("\n  Server stopped.")
+
+
+def parse_args(argv=None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description='BAWT production API server')
+    parser.add_argument('--host', default=DEFAULTS['host'])
+    parser.add_argument('--port', type=int, default=DEFAULTS['port'])
+    parser.add_argument('--workers', type=int, default=DEFAULTS['workers'], help='Worker processes')
+    parser.add_argument('--threads', type=int, default=DEFAULTS['threads'], help='Threads per worker')
+    parser.add_argument('--queue', type=int, default=DEFAULTS['queue'],
+                        help='Accepted connections per worker that may wait for a thread')
+    parser.add_argument('--graceful-timeout', type=float, default=DEFAULTS['graceful_timeout'],
+                        help='Seconds to wait for in-flight requests on shutdown')
+    parser.add_argument('--backlog', type=int, default=DEFAULTS['backlog'])
+    args = parser.parse_args(argv)
+    return {
+        'host': args.host,
+        'port': args.port,
+        'workers': max(1, args.workers),
+        'threads': max(1, args.threads),
+        'queue': max(0, args.queue),
+        'graceful_timeout': args.graceful_timeout,
+        'backlog': args.backlog,
+    }
+
+
+def main(argv=None) -> None:
+    config = parse_args(argv)
+
+    print("=" * 50)
+    print("  BAWT Backend API (production)")
+    print("=" * 50)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    app = preload()
+
+    if hasattr(os, 'fork') and config['workers'] > 1:
+        run_master(app, config)
+    else:
+        run_single(app, config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+BAWT Backend - Shared Memory
+Handing solver state to worker processes as zero-copy NumPy views
+
+Process pools receive their problem (curve parameter arrays, bounds,
+distribution tables, weekly series) through pickling, which copies every
+array into every worker. SharedPayload pickles an object graph with its
+arrays moved into one multiprocessing.shared_memory block instead, followed
+by the pickle itself: the payload sent with each task carries only the block
+name and layout, and load() in a worker rebuilds the object around
+read-only views of the block. Workers start without copying the arrays, and
+all of them read the same physical pages.
+
+Arrays smaller than MIN_SHARED_BYTES (and object arrays) stay in the pickle.
+The block belongs to the SharedPayload that created it: close() unlinks it
+once no task needs it any more. Workers keep the last MAX_LOADED objects
+they rebuilt, so later tasks of the same solve skip the unpickling.
+
+Solvers run their tasks on solver_pool(): one process pool per server
+process, created on first use with at most POOL_WORKERS processes and reused
+by every request. Its processes are started by a fork server, not forked
+from the (multithreaded) server worker.
+"""
+
+import atexit
+import io
+import multiprocessing
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+
+MIN_SHARED_BYTES = 1024
+ALIGNMENT = 64  # byte alignment of each array in the block
+MAX_LOADED = 4  # rebuilt objects (and their blocks) a worker keeps
+
+# Processes of the solver pool; each server worker process has its own pool
+POOL_WORKERS = max(1, int(os.environ.get('BAWT_SOLVER_WORKERS', min(4, os.cpu_count() or 1))))
+
+# Objects this (worker) process has rebuilt, by block name: (block, object)
+_loaded: 'OrderedDict[str, Tuple[SharedMemory, Any]]' = OrderedDict()
+_loaded_lock = threading.Lock()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+class _ArrayPickler(pickle.Pickler):
+    """Pickler that replaces large arrays by references into a list."""
+
+    def __init__(self, file, arrays: List[np.ndarray]):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays = arrays
+        self.index: Dict[int, int] = {}
+
+    def persistent_id(self, obj: Any) -> Optional[Tuple[str, int]]:
+        if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < MIN_SHARED_BYTES:
+            return None
+        key = id(obj)
+        if key not in self.index:
+            self.index[key] = len(self.arrays)
+            self.arrays.append(obj)
+        return ('ndarray', self.index[key])
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+    """Unpickler that resolves array references to shared-memory views."""
+
+    def __init__(self, file, views: List[np.ndarray]):
+        super().__init__(file)
+        self.views = views
+
+    def persistent_load(self, pid: Tuple[str, int]) -> np.ndarray:
+        kind, index = pid
+        if kind != 'ndarray':
+            raise pickle.UnpicklingError(f"Unknown persistent id {kind!r}")
+        return self.views[index]
+
+
+class SharedPayload:
+    """
+    An object pickled with its arrays in a shared-memory block.
+
+    Pass .payload with each task and rebuild the object in the worker with
+    load(). Use as a context manager, or call close() once the tasks that
+    need the block have finished.
+    """
+
+    def __init__(self, obj: Any):
+        arrays: List[np.ndarray] = []
+        buffer = io.BytesIO()
+        _ArrayPickler(buffer, arrays).dump(obj)
+        data = buffer.getbuffer()
+
+        layout = []
+        size = 0
+        for array in arrays:
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            layout.append((size, array.shape, array.dtype.str))
+            size += array.nbytes
+
+        # The pickle follows the arrays, so a task carries only the block name and layout
+        self.block = SharedMemory(create=True, size=size + len(data))
+        for array, (offset, shape, dtype) in zip(arrays, layout):
+            np.ndarray(shape, dtype, buffer=self.block.buf, offset=offset)[...] = array
+        self.block.buf[size:size + len(data)] = data
+        self.nbytes = size + len(data)
+        self.shared_arrays = len(arrays)
+        self.payload = (self.block.name, layout, size, len(data))
+
+    def close(self) -> None:
+        """Release and unlink the block (workers that loaded it keep their mapping)."""
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def __enter__(self) -> 'SharedPayload':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _attach(name: str) -> SharedMemory:
+    try:
+        return SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Before 3.13 attaching registers the block with the resource tracker
+        # as if this process owned it; only the creator unlinks it
+        with _loaded_lock:
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                return SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+
+
+def load(payload: Tuple[str, list, int, int]) -> Any:
+    """Rebuild a SharedPayload's object around read-only views of its block (cached per block)."""
+    name, layout, data_offset, data_size = payload
+    with _loaded_lock:
+        if name in _loaded:
+            _loaded.move_to_end(name)
+            return _loaded[name][1]
+    block = _attach(name)
+    views = []
+    for offset, shape, dtype in layout:
+        view = np.ndarray(shape, dtype, buffer=block.buf, offset=offset)
+        view.flags.writeable = False
+        views.append(view)
+    data = io.BytesIO(block.buf[data_offset:data_offset + data_size])
+    obj = _ArrayUnpickler(data, views).load()
+    with _loaded_lock:
+        _loaded[name] = (block, obj)
+        while len(_loaded) > MAX_LOADED:
+            _, (old_block, _) = _loaded.popitem(last=False)
+            try:
+                old_block.close()
+            except BufferError:
+                pass  # views still referenced; the mapping goes when they do
+    return obj
+
+
+# ==========================================
+# SOLVER POOL
+# ==========================================
+
+def _context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def solver_pool() -> ProcessPoolExecutor:
+    """The process pool of this process, created on first use and shared by all solvers."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A pool inherited through fork() has no processes in the child
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=_context())
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def pool_workers(requested: Optional[int]) -> int:
+    """Tasks a solve may run at once: the caller's request (default 1), at most POOL_WORKERS."""
+    return max(1, min(int(requested or 1), POOL_WORKERS))
+
+
+def shutdown_pool() -> None:
+    """Shut the pool down after its running tasks (worker drain / interpreter exit)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and _pool_pid == os.getpid():
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
@@ -0,0 +1,106 @@
+"""
+BAWT Backend - Sparse Curve x Week Grids
+Compressed storage of curve (or campaign) x week values that are mostly zero
+
+Most of a weekly plan is structurally zero: campaigns not considered in a week
+(C = 0), curves with a zero max constraint, seasonal curves that run a few
+weeks a year. SparseWeeks keeps only the active cells, row by row (CSR):
+
+    indptr  row r's cells are indptr[r]:indptr[r + 1]
+    row     row of each cell
+    week    week index of each cell, increasing within a row
+    values  one value per cell
+
+so memory and per-cell work scale with active cells instead of rows x weeks.
+Per-row totals are a bincount over the cells, and the dense grid is only
+built at the edges (API responses, exports).
+"""
+
+from typing import Dict, List, Any, Optional, Sequence
+
+import numpy as np
+
+WEEKS = 52
+
+
+def weekly_matrix(records: List[Dict[str, Any]], key: str, default: float) -> np.ndarray:
+    """
+    Rows x 52 matrix of a weekly field, from a 'W' / 'C' array or W1-W52 /
+    C1-C52 keys on each record; missing weeks take the default.
+    """
+    out = np.full((len(records), WEEKS), default, dtype=float)
+    for r, record in enumerate(records):
+        if key in record:
+            values = np.asarray(record[key], dtype=float)[:WEEKS]
+            out[r, :len(values)] = values
+        else:
+            out[r] = [float(record.get(f'{key}{i}', default)) for i in range(1, WEEKS + 1)]
+    return out
+
+
+class SparseWeeks:
+    """Active cells of a rows x weeks grid in row-major (CSR) order."""
+
+    def __init__(self, n_rows: int, n_weeks: int, row: np.ndarray, week: np.ndarray,
+                 values: Optional[np.ndarray] = None, row_ids: Optional[Sequence[Any]] = None,
+                 week_ids: Optional[Sequence[Any]] = None):
+        order = np.lexsort((week, row))
+        self.n_rows = int(n_rows)
+        self.n_weeks = int(n_weeks)
+        self.row = np.asarray(row, dtype=np.int64)[order]
+        self.week = np.asarray(week, dtype=np.int64)[order]
+        self.values = (np.ones(len(self.row)) if values is None else np.asarray(values, dtype=float)[order])
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(self.row, minlength=self.n_rows))))
+        self.row_ids = list(row_ids) if row_ids is not None else None
+        self.week_ids = list(week_ids) if week_ids is not None else None
+
+    @classmethod
+    def from_dense(cls, matrix: np.ndarray, mask: Optional[np.ndarray] = None, **ids) -> 'SparseWeeks':
+        """Cells of a rows x weeks matrix where mask is set (default: non-zero)."""
+        matrix = np.asarray(matrix, dtype=float)
+        mask = matrix != 0 if mask is None else np.asarray(mask, dtype=bool)
+        row, week = np.nonzero(mask)
+        return cls(matrix.shape[0], matrix.shape[1], row, week, matrix[row, week], **ids)
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    @property
+    def density(self) -> float:
+        """Share of the full grid that is active."""
+        return len(self) / max(self.n_rows * self.n_weeks, 1)
+
+    def cells(self, r: int) -> slice:
+        """Cell range of one row."""
+        return slice(int(self.indptr[r]), int(self.indptr[r + 1]))
+
+    def row_sums(self, values: Optional[np.ndarray] = None) -> np.ndarray:
+        """Per-row total of a per-cell vector (default: the stored values)."""
+        return np.bincount(self.row, weights=self.values if values is None else values, minlength=self.n_rows)
+
+    def runs(self, mask: Optional[np.ndarray] = None) -> List[tuple]:
+        """
+        (row, first cell, end cell) of every stretch of consecutive weeks whose
+        cells are all set in mask (default: every cell). Cells of a run are
+        contiguous, so values[first:end] is the run.
+        """
+        index = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        if not len(index):
+            return []
+        breaks = np.flatnonzero((np.diff(self.row[index]) != 0) | (np.diff(self.week[index]) != 1)) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [len(index)]))
+        return [(int(self.row[index[s]]), int(index[s]), int(index[e - 1]) + 1) for s, e in zip(starts, ends)]
+
+    def to_dense(self, values: Optional[np.ndarray] = None, fill: float = 0.0) -> np.ndarray:
+        """rows x weeks matrix of a per-cell vector (default: the stored values)."""
+        out = np.full((self.n_rows, self.n_weeks), fill, dtype=float)
+        out[self.row, self.week] = self.values if values is None else values
+        return out
+
+    def dense_row(self, r: int, values: Optional[np.ndarray] = None, fill: float = 0.0) -> np.ndarray:
+        """One row of to_dense()."""
+        out = np.full(self.n_weeks, fill, dtype=float)
+        span = self.cells(r)
+        out[self.week[span]] = (self.values if values is None else values)[span]
+        return out
@@ -0,0 +1,59 @@
+"""
+BAWT Backend - Solver Telemetry
+Per-iteration convergence trace returned alongside optimization results
+"""
+
+import math
+import time
+from typing import Dict, List, Any, Optional
+
+
+class SolverTrace:
+    """
+    Records one row per solver iteration (mROI shuffle) or evaluation (NLopt/SciPy).
+
+    Rows are stored column-wise so the trace serializes as a handful of parallel
+    arrays instead of one object per iteration.
+    """
+
+    FIELDS = ('step', 'objective', 'mroi_spread', 'violation', 'elapsed_ms')
+
+    def __init__(self, settings: Dict[str, Any] = None):
+        self.settings = settings or {}
+        self._start = time.perf_counter()
+        self._columns: Dict[str, List[float]] = {field: [] for field in self.FIELDS}
+
+    def record(self, objective: float, mroi_spread: float, violation: float) -> None:
+        """Append one row; elapsed time is measured from trace creation."""
+        cols = self._columns
+        cols['step'].append(len(cols['step']) + 1)
+        cols['objective'].append(_finite(objective, 4))
+        cols['mroi_spread'].append(_finite(mroi_spread, 6))
+        cols['violation'].append(_finite(violation, 4))
+        cols['elapsed_ms'].append(round((time.perf_counter() - self._start) * 1000, 3))
+
+    def __len__(self) -> int:
+        return len(self._columns['step'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact columnar representation for API responses."""
+        return {
+            'settings': self.settings,
+            'points': len(self),
+            'columns': {field: list(values) for field, values in self._columns.items()}
+        }
+
+
+def _finite(value: float, digits: int) -> Optional[float]:
+    """Round for the wire; infinities/NaN (e.g. mROI at zero spend) become null."""
+    value = float(value)
+    return round(value, digits) if math.isfinite(value) else None
+
+
+def relative_spread(values: List[float]) -> float:
+    """(max - min) / max over finite marginal returns; the shuffle's convergence metric."""
+    finite = [v for v in values if math.isfinite(v)]
+    if len(finite) < 2:
+        return 0.0
+    high = max(finite)
+    return (high - min(finite)) / max(abs(high), 0.01)
@@ -0,0 +1,54 @@
+"""Tests for cached curve interpolation tables"""
+import numpy as np
+import pytest
+
+from approximation import CurveTable, table_range
+from curves import CurveSet
+
+CURVES = [
+    {'curve_ref': 1, 'curve_type': 'hill', 'param_a': 1e5, 'param_b': 1.0, 'param_c': 1e6},
+    {'curve_ref': 2, 'curve_type': 'hill', 'param_a': 2e5, 'param_b': 2.5, 'param_c': 5e5},
+    {'curve_ref': 3, 'curve_type': 'atan', 'param_a': 5e4, 'param_b': 0.6, 'param_c': 2e6},
+    {'curve_ref': 4, 'curve_type': 'scurve', 'param_a': 3e5, 'param_b': 1.8, 'param_c': 8e5},
+    {'curve_ref': 5, 'curve_type': 'tanh', 'param_a': 1e6, 'param_b': 1.5e5, 'param_c': 1.2},
+]
+
+
+@pytest.mark.parametrize('tolerance', [1e-6, 1e-4])
+def test_error_is_within_tolerance_of_max_response(tolerance):
+    curve_set = CurveSet(CURVES)
+    table = CurveTable(curve_set, tolerance=tolerance)
+    spend = np.random.default_rng(1).uniform(0, 1, (20000, len(CURVES))) * table.upper
+    error = np.abs(table.response(spend) - curve_set.response(spend))
+    assert np.all(error.max(axis=0) <= tolerance * curve_set.top)
+    assert table.max_error <= tolerance * curve_set.top.max()
+    assert table.summary()['families'] == ['atan', 'hill', 'scurve', 'tanh']
+
+
+def test_interpolant_is_monotone():
+    table = CurveTable(CurveSet(CURVES))
+    spend = np.linspace(0, 1, 50001)[:, None] * table.upper
+    assert np.all(np.diff(table.response(spend), axis=0) >= -1e-9)
+    assert np.all(table.marginal(spend[1:]) >= 0)
+
+
+def test_marginal_tracks_the_exact_marginal():
+    curve_set = CurveSet(CURVES[:2])
+    table = CurveTable(curve_set)
+    spend = np.linspace(0.05, 0.95, 1000)[:, None] * table.upper
+    assert table.marginal(spend) == pytest.approx(curve_set.marginal(spend), rel=1e-3)
+
+
+def test_spend_beyond_the_range_is_exact():
+    curve_set = CurveSet(CURVES)
+    table = CurveTable(curve_set, upper=np.full(len(CURVES), 1e5))
+    spend = np.array([table.upper * 1.5, table.upper * 10])
+    assert np.array_equal(table.response(spend), curve_set.response(spend))
+
+
+def test_ranges_round_up_to_a_power_of_two_of_the_scale():
+    assert table_range(1e5) == 4e5
+    assert table_range(1e5, 3e5) == 4e5
+    assert table_range(1e5, 4.1e5) == 8e5
+    with pytest.raises(ValueError):
+        CurveTable(CurveSet(CURVES), tolerance=0)
@@ -0,0 +1,75 @@
+"""Tests for the write-behind audit log"""
+import sqlite3
+import time
+
+import pytest
+
+from audit import AuditLogger
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'bawt.db')
+    database = Database(path)
+    yield database
+    database.audit.close()
+    Database._migrated_paths.discard(path)
+
+
+def stored(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT result_id, action, user, details FROM audit_log ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def test_close_flushes_queued_events(db):
+    logger = AuditLogger(db.db_path, flush_interval=3600)
+    for i in range(3):
+        logger.log(f'RES-{i}', 'save', 'Analyst', 'Result saved')
+    assert logger.pending() == 3
+    assert stored(db.db_path) == []
+
+    logger.close()
+    assert logger.pending() == 0
+    assert stored(db.db_path) == [(f'RES-{i}', 'save', 'Analyst', 'Result saved') for i in range(3)]
+
+
+def test_full_batch_is_written_without_waiting_for_the_interval(db):
+    logger = AuditLogger(db.db_path, flush_interval=3600, batch_size=2)
+    logger.log('RES-1', 'save')
+    logger.log('RES-1', 'delete')
+    deadline = time.time() + 5
+    while len(stored(db.db_path)) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert [row[1] for row in stored(db.db_path)] == ['save', 'delete']
+    logger.close()
+
+
+def test_events_after_close_are_written_through(db):
+    logger = AuditLogger(db.db_path, flush_interval=3600)
+    logger.close()
+    logger.log('RES-1', 'delete')
+    assert logger.pending() == 0
+    assert stored(db.db_path) == [('RES-1', 'delete', 'User', '')]
+
+
+def test_failed_batch_is_requeued(tmp_path):
+    logger = AuditLogger(str(tmp_path / 'no_audit_table.db'), flush_interval=3600, max_queue=3)
+    for i in range(4):
+        logger.log(f'RES-{i}', 'save')
+    with pytest.raises(sqlite3.Error):
+        logger.flush()
+    # The oldest event was dropped to stay within max_queue; the rest wait for a retry
+    assert [event[0] for event in logger._queue] == ['RES-1', 'RES-2', 'RES-3']
+    logger.close()
+    assert logger.pending() == 3
+
+
+def test_audit_log_reads_include_queued_events(db):
+    db.audit.log('RES-9', 'approve', 'Admin', 'Approved')
+    assert db.audit.pending() == 1
+    entries = db.get_audit_log('RES-9')
+    assert [(e['action'], e['user']) for e in entries] == [('approve', 'Admin')]
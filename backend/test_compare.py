@@ -0,0 +1,90 @@
+"""Tests for comparing saved results"""
+import pytest
+
+from compare import compare_scenarios, scenario_table
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'bawt.db')
+    database = Database(path)
+    yield database
+    database.audit.close()
+    Database._migrated_paths.discard(path)
+
+
+BASE = {
+    'id': 'RES-BASE', 'name': 'Base plan', 'type': 'Optimization',
+    'data': {'allocations': {
+        '1': {'optimized_spend': 100.0, 'optimized_response': 50.0, 'weekly_spend': [50.0, 50.0]},
+        '2': {'optimized_spend': 200.0, 'optimized_response': 80.0, 'weekly_spend': [100.0, 100.0]},
+        '3': {'optimized_spend': 300.0, 'optimized_response': 90.0, 'weekly_spend': [150.0, 150.0]},
+    }},
+}
+SHIFT = {
+    'id': 'RES-SHIFT', 'name': 'Shift to 1', 'type': 'Optimization',
+    'data': {'curves': [
+        {'id': '1', 'spend': 250.0, 'response': 95.0, 'weekly_spend': [100.0, 100.0, 50.0]},
+        {'id': '2', 'spend': 200.0, 'response': 80.0, 'weekly_spend': [100.0, 100.0]},
+        {'id': '4', 'spend': 50.0, 'response': 10.0},
+    ]},
+}
+
+
+def test_deltas_between_two_saved_results(db):
+    db.save_result(BASE)
+    db.save_result(SHIFT)
+    stored = db.get_results_data(['RES-BASE', 'RES-SHIFT'])
+    comparison = compare_scenarios([stored['RES-BASE'], stored['RES-SHIFT']])
+
+    assert comparison['baseline'] == 'RES-BASE'
+    assert comparison['total_curves'] == 4
+    assert comparison['unchanged_curves'] == 1
+    assert comparison['curve_ids'] == ['1', '3', '4']
+
+    base, shift = comparison['scenarios']
+    assert (base['total_spend'], base['total_response']) == (600.0, 220.0)
+    assert shift['spend_delta'] == pytest.approx(-100.0)
+    assert shift['response_delta'] == pytest.approx(-35.0)
+    assert shift['response_lift_pct'] == pytest.approx(-15.9)
+    assert shift['curves_changed'] == 3
+    assert shift['curve_spend_delta'] == [150.0, -300.0, 50.0]
+    assert shift['curve_response_delta'] == [45.0, -90.0, 10.0]
+    # Weekly totals 300, 300 become 200, 200, 50: curve 3 drops out and curve 1 gains a third week
+    assert shift['weekly_spend_delta'] == [-100.0, -100.0, 50.0]
+
+    movers = {m['curve_id']: m for m in shift['movers']}
+    assert [m['curve_id'] for m in shift['movers']] == ['3', '1', '4']
+    assert movers['3']['status'] == 'removed'
+    assert movers['4']['status'] == 'added'
+    assert movers['1']['spend_delta_pct'] == pytest.approx(150.0)
+    assert movers['4']['spend_delta_pct'] is None
+
+
+def test_baseline_can_be_any_compared_result():
+    comparison = compare_scenarios([BASE, SHIFT], baseline='RES-SHIFT', top=1)
+    base, shift = comparison['scenarios']
+    assert base['spend_delta'] == pytest.approx(100.0)
+    assert 'spend_delta' not in shift
+    assert len(base['movers']) == 1
+
+
+def test_allocation_table_rows_are_used_when_data_has_none():
+    table = scenario_table({'id': 'RES-1', 'data': {}, 'allocations': [
+        {'curve_id': 7, 'optimized_spend': 10.0, 'response': 4.0},
+        {'curve_id': 7, 'optimized_spend': 5.0, 'response': 1.0},
+    ]})
+    assert table['source'] == 'allocations_table'
+    assert table['keys'] == ['7']
+    assert table['spend'].tolist() == [15.0]
+    assert table['response'].tolist() == [5.0]
+
+
+def test_invalid_comparisons_are_rejected():
+    with pytest.raises(ValueError):
+        compare_scenarios([BASE])
+    with pytest.raises(ValueError):
+        compare_scenarios([BASE, SHIFT], baseline='RES-OTHER')
+    with pytest.raises(ValueError):
+        compare_scenarios([BASE, {'id': 'RES-EMPTY', 'data': {}}])
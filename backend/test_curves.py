@@ -0,0 +1,94 @@
+"""Tests for response-curve families and adaptive sampling"""
+import math
+
+import numpy as np
+import pytest
+
+import curves
+import metrics
+from cache import LRUCache
+from curves import CurveSet, adaptive_grid, cached_samples, curve_parameters, marginal, response, sample_curve
+
+ROWS = [
+    {'curve_ref': 'H', 'curve_type': 'hill', 'param_a': 1e5, 'param_b': 2.0, 'param_c': 1e6},
+    {'curve_ref': 'A', 'curve_type': 'atan', 'param_a': 1e5, 'param_b': 1.0, 'param_c': 1e6},
+    {'curve_ref': 'S', 'curve_type': 'scurve', 'param_a': 1e5, 'param_b': 1.5, 'param_c': 1e6},
+    {'curve_ref': 'T', 'curve_type': 'tanh', 'param_a': 1e6, 'param_b': 1e5, 'param_c': None},
+]
+
+
+def test_families_match_their_closed_forms():
+    spend = 2e5
+    expected = [1e6 * 4 / 5, 1e6 * (2 / math.pi) * math.atan(2), 1e6 * (1 - math.exp(-2 ** 1.5)),
+                1e6 * math.tanh(2)]
+    assert CurveSet(ROWS).response(np.array([spend] * 4)).tolist() == pytest.approx(expected)
+    # Optimizer dicts are hill curves
+    assert response({'id': 1, 'k': 1e5, 's': 2.0, 'max_response': 1e6}, spend) == pytest.approx(expected[0])
+    assert curve_parameters(ROWS[3]) == ('tanh', 1e5, 1.0, 1e6)
+
+
+def test_marginal_matches_finite_differences():
+    spend = np.linspace(1e4, 5e5, 20)
+    for row in ROWS:
+        h = 1.0
+        numeric = (response(row, spend + h) - response(row, spend - h)) / (2 * h)
+        assert marginal(row, spend) == pytest.approx(numeric, rel=1e-5)
+
+
+def test_saturation_and_zero_spend_limits():
+    assert response(ROWS[0], np.array([0.0, 1e300])).tolist() == pytest.approx([0.0, 1e6])
+    assert marginal(ROWS[0], np.array([1e300]))[0] == 0.0
+    # Concave curves with shape < 1 have an unbounded slope at zero
+    assert marginal(dict(ROWS[1], param_b=0.5), np.array([0.0]))[0] == math.inf
+
+
+def test_invalid_curves_raise():
+    with pytest.raises(ValueError):
+        curve_parameters(dict(ROWS[0], curve_type='cubic'))
+    with pytest.raises(ValueError):
+        curve_parameters(dict(ROWS[1], param_c=None))
+
+
+def test_grid_concentrates_around_the_knee():
+    grid = adaptive_grid(ROWS[0], 64, 1e6)
+    assert len(grid) == 64
+    assert grid[0] == 0.0 and grid[-1] == 1e6
+    assert np.all(np.diff(grid) > 0)
+    steps = np.diff(grid)
+    knee = steps[(grid[:-1] > 5e4) & (grid[:-1] < 2e5)]
+    tail = steps[grid[:-1] > 6e5]
+    assert knee.max() < tail.min()
+
+
+def test_samples_default_to_a_multiple_of_the_scale():
+    samples = sample_curve(ROWS[3], points=16)
+    assert samples['curve_ref'] == 'T' and samples['curve_type'] == 'tanh'
+    assert samples['points'] == len(samples['spend']) == len(samples['mroi']) == 16
+    assert samples['spend'][-1] == curves.SAMPLE_RANGE_MULTIPLE * 1e5
+    assert samples['roi'][0] == 0.0
+    assert samples['roi'][-1] == pytest.approx(samples['response'][-1] / samples['spend'][-1])
+
+
+def test_samples_are_cached_per_curve_version(monkeypatch):
+    monkeypatch.setattr(curves, '_sample_cache', LRUCache('test_curve_samples', maxsize=2))
+    row = dict(ROWS[0], updated_at='2026-01-01')
+    first = cached_samples(row, points=16)
+    assert cached_samples(dict(row), points=16) is first
+    assert cached_samples(dict(row, updated_at='2026-02-01'), points=16) is not first
+    cached_samples(row, points=32)
+    # The LRU bound evicted the least recently used entry
+    assert len(curves._sample_cache) == 2
+    assert cached_samples(row, points=16) is not first
+    metrics.registry.render()
+    assert metrics.cache_hit_ratio.get(cache='test_curve_samples') == pytest.approx(1 / 5)
+
+
+def test_marginal_response_peaks_at_peak_spend():
+    rows = [dict(row, param_b=3.0) if row['curve_type'] != 'tanh' else dict(row, param_c=3.0) for row in ROWS]
+    rows.append(dict(ROWS[0], curve_ref='C', param_b=0.8))
+    curve_set = CurveSet(rows)
+    peak = curve_set.peak_spend()
+    assert peak[:4] / 1e5 == pytest.approx([0.5 ** (1 / 3), 0.5 ** (1 / 6), (2 / 3) ** (1 / 3), 0.8488], abs=1e-4)
+    assert peak[4] == 0.0
+    grid = np.linspace(1.0, 3e5, 300001)
+    assert grid[np.argmax(curve_set.marginal(grid[:, None]), axis=0)][:4] == pytest.approx(peak[:4], rel=1e-4)
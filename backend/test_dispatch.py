@@ -0,0 +1,103 @@
+"""Tests for automatic solver dispatch"""
+import pytest
+
+import dispatch
+from conftest import hill_optimum
+from dispatch import choose, curve_features, estimate, optimize_campaigns, optimize_curves
+
+M = 1e6
+CURVES = [{'id': i, 'k': k, 's': 1.0, 'max_response': M, 'market': 'UK', 'brand': 'A'}
+          for i, k in enumerate((1e5, 2e5, 4e5))]
+CALIBRATION = {
+    'source': 'test',
+    'measured_at': '2026-01-01T00:00:00',
+    'curves': {
+        'concave': {
+            'segments': {'sizes': [10, 100], 'seconds': [0.01, 1.0], 'gap': [0.0, 0.0]},
+            'portfolio': {'sizes': [10, 100], 'seconds': [0.1, 0.2], 'gap': [0.0, 0.0]},
+            'multistart': {'sizes': [10, 100], 'seconds': [0.001, 0.002], 'gap': [0.0, 0.05]},
+        },
+        's_shaped': {
+            'segments': {'sizes': [10, 100], 'seconds': [0.01, 0.02], 'gap': [0.02, 0.03]},
+            'multistart': {'sizes': [10, 100], 'seconds': [1.0, 2.0], 'gap': [0.01, 0.01]},
+        },
+    },
+    'campaigns': {},
+}
+
+
+@pytest.fixture(autouse=True)
+def calibration(monkeypatch):
+    monkeypatch.setattr(dispatch, '_calibration', CALIBRATION)
+
+
+def test_estimates_interpolate_log_log_in_size():
+    seconds, gap = estimate('curves', 'concave', 'segments', 10)
+    assert (seconds, gap) == (0.01, 0.0)
+    # Time grows as n^2 between the measured sizes, and keeps that slope past them
+    assert estimate('curves', 'concave', 'segments', 30)[0] == pytest.approx(0.09)
+    assert estimate('curves', 'concave', 'segments', 1000)[0] == pytest.approx(100.0)
+    # The gap is the worse of the two measured sizes around n
+    assert estimate('curves', 'concave', 'multistart', 50)[1] == 0.05
+    assert estimate('curves', 'concave', 'mroi', 50) is None
+
+
+def test_fastest_method_within_the_gap_wins():
+    # At 60 curves segments (n^2) is slower than portfolio; multistart is outside the gap
+    decision = choose(curve_features(CURVES * 20))
+    assert decision['method'] == 'portfolio'
+    assert 'vs segments' in decision['reason']
+    # At 10 curves multistart is within the gap and fastest
+    assert choose(curve_features(CURVES[:2] * 5))['method'] == 'multistart'
+
+
+def test_most_accurate_method_when_none_is_within_the_gap():
+    curves = [dict(c, s=2.0) for c in CURVES] * 10
+    decision = choose(curve_features(curves), methods=('segments', 'multistart'))
+    assert decision['method'] == 'multistart'
+    assert decision['reason'].startswith('no method came within')
+
+
+def test_uncalibrated_methods_follow_the_fallback_order(monkeypatch):
+    monkeypatch.setattr(dispatch, '_calibration', dict(CALIBRATION, curves={}))
+    decision = choose(curve_features(CURVES))
+    assert decision['method'] == 'segments'
+    assert 'default preference order' in decision['reason']
+
+
+def test_group_constraints_go_to_segments():
+    groups = [{'where': {'market': 'UK'}, 'max': 5e5}]
+    decision = choose(curve_features(CURVES, groups=groups))
+    assert decision['method'] == 'segments'
+    assert decision['reason'].startswith('only valid method')
+
+
+def test_minimize_spend_goes_to_mroi():
+    result = optimize_curves(CURVES, 0, objective='minimize_spend', target=1.5e6)
+    assert result['summary']['dispatch']['method'] == 'mroi'
+    assert result['summary']['achieved'] >= 1.5e6
+
+
+def test_stored_curve_rows_rule_out_mroi():
+    rows = [{'curve_ref': c['id'], 'curve_type': 'hill', 'param_a': c['k'], 'param_b': c['s'],
+             'param_c': c['max_response']} for c in CURVES]
+    decision = choose(curve_features(rows))
+    mroi, = (c for c in decision['candidates'] if c['method'] == 'mroi')
+    assert not mroi['valid']
+    with pytest.raises(ValueError):
+        choose(curve_features(rows), method='mroi')
+
+
+def test_dispatched_solve_reaches_the_closed_form_optimum():
+    _, optimum, _ = hill_optimum(CURVES, 6e5)
+    result = optimize_curves(CURVES, 6e5)
+    assert result['summary']['total_optimized_response'] == pytest.approx(optimum, rel=1e-5)
+    assert result['summary']['dispatch']['elapsed_ms'] >= 0
+
+
+def test_flighting_rules_go_to_the_flighting_solver():
+    campaigns = [{'campaignproduct': 'A', 'alpha': 2.0, 'beta': 1.0, 'spend_max': 5e5,
+                  'W': [1.0] * 52, 'C': [1] * 52}]
+    results = optimize_campaigns(campaigns, 2e5, flighting={'min_weekly_spend': 5000})
+    assert results['dispatch']['method'] == 'flighting'
+    assert results['solver'] == 'Flighting'
@@ -0,0 +1,92 @@
+"""Tests for batch curve fitting"""
+import numpy as np
+import pytest
+
+from database import Database
+from fitting import adstock, fit_curves, refit
+
+WEEKS = 80
+RATE = 0.3
+
+
+def history(curve_ref, scale, shape, top, family='hill', noise=0.0, seed=0):
+    """Weekly spend and the response of a curve with adstock RATE and scale in adstocked units."""
+    rng = np.random.default_rng(seed)
+    spend = rng.uniform(0, 3 * scale * (1 - RATE), WEEKS)
+    carried = adstock(spend[:, None], np.array([RATE]))[0, :, 0]
+    u = (carried / scale) ** shape
+    response = top * (np.tanh(u) if family == 'tanh' else u / (1 + u))
+    response = response * (1 + noise * rng.standard_normal(WEEKS))
+    return {'curve_ref': curve_ref, 'curve_type': family, 'spend': spend.tolist(), 'response': response.tolist()}
+
+
+def test_recovers_noiseless_hill_parameters():
+    fit, = fit_curves([history(1, 2e5, 1.5, 1e6)])
+    assert fit['curve_type'] == 'hill'
+    assert fit['adstock'] == pytest.approx(RATE)
+    # Scale is stored in steady-state weekly spend: 2e5 adstocked is 2e5 * (1 - rate) per week
+    assert fit['param_a'] == pytest.approx(2e5 * (1 - RATE), rel=1e-4)
+    assert fit['param_b'] == pytest.approx(1.5, rel=1e-4)
+    assert fit['param_c'] == pytest.approx(1e6, rel=1e-4)
+    assert fit['r2'] == pytest.approx(1.0)
+    assert fit['converged']
+
+
+def test_tanh_stores_top_first():
+    fit, = fit_curves([history(2, 1e5, 1.0, 5e5, family='tanh')])
+    assert fit['param_a'] == pytest.approx(5e5, rel=1e-4)
+    assert fit['param_b'] == pytest.approx(1e5 * (1 - RATE), rel=1e-4)
+    assert fit['param_c'] == pytest.approx(1.0, rel=1e-4)
+
+
+def test_standard_errors_grow_with_noise():
+    quiet, loud = fit_curves([history(1, 2e5, 1.5, 1e6, noise=0.01, seed=1),
+                              history(2, 2e5, 1.5, 1e6, noise=0.1, seed=1)])
+    for column in ('param_a_se', 'param_b_se', 'param_c_se'):
+        assert 0 < quiet[column] < loud[column]
+    assert loud['param_c'] == pytest.approx(1e6, rel=0.2)
+
+
+def test_auto_family_picks_the_generating_family():
+    fit, = fit_curves([history(1, 1e5, 1.0, 5e5, family='tanh')], family='auto')
+    assert fit['curve_type'] == 'tanh'
+
+
+def test_invalid_history_is_rejected():
+    short = history(1, 2e5, 1.5, 1e6)
+    short['spend'], short['response'] = short['spend'][:5], short['response'][:5]
+    with pytest.raises(ValueError):
+        fit_curves([short])
+    with pytest.raises(ValueError):
+        fit_curves([history(1, 2e5, 1.5, 1e6)], family='logistic')
+
+
+def test_pooled_chunks_match_in_process(pool, monkeypatch):
+    monkeypatch.setattr('fitting.CURVES_PER_WORKER', 2)
+    series = [history(i, 1e5 * (1 + i), 1.0 + 0.2 * i, 1e6, noise=0.05, seed=i) for i in range(4)]
+    assert fit_curves(series, workers=2) == fit_curves(series, workers=1)
+
+
+def test_refit_writes_parameters_and_errors_but_keeps_other_columns(tmp_path):
+    db = Database(str(tmp_path / 'bawt.db'))
+    db.save_curve({'curve_ref': 7, 'curve_type': 'hill', 'param_a': 1.0, 'param_b': 1.0, 'param_c': 1.0,
+                   'param_d': 42.0})
+    series = history(7, 2e5, 1.5, 1e6, noise=0.02, seed=3)
+    weeks = [f'2024-W{t:02d}' if t < 53 else f'2025-W{t - 52:02d}' for t in range(1, WEEKS + 1)]
+    for week, spend in zip(weeks, series['spend']):
+        db.save_weekly_spend(7, week, spend)
+    db.save_weekly_responses([{'curve_ref': 7, 'week': w, 'response': r} for w, r in zip(weeks, series['response'])])
+
+    result = refit(db)
+    assert result['summary']['fitted'] == 1
+    assert result['summary']['written']
+
+    curve = db.get_curve(7)
+    stored, = db.get_curve_fits(7)
+    fit, = result['fits']
+    assert curve['param_d'] == 42.0
+    assert curve['param_a'] == pytest.approx(fit['param_a'])
+    assert curve['adstock'] == pytest.approx(fit['adstock'])
+    for column in ('param_a_se', 'param_b_se', 'param_c_se'):
+        assert stored[column] == pytest.approx(fit[column])
+    db.audit.close()
@@ -0,0 +1,56 @@
+"""Tests for the flighting optimizer"""
+import math
+
+import pytest
+
+from flighting import SCALE_FACTOR, optimize_flighting
+
+
+def campaign(name, alpha=2.0, beta=1.0, spend_max=520000, **extra):
+    return {'campaignproduct': name, 'alpha': alpha, 'beta': beta, 'spend_max': spend_max,
+            'spend_min': 0, 'W': [1.0] * 52, 'C': [1] * 52, **extra}
+
+
+def test_flat_concave_campaign_spends_evenly():
+    # With flat seasonality and beta = 1 the optimum spreads the budget evenly,
+    # which reproduces the annual curve: scale_factor * tanh(alpha * budget / spend_max)
+    result = optimize_flighting([campaign('A')], 260000)
+    row = result['campaigns'][0]
+    assert result['total_spend'] == pytest.approx(260000, rel=1e-6)
+    assert result['total_profit'] == pytest.approx(SCALE_FACTOR * math.tanh(2.0 * 0.5), rel=1e-3)
+    assert max(row['weekly_spend']) == pytest.approx(min(row['weekly_spend']), rel=1e-3)
+
+
+def test_weeks_not_considered_get_no_spend():
+    c = [1] * 26 + [0] * 26
+    result = optimize_flighting([campaign('A', C=c)], 200000)
+    weekly = result['campaigns'][0]['weekly_spend']
+    assert all(spend == 0 for spend in weekly[26:])
+    assert sum(weekly[:26]) == pytest.approx(200000, rel=1e-6)
+
+
+def test_zero_weekly_cap_drops_the_campaign():
+    result = optimize_flighting([campaign('A'), campaign('B', max_weekly_spend=0)], 200000)
+    assert sum(result['campaigns'][1]['weekly_spend']) == 0
+    assert result['total_spend'] == pytest.approx(200000, rel=1e-6)
+
+
+def test_burst_rules_are_respected():
+    seasonality = [round(1 + 0.8 * math.sin(2 * math.pi * week / 52), 3) for week in range(52)]
+    campaigns = [campaign('A', alpha=1.5, W=seasonality), campaign('B', alpha=1.0, beta=1.4, W=seasonality[::-1])]
+    options = {'min_weekly_spend': 8000, 'min_run_weeks': 4}
+    result = optimize_flighting(campaigns, 600000, options)
+    assert result['total_spend'] <= 600000 * (1 + 1e-6)
+    assert result['total_profit'] <= result['relaxed_profit'] * (1 + 1e-9)
+    for row in result['campaigns']:
+        assert row['flights']
+        for start, end in row['flights']:
+            assert end - start + 1 >= 4
+            assert all(spend >= 8000 - 1e-2 for spend in row['weekly_spend'][start - 1:end])
+        on = sum(end - start + 1 for start, end in row['flights'])
+        assert sum(1 for spend in row['weekly_spend'] if spend > 0) == on
+
+
+def test_spend_min_above_budget_is_rejected():
+    with pytest.raises(ValueError):
+        optimize_flighting([campaign('A', spend_min=500000)], 100000)
@@ -0,0 +1,66 @@
+"""Tests for group constraints and the grouped LP allocation"""
+import pytest
+
+from groups import optimize_grouped
+
+M, K = 1e6, 1e5
+BUDGET = 9e5
+CURVES = [
+    {'id': 1, 'k': K, 's': 1.0, 'max_response': M, 'market': 'UK', 'channel': 'TV'},
+    {'id': 2, 'k': K, 's': 1.0, 'max_response': M, 'market': 'DE', 'channel': 'TV'},
+    {'id': 3, 'k': K, 's': 1.0, 'max_response': M, 'market': 'UK', 'channel': 'Digital'},
+]
+
+
+def spends(result):
+    return {cid: a['optimized_spend'] for cid, a in result['allocations'].items()}
+
+
+def hill(x):
+    return M * x / (K + x)
+
+
+def test_without_groups_identical_curves_split_evenly():
+    result = optimize_grouped(CURVES, BUDGET)
+    for spend in spends(result).values():
+        assert spend == pytest.approx(BUDGET / 3, rel=1e-3)
+    assert result['summary']['total_optimized_response'] == pytest.approx(3 * hill(BUDGET / 3), rel=1e-6)
+
+
+def test_binding_share_cap_splits_the_capped_group_evenly():
+    # The even split puts 2/3 of the budget on TV; capped at 40% the two TV curves share 0.4 B
+    groups = [{'name': 'TV cap', 'where': {'channel': 'TV'}, 'max_share': 0.4}]
+    result = optimize_grouped(CURVES, BUDGET, groups=groups)
+    spend = spends(result)
+    assert spend[1] == pytest.approx(0.2 * BUDGET, rel=1e-3)
+    assert spend[2] == pytest.approx(0.2 * BUDGET, rel=1e-3)
+    assert spend[3] == pytest.approx(0.6 * BUDGET, rel=1e-3)
+    assert result['summary']['total_optimized_response'] == pytest.approx(
+        2 * hill(0.2 * BUDGET) + hill(0.6 * BUDGET), rel=1e-6)
+    report, = result['groups']
+    assert report['binding']
+    assert report['share'] == pytest.approx(0.4, abs=1e-4)
+    assert result['summary']['group_violation'] == 0
+
+
+def test_amount_floor_on_a_market():
+    groups = [{'where': {'market': 'DE'}, 'min': 5e5}]
+    result = optimize_grouped(CURVES, BUDGET, groups=groups)
+    spend = spends(result)
+    assert spend[2] == pytest.approx(5e5, rel=1e-3)
+    assert spend[1] == pytest.approx(2e5, rel=1e-3)
+    assert spend[3] == pytest.approx(2e5, rel=1e-3)
+    assert result['groups'][0]['binding']
+
+
+def test_slack_group_leaves_the_optimum_alone():
+    groups = [{'where': {'market': ['UK', 'DE']}, 'max': 2 * BUDGET}]
+    result = optimize_grouped(CURVES, BUDGET, groups=groups)
+    assert not result['groups'][0]['binding']
+    for spend in spends(result).values():
+        assert spend == pytest.approx(BUDGET / 3, rel=1e-3)
+
+
+def test_group_matching_no_curves_is_rejected():
+    with pytest.raises(ValueError):
+        optimize_grouped(CURVES, BUDGET, groups=[{'where': {'market': 'FR'}, 'max': 1}])
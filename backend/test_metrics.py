@@ -0,0 +1,69 @@
+"""Tests for the Prometheus metrics registry"""
+from flask import Flask
+
+import metrics
+from metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram('test_seconds', 'Test latency', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value, route='/api/x')
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP test_seconds Test latency', '# TYPE test_seconds histogram']
+    assert lines[2:] == [
+        'test_seconds_bucket{route="/api/x",le="0.1"} 1',
+        'test_seconds_bucket{route="/api/x",le="1"} 3',
+        'test_seconds_bucket{route="/api/x",le="+Inf"} 4',
+        'test_seconds_sum{route="/api/x"} 4.25',
+        'test_seconds_count{route="/api/x"} 4',
+    ]
+
+
+def test_counters_and_gauges_by_label():
+    registry = MetricsRegistry()
+    runs = registry.counter('test_runs_total', 'Runs', ('solver',))
+    depth = registry.gauge('test_depth', 'Depth')
+    runs.inc(solver='a')
+    runs.inc(2, solver='b')
+    runs.inc(solver='a')
+    depth.inc(5)
+    depth.dec(2)
+    assert runs.get(solver='a') == 2
+    assert depth.get() == 3
+    assert 'test_runs_total{solver="b"} 2' in registry.render()
+    # Registering a name again returns the existing metric
+    assert registry.counter('test_runs_total', 'Runs', ('solver',)) is runs
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.gauge('test_info', 'Info', ('name',)).set(1, name='a "b"\\c\n')
+    assert 'test_info{name="a \\"b\\"\\\\c\\n"} 1' in registry.render()
+
+
+def test_cache_hit_ratio_is_derived_on_render():
+    metrics.record_cache('test_cache', True)
+    metrics.record_cache('test_cache', True)
+    metrics.record_cache('test_cache', False)
+    metrics.registry.render()
+    assert metrics.cache_hit_ratio.get(cache='test_cache') == 2 / 3
+
+
+def test_requests_are_timed_per_route():
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/test/items/<int:item>')
+    def item(item):
+        return {'item': item}
+
+    before = metrics.http_request_duration._values.get(('GET', '/test/items/<int:item>', '200'))
+    before = before['count'] if before else 0
+    client = app.test_client()
+    for i in range(3):
+        assert client.get(f'/test/items/{i}').status_code == 200
+    state = metrics.http_request_duration._values[('GET', '/test/items/<int:item>', '200')]
+    assert state['count'] == before + 3
+    assert metrics.http_requests_in_flight.get(route='/test/items/<int:item>') == 0
@@ -0,0 +1,71 @@
+"""Tests for versioned schema migrations and explicit seeding"""
+import sqlite3
+
+import pytest
+
+from database import MIGRATIONS, SCHEMA_VERSION, Database
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'bawt.db')
+    yield path
+    Database._migrated_paths.discard(path)
+
+
+def open_db(path):
+    """A Database that re-checks the file, as a new process would."""
+    Database._migrated_paths.discard(path)
+    db = Database(path)
+    db.audit.close()
+    return db
+
+
+def tables(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+
+def test_new_database_is_migrated_but_not_seeded(db_path):
+    db = open_db(db_path)
+    assert db.schema_version() == SCHEMA_VERSION
+    assert {'response_curves', 'results', 'weekly_spend', 'weekly_response', 'curve_fits'} <= tables(db_path)
+    assert db.get_curves() == []
+    assert db.get_all_results() == []
+
+
+def test_migrating_again_is_a_no_op(db_path):
+    db = open_db(db_path)
+    db.save_curve({'curve_ref': 1, 'curve_type': 'hill', 'param_a': 1e5, 'param_b': 1.0, 'param_c': 1e6})
+    assert open_db(db_path).migrate() == SCHEMA_VERSION
+    Database._migrated_paths.discard(db_path)
+    assert db.migrate() == SCHEMA_VERSION
+    assert db.schema_version() == SCHEMA_VERSION
+    assert [c['curve_ref'] for c in db.get_curves()] == [1]
+
+
+def test_seed_only_fills_empty_tables(db_path):
+    db = open_db(db_path)
+    db.seed()
+    curves, results = len(db.get_curves()), len(db.get_all_results())
+    assert curves and results
+    db.seed()
+    assert len(db.get_curves()) == curves
+    assert len(db.get_all_results()) == results
+
+
+def test_failed_migration_rolls_back(db_path, monkeypatch):
+    broken = MIGRATIONS + [(SCHEMA_VERSION + 1, 'Broken', ['CREATE TABLE extra (id INTEGER)', 'NOT SQL'])]
+    monkeypatch.setattr('database.MIGRATIONS', broken)
+    monkeypatch.setattr('database.SCHEMA_VERSION', SCHEMA_VERSION + 1)
+    with pytest.raises(sqlite3.OperationalError):
+        open_db(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    finally:
+        conn.close()
+    assert tables(db_path) <= {'sqlite_sequence'}
@@ -0,0 +1,41 @@
+"""Tests for MMMOptimizer's minimize_spend objective"""
+import pytest
+
+from conftest import hill_optimum
+from optimizer import MMMOptimizer
+
+M = 1e6
+CURVES = [
+    {'id': 'a', 'k': 1e5, 's': 1.0, 'max_response': M},
+    {'id': 'b', 'k': 2e5, 's': 1.0, 'max_response': M},
+]
+
+
+def test_matches_closed_form():
+    result = MMMOptimizer().optimize(CURVES, {}, 0, objective='minimize_spend', target=1e6)
+    expected, _, _ = hill_optimum(CURVES, target=1e6)
+    summary = result['summary']
+    assert summary['converged']
+    assert summary['achieved'] >= 1e6
+    assert summary['total_budget'] == pytest.approx(sum(expected), rel=1e-3)
+    for c, spend in zip(CURVES, expected):
+        assert result['allocations'][c['id']]['optimized_spend'] == pytest.approx(spend, rel=1e-3)
+
+
+def test_minimum_bound_is_respected():
+    constraints = {'b': {'min': 250000}}
+    result = MMMOptimizer().optimize(CURVES, {}, 0, constraints=constraints,
+                                     objective='minimize_spend', target=1e6)
+    assert result['allocations']['b']['optimized_spend'] >= 250000 - 1e-6
+    assert result['summary']['achieved'] >= 1e6
+
+
+def test_unreachable_target_is_rejected():
+    with pytest.raises(ValueError):
+        MMMOptimizer().optimize(CURVES, {}, 0, constraints={'a': {'max': 1e5}, 'b': {'max': 1e5}},
+                                objective='minimize_spend', target=1.5e6)
+
+
+def test_requires_a_target():
+    with pytest.raises(ValueError):
+        MMMOptimizer().optimize(CURVES, {}, 0, objective='minimize_spend')
@@ -0,0 +1,51 @@
+"""Tests for the multi-start global search"""
+import pytest
+
+from conftest import hill_optimum
+from multistart import multistart
+
+M = 1e6
+
+
+def test_concave_curves_reach_the_closed_form_optimum():
+    curves = [{'id': i, 'k': k, 's': 1.0, 'max_response': M} for i, k in enumerate((1e5, 2e5, 4e5))]
+    result = multistart(curves, 6e5, starts=4, seed=1)
+    assert result['summary']['total_optimized_response'] == pytest.approx(hill_optimum(curves, 6e5)[1], rel=1e-6)
+
+
+def test_s_curves_concentrate_a_small_budget():
+    # Two identical S-curves: half the budget each reaches 2/9 M, all of it in one reaches M / 2
+    curves = [{'id': i, 'k': 1e5, 's': 3.0, 'max_response': M} for i in range(2)]
+    result = multistart(curves, 1e5, starts=8, seed=1)
+    spends = sorted(a['optimized_spend'] for a in result['allocations'].values())
+    assert result['summary']['total_optimized_response'] == pytest.approx(M / 2, rel=1e-4)
+    assert spends[0] == pytest.approx(0, abs=1.0)
+
+
+def test_bounds_and_budget_are_respected():
+    curves = [{'id': i, 'k': 1e5, 's': 2.0, 'max_response': M} for i in range(4)]
+    constraints = {0: {'min': 5e4}, 1: {'max': 2e4}}
+    result = multistart(curves, 3e5, constraints, starts=6, seed=2)
+    spends = {cid: a['optimized_spend'] for cid, a in result['allocations'].items()}
+    assert sum(spends.values()) == pytest.approx(3e5, rel=1e-6)
+    assert spends[0] >= 5e4 - 1e-6
+    assert spends[1] <= 2e4 + 1e-6
+
+
+def test_time_budget_stops_running_solves():
+    curves = [{'id': i, 'k': 1e5 * (1 + i % 7), 's': 1.5 + i % 3, 'max_response': M} for i in range(300)]
+    result = multistart(curves, 3e7, starts=64, time_budget=0.05, seed=3)
+    stats = result['summary']['multistart']
+    assert stats['timed_out']
+    assert stats['completed'] >= 1
+    assert stats['elapsed_ms'] < 1000
+
+
+def test_pooled_solves_match_in_process_solves(pool):
+    curves = [{'id': i, 'k': 1e5 * (1 + i), 's': 1.0 + 0.5 * i, 'max_response': M} for i in range(6)]
+    serial = multistart(curves, 8e5, starts=6, workers=1, seed=4)
+    pooled = multistart(curves, 8e5, starts=6, workers=2, time_budget=30, seed=4)
+    assert pooled['summary']['multistart']['workers'] == 2
+    assert pooled['summary']['multistart']['completed'] == 6
+    assert pooled['summary']['total_optimized_response'] == pytest.approx(
+        serial['summary']['total_optimized_response'], rel=1e-9)
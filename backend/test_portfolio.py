@@ -0,0 +1,69 @@
+"""Tests for portfolio optimization by dual decomposition"""
+import numpy as np
+import pytest
+
+from conftest import hill_optimum
+from curves import CurveSet
+from portfolio import Partition, optimize_portfolio
+
+M = 1e6
+BUDGET = 2e6
+CURVES = [
+    {'id': f'{market}-{i}', 'k': k, 's': 1.0, 'max_response': M, 'market': market, 'brand': 'A'}
+    for market in ('UK', 'DE', 'FR') for i, k in enumerate((1e5, 3e5))
+]
+
+
+def test_matches_the_closed_form_optimum():
+    spends, _, u = hill_optimum(CURVES, BUDGET)
+    result = optimize_portfolio(CURVES, BUDGET)
+    summary = result['summary']
+    assert summary['converged']
+    assert abs(summary['portfolio']['imbalance']) <= 1e-6 * BUDGET
+    assert summary['portfolio']['price'] == pytest.approx(1 / u ** 2, rel=1e-4)
+    for c, spend in zip(CURVES, spends):
+        assert result['allocations'][c['id']]['optimized_spend'] == pytest.approx(spend, rel=1e-4)
+
+
+def test_identical_markets_get_equal_shares():
+    result = optimize_portfolio(CURVES, BUDGET)
+    assert [p['market'] for p in result['partitions']] == ['UK', 'DE', 'FR']
+    for p in result['partitions']:
+        assert p['curves'] == 2
+        assert p['share'] == pytest.approx(1 / 3, abs=1e-4)
+
+
+def test_capped_curve_releases_budget_to_the_rest():
+    constraints = {'UK-0': {'max': 1e5}}
+    result = optimize_portfolio(CURVES, BUDGET, constraints)
+    spends, _, _ = hill_optimum(CURVES[1:], BUDGET - 1e5)
+    assert result['allocations']['UK-0']['optimized_spend'] == pytest.approx(1e5, rel=1e-6)
+    for c, spend in zip(CURVES[1:], spends):
+        assert result['allocations'][c['id']]['optimized_spend'] == pytest.approx(spend, rel=1e-4)
+
+
+def test_pooled_partitions_match_in_process(pool):
+    serial = optimize_portfolio(CURVES, BUDGET, workers=1)
+    pooled = optimize_portfolio(CURVES, BUDGET, workers=2)
+    assert pooled['summary']['portfolio']['workers'] == 2
+    for cid, allocation in serial['allocations'].items():
+        assert pooled['allocations'][cid]['optimized_spend'] == pytest.approx(
+            allocation['optimized_spend'], rel=1e-6)
+
+
+def test_s_shaped_curves_are_solved_on_their_falling_branch():
+    rows = [{'curve_ref': family, 'curve_type': family, 'param_a': 1e5, 'param_b': 3.0, 'param_c': 1e6}
+            for family in ('hill', 'atan', 'scurve')]
+    rows.append({'curve_ref': 'tanh', 'curve_type': 'tanh', 'param_a': 1e6, 'param_b': 1e5, 'param_c': 3.0})
+    n = len(rows)
+    part = Partition({}, rows, np.arange(n), np.zeros(n), np.full(n, np.inf))
+    grid = np.linspace(1.0, 4e5, 400001)
+    curve_set = CurveSet(rows)
+    peak = grid[np.argmax(curve_set.marginal(grid[:, None]), axis=0)]
+    assert part.branch == pytest.approx(peak, rel=1e-4)
+    assert part.m_branch == pytest.approx(curve_set.marginal(grid[:, None]).max(axis=0), rel=1e-6)
+    prices = part.m_branch * 0.5
+    spend = part.spend(prices)
+    for i in range(n):
+        assert spend[i, i] > peak[i]
+        assert curve_set.marginal(spend[i])[i] == pytest.approx(prices[i], rel=1e-6)
@@ -0,0 +1,62 @@
+"""Tests for robust optimization over sampled curve parameters"""
+import numpy as np
+import pytest
+
+from conftest import hill_optimum
+from robust import RobustProblem, robust_optimize
+
+BUDGET = 6e5
+CURVES = [
+    {'id': 'a', 'k': 1e5, 's': 1.0, 'max_response': 1e6},
+    {'id': 'b', 'k': 2e5, 's': 1.0, 'max_response': 2e6},
+    {'id': 'c', 'k': 4e5, 's': 1.0, 'max_response': 1e6},
+]
+
+
+def optimum_for_tops(tops, budget):
+    """Optimal spend per curve id with each curve's top replaced."""
+    spends, _, _ = hill_optimum([dict(c, max_response=top) for c, top in zip(CURVES, tops)], budget)
+    return {c['id']: x for c, x in zip(CURVES, spends)}
+
+
+def spends(result):
+    return {cid: a['optimized_spend'] for cid, a in result['allocations'].items()}
+
+
+def test_without_uncertainty_matches_the_point_optimum():
+    result = robust_optimize(CURVES, BUDGET, samples=20, seed=1)
+    robust = result['summary']['robust']
+    assert robust['uncertain_parameters'] == []
+    assert robust['objective_gain'] == pytest.approx(0, abs=1e-2)
+    expected = optimum_for_tops([c['max_response'] for c in CURVES], BUDGET)
+    for cid, spend in spends(result).items():
+        assert spend == pytest.approx(expected[cid], rel=1e-4)
+
+
+def test_expected_response_optimum_uses_the_mean_drawn_top():
+    # Response is linear in top, so the expected objective is the point problem with mean tops
+    specs = {'default': {'top': {'cv': 0.3}}}
+    result = robust_optimize(CURVES, BUDGET, specs=specs, samples=400, seed=2)
+    drawn = RobustProblem(CURVES, BUDGET, specs=specs, samples=400, seed=2).scenarios.top
+    expected = optimum_for_tops(np.mean(drawn, axis=0), BUDGET)
+    for cid, spend in spends(result).items():
+        assert spend == pytest.approx(expected[cid], rel=1e-3)
+
+
+def test_cvar_plan_improves_the_downside():
+    specs = {'b': {'top': {'cv': 0.6}}, 'default': {'top': {'cv': 0.05}}}
+    result = robust_optimize(CURVES, BUDGET, specs=specs, objective='cvar', alpha=0.1, samples=500, seed=3)
+    robust = result['summary']['robust']
+    assert robust['robust_plan']['cvar'] <= robust['robust_plan']['expected']
+    assert robust['objective_gain'] > 0
+    assert robust['nominal_response_cost'] >= 0
+    # Trusting b less moves budget away from it
+    assert result['allocations']['b']['optimized_spend'] < optimum_for_tops([1e6, 2e6, 1e6], BUDGET)['b']
+    assert sum(spends(result).values()) == pytest.approx(BUDGET, rel=1e-6)
+
+
+def test_invalid_settings_are_rejected():
+    with pytest.raises(ValueError):
+        robust_optimize(CURVES, BUDGET, objective='worst_case')
+    with pytest.raises(ValueError):
+        robust_optimize(CURVES, BUDGET, objective='cvar', alpha=0)
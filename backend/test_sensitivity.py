@@ -0,0 +1,81 @@
+"""Tests for shadow prices of the budget and binding bounds"""
+import numpy as np
+import pytest
+
+from conftest import hill_optimum
+from optimizer import MMMOptimizer
+from sensitivity import shadow_prices
+
+M = 1e6
+CURVES = [
+    {'id': 'a', 'k': 1e5, 's': 1.0, 'max_response': M},
+    {'id': 'b', 'k': 2e5, 's': 1.0, 'max_response': M},
+    {'id': 'c', 'k': 4e5, 's': 1.0, 'max_response': M},
+]
+BUDGET = 6e5
+EPSILON = MMMOptimizer().epsilon
+# Small shifts so the mROI shuffle settles instead of oscillating
+OPTIONS = {'step_size': 0.01, 'max_iterations': 2000}
+
+
+def test_prices_follow_from_the_final_gradient():
+    report = shadow_prices(['a', 'b', 'c', 'd'], spend=np.array([50.0, 100.0, 20.0, 0.0]),
+                           gradient=np.array([2.0, 3.0, 1.5, 0.5]), lower=np.array([0, 0, 20, 0]),
+                           upper=np.array([np.inf, 100, np.inf, np.inf]), budget=170.0,
+                           labels=['TV', 'Search', 'Social', 'Radio'])
+    assert report['budget'] == {'constraint': 'budget', 'shadow_price': 2.0, 'binding': True,
+                                'units': 'response per unit of budget', 'relaxed_by_10pct': 34.0}
+    cap, floor = report['constraints']
+    assert (cap['name'], cap['bound'], cap['shadow_price'], cap['relaxed_by_10pct']) == ('Search', 'max', 1.0, 10.0)
+    # A floor above the free curves' price costs response; lowering it would gain
+    assert (floor['name'], floor['bound'], floor['shadow_price'], floor['relaxed_by_10pct']) == ('Social', 'min', -0.5, 1.0)
+    # Zero spend on a zero floor is non-negativity, not a planner constraint
+    assert all(c['id'] != 'd' for c in report['constraints'])
+
+
+def test_slack_budget_limit_has_no_price():
+    report = shadow_prices(['a'], np.array([50.0]), np.array([2.0]), np.zeros(1), np.full(1, np.inf),
+                           budget=100.0, budget_equality=False)
+    assert report['budget']['shadow_price'] == 0.0
+    assert not report['budget']['binding']
+
+
+def test_budget_price_matches_the_closed_form():
+    # The price is the common mROI 1/u^2
+    _, _, u = hill_optimum(CURVES, BUDGET)
+    result = MMMOptimizer().optimize(CURVES, {}, BUDGET, options=OPTIONS, sensitivity=True)
+    assert result['summary']['converged']
+    report = result['summary']['sensitivity']
+    # The shuffle stops once marginal returns agree to within epsilon
+    assert report['budget']['shadow_price'] == pytest.approx(1 / u ** 2, rel=EPSILON)
+    assert report['budget']['relaxed_by_10pct'] == pytest.approx(0.1 * BUDGET / u ** 2, rel=EPSILON)
+    assert report['constraints'] == []
+    assert report['stationarity'] < EPSILON
+
+
+def test_cap_is_priced_at_its_excess_marginal_return():
+    cap = 1.5e5
+    # The uncapped curves share the rest of the budget in closed form
+    _, _, u = hill_optimum(CURVES[1:], BUDGET - cap)
+    a = CURVES[0]
+    excess = M * a['k'] / (a['k'] + cap) ** 2 - 1 / u ** 2
+    result = MMMOptimizer().optimize(CURVES, {'a': 1e5, 'b': 2.5e5, 'c': 2.5e5}, BUDGET,
+                                     constraints={'a': {'min': 0, 'max': cap}}, options=OPTIONS,
+                                     sensitivity=True)
+    report = result['summary']['sensitivity']
+    entry, = report['constraints']
+    assert (entry['id'], entry['bound'], entry['value'], entry['spend']) == ('a', 'max', cap, cap)
+    assert report['budget']['shadow_price'] == pytest.approx(1 / u ** 2, rel=EPSILON)
+    assert entry['shadow_price'] == pytest.approx(excess, abs=EPSILON / u ** 2)
+    assert entry['relaxed_by_10pct'] == pytest.approx(entry['shadow_price'] * 0.1 * cap, abs=0.01)
+
+
+def test_target_price_is_spend_per_unit_of_kpi():
+    target = 1.2e6
+    # Total spend is u sum(sqrt(M k)) - sum(k), so dS/dT = u^2
+    _, _, u = hill_optimum(CURVES, target=target)
+    result = MMMOptimizer().optimize(CURVES, {}, 0, objective='minimize_spend', target=target, sensitivity=True)
+    report = result['summary']['sensitivity']
+    assert report['budget']['constraint'] == 'target'
+    assert report['budget']['shadow_price'] == pytest.approx(u ** 2, rel=1e-3)
+    assert report['units'] == 'spend per unit of bound'
@@ -0,0 +1,108 @@
+"""Tests for the fast JSON provider and columnar payloads"""
+import dataclasses
+import datetime
+import decimal
+import json
+import uuid
+
+import numpy as np
+from flask import Flask, jsonify
+
+import serialization
+from serialization import (FastJSONProvider, campaigns_from_columnar, columnar_campaign_results,
+                           columnar_optimization, dumps, is_columnar, loads, rows_to_columns)
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: float
+
+
+def test_numpy_values_encode_natively():
+    payload = {'array': np.arange(3), 'matrix': np.eye(2), 'scalar': np.float32(0.5), 'count': np.int64(7)}
+    assert loads(dumps(payload)) == {'array': [0, 1, 2], 'matrix': [[1.0, 0.0], [0.0, 1.0]],
+                                     'scalar': 0.5, 'count': 7}
+
+
+def test_non_finite_floats_become_null():
+    payload = {'nan': float('nan'), 'values': [1.0, float('inf'), np.float64('-inf')],
+               'array': np.array([np.nan, 2.0])}
+    assert loads(dumps(payload)) == {'nan': None, 'values': [1.0, None, None], 'array': [None, 2.0]}
+
+
+def test_flask_default_types_are_kept():
+    stamp = datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+    key = uuid.UUID(int=1)
+    payload = {'date': datetime.date(2026, 1, 2), 'stamp': stamp, 'amount': decimal.Decimal('1.50'),
+               'id': key, 'point': Point(1, 2.5)}
+    out = loads(dumps(payload))
+    assert out['date'] == 'Fri, 02 Jan 2026 00:00:00 GMT'
+    assert out['stamp'] == 'Fri, 02 Jan 2026 03:04:05 GMT'
+    assert out['amount'] == '1.50'
+    assert out['id'] == str(key)
+    assert out['point'] == {'x': 1, 'y': 2.5}
+
+
+def test_json_dumps_options_are_honoured(monkeypatch):
+    monkeypatch.setattr(serialization, 'HAS_ORJSON', False)
+    assert dumps({'b': 1, 'a': 2}) == b'{"b":1,"a":2}'
+    assert dumps({'b': 1, 'a': 2}, sort_keys=True) == b'{"a":2,"b":1}'
+    assert dumps({'a': [1]}, indent=2) == json.dumps({'a': [1]}, indent=2).encode()
+
+
+def test_provider_serves_numpy_results():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+
+    @app.route('/result')
+    def result():
+        return jsonify({'spend': np.array([1.5, np.nan]), 'total': np.float64(1.5)})
+
+    response = app.test_client().get('/result')
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == {'spend': [1.5, None], 'total': 1.5}
+
+
+def test_provider_keeps_flask_key_order_and_layout():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+
+    @app.route('/result')
+    def result():
+        return jsonify({'b': 1, 'a': np.int64(2)})
+
+    client = app.test_client()
+    assert client.get('/result').data == b'{"a":2,"b":1}\n'
+    app.json.compact = False
+    assert client.get('/result').data == b'{\n  "a": 2,\n  "b": 1\n}\n'
+    app.json.sort_keys = False
+    assert app.json.dumps({'b': 1, 'a': 2}) == '{"b":1,"a":2}'
+
+
+def test_rows_become_parallel_arrays():
+    rows = [{'curve_id': 'A', 'spend': 1.0}, {'curve_id': 'B', 'spend': 2.0}]
+    assert rows_to_columns(rows) == {'curve_id': ['A', 'B'], 'spend': [1.0, 2.0]}
+    assert rows_to_columns([]) == {}
+    result = columnar_optimization({'allocations': {'A': rows[0], 'B': rows[1]}, 'summary': {'total': 3.0}})
+    assert result['allocations'] == {'curve_id': ['A', 'B'], 'spend': [1.0, 2.0]}
+    assert result['summary'] == {'total': 3.0}
+    assert result['format'] == 'columnar'
+    campaigns = columnar_campaign_results({'campaigns': rows, 'solver': 'SLSQP'})
+    assert campaigns['campaigns']['spend'] == [1.0, 2.0]
+    assert campaigns['solver'] == 'SLSQP'
+
+
+def test_columnar_campaigns_expand_with_weekly_matrices():
+    block = {'columns': {'campaignproduct': ['A', 'B'], 'alpha': [1.0, 2.0]},
+             'W': [[0.5] * 52, [2.0, 3.0]],
+             'C': [[0] * 60]}
+    assert is_columnar(block) and not is_columnar([{'campaignproduct': 'A'}])
+    first, second = campaigns_from_columnar(block)
+    assert (first['campaignproduct'], first['alpha']) == ('A', 1.0)
+    assert list(first['W']) == [0.5] * 52
+    # Short rows are padded with 1, long rows truncated, missing rows default to 1
+    assert list(second['W'][:3]) == [2.0, 3.0, 1.0] and len(second['W']) == 52
+    assert list(first['C']) == [0.0] * 52
+    assert list(second['C']) == [1.0] * 52
+    assert 'W' not in campaigns_from_columnar({'columns': {'alpha': [1.0]}})[0]
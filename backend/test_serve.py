@@ -0,0 +1,122 @@
+"""Tests for the pre-forking production server"""
+import http.client
+import os
+import signal
+import socket
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from serve import PooledWSGIServer, _spawn, bind_socket, parse_args
+
+DELAY = 0.3
+
+
+def make_app():
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(DELAY)
+        return {'pid': os.getpid()}
+
+    return app
+
+
+def get(port, path='/slow'):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def server():
+    server = PooledWSGIServer('127.0.0.1', 0, make_app(), threads=4)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.drain()
+    server.server_close()
+
+
+def test_arguments_are_clamped():
+    config = parse_args(['--workers', '0', '--threads', '-2', '--queue', '-1', '--port', '8080'])
+    assert (config['workers'], config['threads'], config['queue'], config['port']) == (1, 1, 0, 8080)
+
+
+def test_requests_are_served_concurrently(server):
+    results = []
+    started = time.perf_counter()
+    threads = [threading.Thread(target=lambda: results.append(get(server.server_port))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    assert [status for status, _ in results] == [200] * 4
+    assert elapsed < 3 * DELAY
+
+
+def test_connection_is_closed_after_the_response(server):
+    with socket.create_connection(('127.0.0.1', server.server_port), timeout=10) as sock:
+        sock.sendall(b'GET /slow HTTP/1.1\r\nHost: test\r\n\r\n')
+        data = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    head, _, body = data.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 200')
+    assert b'Connection: close' in head
+    assert b'pid' in body
+
+
+def test_connections_beyond_the_queue_wait_in_the_backlog():
+    server = PooledWSGIServer('127.0.0.1', 0, make_app(), threads=1, queue=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        results = []
+        started = time.perf_counter()
+        threads = [threading.Thread(target=lambda: results.append(get(server.server_port))) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        server.drain()
+        server.server_close()
+    assert [status for status, _ in results] == [200] * 3
+    assert elapsed >= 3 * DELAY
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_worker_drains_in_flight_requests_on_sigterm():
+    sock = bind_socket('127.0.0.1', 0, 16)
+    port = sock.getsockname()[1]
+    config = {'host': '127.0.0.1', 'port': port, 'threads': 2, 'queue': 2}
+    pid = _spawn(make_app(), sock, config)
+    try:
+        # Once this returns the worker is serving and has its SIGTERM handler
+        assert get(port)[0] == 200
+        result = []
+        request = threading.Thread(target=lambda: result.append(get(port)))
+        request.start()
+        time.sleep(DELAY / 3)
+        os.kill(pid, signal.SIGTERM)
+        request.join()
+        _, status = os.waitpid(pid, 0)
+    finally:
+        sock.close()
+    assert result and result[0][0] == 200
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
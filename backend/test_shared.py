@@ -0,0 +1,91 @@
+"""Tests for shared-memory payloads and the solver pool"""
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+import shared
+from shared import SharedPayload, load, pool_workers
+
+
+class Model:
+    def __init__(self, n):
+        self.large = np.arange(n, dtype=float)
+        self.alias = self.large
+        self.small = np.ones(4)
+        self.labels = np.array(['a', 'b'], dtype=object)
+        self.name = 'model'
+
+
+def _total(payload):
+    model = load(payload)
+    return float(model.large.sum()), model.large.flags.writeable
+
+
+@pytest.fixture(autouse=True)
+def loaded():
+    yield
+    while shared._loaded:
+        _, (block, _) = shared._loaded.popitem()
+        try:
+            block.close()
+        except BufferError:
+            pass
+
+
+def test_round_trip_shares_large_arrays_as_read_only_views():
+    model = Model(10000)
+    with SharedPayload(model) as payload:
+        assert payload.shared_arrays == 1
+        rebuilt = load(payload.payload)
+        assert rebuilt is not model
+        assert rebuilt.name == 'model'
+        assert np.array_equal(rebuilt.large, model.large)
+        assert not rebuilt.large.flags.writeable
+        with pytest.raises(ValueError):
+            rebuilt.large[0] = 1.0
+        # One array referenced twice stays one view
+        assert rebuilt.alias is rebuilt.large
+        # Small and object arrays travel in the pickle as ordinary copies
+        assert rebuilt.small.flags.writeable
+        assert rebuilt.labels.tolist() == ['a', 'b']
+
+
+def test_loaded_objects_are_cached_per_block(monkeypatch):
+    monkeypatch.setattr(shared, 'MAX_LOADED', 2)
+    payloads = [SharedPayload(Model(1000 * (i + 1))) for i in range(3)]
+    try:
+        first = load(payloads[0].payload)
+        assert load(payloads[0].payload) is first
+        load(payloads[1].payload)
+        load(payloads[2].payload)
+        assert list(shared._loaded) == [p.payload[0] for p in payloads[1:]]
+        assert load(payloads[0].payload) is not first
+    finally:
+        for p in payloads:
+            p.close()
+
+
+def test_close_unlinks_the_block():
+    payload = SharedPayload(Model(1000))
+    name = payload.payload[0]
+    payload.close()
+    payload.close()
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=name)
+
+
+def test_pool_workers_read_the_shared_block(pool):
+    model = Model(100000)
+    with SharedPayload(model) as payload:
+        futures = [shared.solver_pool().submit(_total, payload.payload) for _ in range(4)]
+        results = [f.result() for f in futures]
+    assert results == [(float(model.large.sum()), False)] * 4
+
+
+def test_requested_workers_are_capped(monkeypatch):
+    monkeypatch.setattr(shared, 'POOL_WORKERS', 3)
+    assert pool_workers(None) == 1
+    assert pool_workers(0) == 1
+    assert pool_workers(2) == 2
+    assert pool_workers(8) == 3
@@ -0,0 +1,74 @@
+"""Tests for sparse curve x week grids and weekly spend storage"""
+import numpy as np
+import pytest
+
+from database import Database
+from nlopt_optimizer import NLoptOptimizer
+from sparse import SparseWeeks, weekly_matrix
+
+DENSE = np.array([
+    [0.0, 2.0, 3.0, 0.0, 5.0],
+    [0.0, 0.0, 0.0, 0.0, 0.0],
+    [1.0, 1.0, 0.0, 0.0, 0.0],
+])
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'bawt.db')
+    yield path
+    Database._migrated_paths.discard(path)
+
+
+def test_dense_round_trip_keeps_only_active_cells():
+    grid = SparseWeeks.from_dense(DENSE)
+    assert len(grid) == 5
+    assert grid.density == pytest.approx(5 / 15)
+    assert grid.indptr.tolist() == [0, 3, 3, 5]
+    assert np.array_equal(grid.to_dense(), DENSE)
+    assert np.array_equal(grid.dense_row(2), DENSE[2])
+    assert grid.row_sums().tolist() == [10.0, 0.0, 2.0]
+
+
+def test_runs_are_consecutive_weeks_within_a_row():
+    grid = SparseWeeks.from_dense(DENSE)
+    assert grid.runs() == [(0, 0, 2), (0, 2, 3), (2, 3, 5)]
+    assert grid.runs(grid.values > 1.5) == [(0, 0, 2), (0, 2, 3)]
+
+
+def test_weekly_matrix_reads_arrays_and_week_keys():
+    records = [{'W': [2.0, 3.0]}, {'W1': '4', 'W52': 5.0}]
+    matrix = weekly_matrix(records, 'W', 1.0)
+    assert matrix.shape == (2, 52)
+    assert matrix[0, :3].tolist() == [2.0, 3.0, 1.0]
+    assert matrix[1, [0, 1, 51]].tolist() == [4.0, 1.0, 5.0]
+
+
+def test_nlopt_seasonality_averages_considered_weeks_only():
+    campaigns = [
+        {'W': [3.0] * 26 + [1.0] * 26, 'C': [1] * 26 + [0] * 26},
+        {'W1': 2.0, 'W2': 4.0, **{f'C{i}': 0 for i in range(3, 53)}},
+        {'W': [5.0] * 52, 'C': [0] * 52},
+    ]
+    assert NLoptOptimizer(campaigns, 1e5).seasonalities == pytest.approx([3.0, 3.0, 1.0])
+
+
+def test_zero_spend_rows_are_stored(db_path):
+    db = Database(db_path)
+    written = db.save_weekly_spends([
+        {'curve_ref': 1, 'week': 'W01', 'spend': 100.0},
+        {'curve_ref': 1, 'week': 'W02', 'spend': 0.0},
+    ])
+    assert written == 2
+    db.save_weekly_spend(1, 'W01', 0)
+    assert [(r['week'], r['spend']) for r in db.get_weekly_spend(1)] == [('W01', 0), ('W02', 0)]
+    db.audit.close()
+
+
+def test_fit_history_reads_a_missing_spend_row_as_zero(db_path):
+    db = Database(db_path)
+    db.save_weekly_spend(1, 'W02', 50)
+    db.save_weekly_responses([{'curve_ref': 1, 'week': 'W01', 'response': 10},
+                              {'curve_ref': 1, 'week': 'W02', 'response': 30}])
+    assert [(r['week'], r['spend']) for r in db.get_fit_history([1])] == [('W01', 0), ('W02', 50)]
+    db.audit.close()
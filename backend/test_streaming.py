@@ -0,0 +1,86 @@
+"""Tests for NDJSON streaming of simulation and optimization results"""
+import pytest
+
+from flighting import FlightingOptimizer, optimize_flighting
+from optimizer import MMMOptimizer
+from serialization import loads, ndjson_campaign_results, ndjson_lines, ndjson_optimization
+
+CURVES = [
+    {'id': 'a', 'k': 1e5, 's': 1.0, 'max_response': 1e6, 'channel': 'TV'},
+    {'id': 'b', 'k': 2e5, 's': 1.5, 'max_response': 2e6, 'channel': 'Search'},
+]
+ALLOCATIONS = {'a': 1e5, 'b': 3e5, 'unknown': 5e4}
+
+
+def parse(lines):
+    return [loads(line) for line in lines]
+
+
+def test_rows_are_encoded_one_line_each():
+    lines = list(ndjson_lines(iter([{'x': 1}, {'x': float('nan')}]), {'total': 1}))
+    assert all(line.endswith(b'\n') and line.count(b'\n') == 1 for line in lines)
+    assert parse(lines) == [
+        {'type': 'row', 'data': {'x': 1}},
+        {'type': 'row', 'data': {'x': None}},
+        {'type': 'summary', 'rows': 2, 'data': {'total': 1}},
+    ]
+
+
+def test_rows_are_produced_lazily_and_summary_evaluated_last():
+    produced = []
+
+    def rows():
+        for i in range(3):
+            produced.append(i)
+            yield {'i': i}
+
+    stream = ndjson_lines(rows(), lambda: {'produced': len(produced)})
+    next(stream)
+    assert produced == [0]
+    assert parse(stream)[-1]['data'] == {'produced': 3}
+
+
+def test_failure_mid_stream_ends_with_an_error_line():
+    def rows():
+        yield {'i': 0}
+        raise ValueError('curve 2 is invalid')
+
+    *head, last = parse(ndjson_lines(rows(), {}))
+    assert head == [{'type': 'row', 'data': {'i': 0}}]
+    assert last == {'type': 'error', 'error': 'curve 2 is invalid', 'rows': 1}
+
+
+def test_streamed_simulation_matches_simulate():
+    optimizer = MMMOptimizer()
+    result = optimizer.simulate(CURVES, ALLOCATIONS)
+    summary = {}
+    rows = optimizer.iter_simulate(CURVES, ALLOCATIONS, summary=summary)
+    assert summary == {}
+    assert list(rows) == list(result['results'].values())
+    assert summary == result['summary']
+    *lines, tail = parse(ndjson_optimization(result))
+    assert [line['data'] for line in lines] == list(result['results'].values())
+    assert tail['data'] == {'summary': result['summary']}
+
+
+def test_streamed_optimization_splits_rows_from_the_summary():
+    result = MMMOptimizer().optimize(CURVES, {}, 4e5)
+    *lines, tail = parse(ndjson_optimization(result))
+    assert [line['data']['curve_id'] for line in lines] == ['a', 'b']
+    assert tail['data']['summary'] == pytest.approx(result['summary'])
+    assert 'allocations' not in tail['data']
+
+
+def test_flighting_rows_stream_like_the_full_result():
+    campaigns = [{'campaignproduct': name, 'alpha': alpha, 'beta': 1.0, 'spend_max': 520000, 'spend_min': 0,
+                  'W': [1.0] * 52, 'C': [1] * 26 + [0] * 26} for name, alpha in (('A', 2.0), ('B', 1.0))]
+    options = {'min_weekly_spend': 5000, 'min_run_weeks': 2}
+    full = optimize_flighting(campaigns, 300000, options)
+    solver = FlightingOptimizer(campaigns, 300000, options)
+    spend, active, relaxed_profit, passes, elapsed = solver.solve()
+    assert list(solver.iter_campaigns(spend, active)) == full['campaigns']
+    summary = solver.summary(spend, active, relaxed_profit, passes, elapsed)
+    assert summary['total_profit'] == pytest.approx(full['total_profit'])
+    *lines, tail = parse(ndjson_campaign_results(full))
+    assert [line['data']['name'] for line in lines] == ['A', 'B']
+    assert 'campaigns' not in tail['data'] and tail['rows'] == 2
@@ -0,0 +1,65 @@
+"""Tests for solver convergence traces"""
+import math
+
+import pytest
+
+from nlopt_optimizer import HAS_NLOPT, optimize_budget
+from optimizer import MMMOptimizer
+from telemetry import SolverTrace, relative_spread
+
+CURVES = [
+    {'id': 'a', 'k': 1e5, 's': 1.0, 'max_response': 1e6},
+    {'id': 'b', 'k': 3e5, 's': 1.0, 'max_response': 2e6},
+]
+
+
+def test_trace_is_columnar_and_nulls_non_finite_values():
+    trace = SolverTrace({'epsilon': 0.01})
+    trace.record(10.123456, math.inf, 0.0)
+    trace.record(12.5, 0.25, math.nan)
+    out = trace.to_dict()
+    assert out['settings'] == {'epsilon': 0.01}
+    assert out['points'] == len(trace) == 2
+    columns = out['columns']
+    assert list(columns) == list(SolverTrace.FIELDS)
+    assert columns['step'] == [1, 2]
+    assert columns['objective'] == [10.1235, 12.5]
+    assert columns['mroi_spread'] == [None, 0.25]
+    assert columns['violation'] == [0.0, None]
+    assert columns['elapsed_ms'][0] <= columns['elapsed_ms'][1]
+
+
+def test_relative_spread_ignores_non_finite_returns():
+    assert relative_spread([2.0, 1.0, math.inf]) == pytest.approx(0.5)
+    assert relative_spread([3.0]) == 0.0
+    assert relative_spread([]) == 0.0
+
+
+def test_mroi_trace_has_one_row_per_iteration():
+    result = MMMOptimizer().optimize(CURVES, {'a': 5e5, 'b': 1e5}, 6e5, trace=True)
+    summary = result['summary']
+    trace = summary['trace']
+    assert trace['points'] == summary['iterations']
+    assert set(trace['settings']) == {'epsilon', 'max_iterations', 'step_size'}
+    objective = trace['columns']['objective']
+    assert objective[-1] >= objective[0]
+    assert summary['converged']
+    assert trace['columns']['mroi_spread'][-1] < trace['settings']['epsilon']
+    assert max(trace['columns']['violation']) == pytest.approx(0, abs=1e-3)
+
+
+def test_trace_is_off_by_default():
+    result = MMMOptimizer().optimize(CURVES, {}, 6e5)
+    assert 'trace' not in result['summary']
+
+
+@pytest.mark.skipif(not HAS_NLOPT, reason='NLopt is not installed')
+def test_nlopt_trace_follows_the_evaluations():
+    campaigns = [{'campaignproduct': name, 'alpha': alpha, 'beta': 0.7, 'spend_max': 2e5, 'spend_min': 0,
+                  'W': [1.0] * 52, 'C': [1] * 52} for name, alpha in (('A', 1.5), ('B', 2.5))]
+    results = optimize_budget(campaigns, 2e5, 'SLSQP', trace=True)
+    trace = results['trace']
+    assert trace['settings']['algorithm'] == 'SLSQP'
+    assert trace['points'] > 0
+    assert trace['columns']['step'] == list(range(1, trace['points'] + 1))
+    assert trace['columns']['violation'][-1] == pytest.approx(0, abs=1.0)
@@ -0,0 +1,84 @@
+"""Tests for Monte Carlo parameter uncertainty"""
+import pytest
+
+import uncertainty
+from uncertainty import simulate_uncertainty, standard_errors, with_standard_errors
+
+M, K = 1e6, 1e5
+CURVES = [
+    {'id': 'tv', 'k': K, 's': 1.0, 'max_response': M, 'channel': 'TV'},
+    {'id': 'search', 'k': 2 * K, 's': 1.5, 'max_response': 2 * M, 'channel': 'Search'},
+]
+PLAN = {'tv': 1e5, 'search': 3e5}
+
+
+def test_without_spread_every_sample_is_the_point_response():
+    result = simulate_uncertainty(CURVES, PLAN, samples=50, seed=1)
+    totals = result['totals']
+    assert result['simulation']['uncertain_parameters'] == []
+    assert totals['response']['std'] == 0
+    for key in ('mean', 'p5', 'p50', 'p95'):
+        assert totals['response'][key] == pytest.approx(totals['point_response'])
+
+
+def test_uniform_top_gives_uniform_response_percentiles():
+    # Response is linear in top: top ~ U(0.5 M, 1.5 M) at spend k gives response ~ U(0.25 M, 0.75 M)
+    specs = {'tv': {'top': {'dist': 'uniform', 'low': 0.5 * M, 'high': 1.5 * M}}}
+    result = simulate_uncertainty(CURVES[:1], {'tv': K}, specs, samples=100000, seed=2)
+    response = result['totals']['response']
+    assert result['totals']['point_response'] == pytest.approx(0.5 * M)
+    assert response['mean'] == pytest.approx(0.5 * M, rel=5e-3)
+    assert response['p5'] == pytest.approx(0.275 * M, rel=1e-2)
+    assert response['p95'] == pytest.approx(0.725 * M, rel=1e-2)
+    assert response['std'] == pytest.approx(0.5 * M / 12 ** 0.5, rel=1e-2)
+
+
+def test_lognormal_top_keeps_the_estimate_as_its_mean():
+    specs = {'default': {'top': {'cv': 0.2}}}
+    result = simulate_uncertainty(CURVES, PLAN, specs, samples=100000, seed=3)
+    assert result['simulation']['uncertain_parameters'] == ['top']
+    for group in result['groups']:
+        assert group['response']['mean'] == pytest.approx(group['point_response'], rel=5e-3)
+        assert group['response']['std'] == pytest.approx(0.2 * group['point_response'], rel=2e-2)
+
+
+def test_seed_reproduces_the_draws():
+    specs = {'default': {'scale': {'cv': 0.1}, 'shape': {'dist': 'normal', 'cv': 0.1}}}
+    first = simulate_uncertainty(CURVES, PLAN, specs, samples=500, seed=4)
+    second = simulate_uncertainty(CURVES, PLAN, specs, samples=500, seed=4)
+    assert first['totals']['response'] == second['totals']['response']
+    assert first['groups'] == second['groups']
+
+
+def test_pooled_chunks_match_in_process(pool, monkeypatch):
+    monkeypatch.setattr(uncertainty, 'CHUNK_ELEMENTS', 200)
+    specs = {'default': {'scale': {'cv': 0.1}, 'top': {'cv': 0.1}}}
+    serial = simulate_uncertainty(CURVES, PLAN, specs, samples=1000, workers=1, seed=5)
+    pooled = simulate_uncertainty(CURVES, PLAN, specs, samples=1000, workers=2, seed=5)
+    assert pooled['simulation']['workers'] == 2
+    assert pooled['simulation']['chunks'] == 10
+    assert pooled['totals']['response'] == serial['totals']['response']
+
+
+def test_standard_errors_come_from_the_latest_fit():
+    curves = [
+        {'curve_ref': 1, 'curve_type': 'hill', 'param_a': K, 'param_b': 1.0, 'param_c': M, 'param_d': 7.0},
+        {'curve_ref': 2, 'curve_type': 'tanh', 'param_a': M, 'param_b': K, 'param_c': 1.0},
+        {'curve_ref': 3, 'curve_type': 'hill', 'param_a': K, 'param_b': 1.0, 'param_c': M},
+    ]
+    fits = [
+        {'curve_ref': 1, 'param_a_se': 1e4, 'param_b_se': 0.1, 'param_c_se': None},
+        {'curve_ref': 2, 'param_a_se': 5e4, 'param_b_se': 2e4, 'param_c_se': 0.05},
+    ]
+    merged = with_standard_errors(curves, fits)
+    assert merged[0]['param_d'] == 7.0
+    assert standard_errors(merged[0]) == {'scale': 1e4, 'shape': 0.1, 'top': None}
+    # tanh stores top in param_a and scale in param_b
+    assert standard_errors(merged[1]) == {'scale': 2e4, 'shape': 0.05, 'top': 5e4}
+    assert merged[2] is curves[2]
+    assert standard_errors(merged[2]) == {'scale': None, 'shape': None, 'top': None}
+
+
+def test_unknown_distribution_is_rejected():
+    with pytest.raises(ValueError):
+        simulate_uncertainty(CURVES, PLAN, {'default': {'top': {'dist': 'cauchy', 'cv': 0.1}}})
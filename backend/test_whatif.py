@@ -0,0 +1,176 @@
+"""Tests for batch plan simulation and the what-if grid"""
+import numpy as np
+import pytest
+
+from conftest import hill_optimum
+from curves import CurveSet
+from optimizer import MMMOptimizer
+from serialization import decode_matrix, encode_matrix, is_compact_matrix
+from whatif import simulate_plans, whatif_grid
+
+CURVES = [
+    {'id': 1, 'k': 1e5, 's': 1.0, 'max_response': 1e6},
+    {'id': 2, 'k': 2e5, 's': 1.5, 'max_response': 2e6},
+    {'id': 3, 'k': 4e5, 's': 1.0, 'max_response': 1e6},
+]
+
+# Concave curves re-optimized around the grid axes (closed form for s = 1)
+OTHERS = [
+    {'id': 4, 'k': 1e5, 's': 1.0, 'max_response': 1e6},
+    {'id': 5, 'k': 3e5, 's': 1.0, 'max_response': 1e6},
+]
+
+
+def plans(n, seed=0):
+    return np.random.default_rng(seed).uniform(0, 5e5, size=(n, len(CURVES)))
+
+
+def test_totals_match_per_plan_simulation():
+    matrix = plans(20)
+    result = simulate_plans(CURVES, matrix, per_curve=True)
+    optimizer = MMMOptimizer()
+    for i, row in enumerate(matrix):
+        expected = optimizer.simulate(CURVES, dict(zip((1, 2, 3), row)))['summary']
+        assert result['totals']['response'][i] == pytest.approx(expected['total_response'], abs=0.05)
+        assert result['totals']['spend'][i] == pytest.approx(expected['total_spend'], abs=0.01)
+    assert result['responses'].shape == matrix.shape
+    best = int(np.argmax(result['totals']['response']))
+    assert result['best']['plan'] == best
+    assert result['best']['response'] == pytest.approx(result['totals']['response'][best], abs=0.01)
+
+
+def test_chunks_do_not_change_the_result():
+    matrix = plans(101)
+    whole = simulate_plans(CURVES, matrix)
+    chunked = simulate_plans(CURVES, matrix, chunk_elements=30)
+    assert chunked['simulation']['chunks'] == 11
+    assert np.array_equal(whole['totals']['response'], chunked['totals']['response'])
+    assert 'responses' not in whole
+
+
+def test_columns_follow_the_requested_curve_order():
+    matrix = plans(5)
+    result = simulate_plans(CURVES, matrix[:, ::-1], curve_ids=['3', 2, 1], per_curve=True)
+    assert result['curve_ids'] == [3, 2, 1]
+    assert np.allclose(result['responses'][:, ::-1], CurveSet(CURVES).response(matrix))
+
+
+def test_approximate_scoring_stays_within_the_tolerance():
+    matrix = plans(200)
+    exact = simulate_plans(CURVES, matrix)
+    approx = simulate_plans(CURVES, matrix, approximate=True, tolerance=1e-5)
+    bound = 1e-5 * sum(c['max_response'] for c in CURVES)
+    assert np.max(np.abs(approx['totals']['response'] - exact['totals']['response'])) <= bound + 0.01
+    assert 'approximation' in approx['simulation']
+    # The best plan is re-scored exactly
+    assert approx['best']['response'] == pytest.approx(exact['totals']['response'][approx['best']['plan']], abs=0.01)
+
+
+def test_invalid_plans_raise():
+    with pytest.raises(ValueError):
+        simulate_plans(CURVES, np.zeros((2, 2)))
+    with pytest.raises(ValueError):
+        simulate_plans(CURVES, -np.ones((2, 3)))
+    with pytest.raises(ValueError):
+        simulate_plans(CURVES, np.zeros((2, 2)), curve_ids=[1, 9])
+    assert simulate_plans(CURVES, np.zeros((0, 3)))['best'] is None
+
+
+def test_compact_matrices_round_trip():
+    matrix = plans(4)
+    block = encode_matrix(matrix, compact=True, dtype='float32')
+    assert is_compact_matrix(block) and block['shape'] == [4, 3]
+    assert np.allclose(decode_matrix(block), matrix, rtol=1e-7)
+    assert np.array_equal(decode_matrix(encode_matrix(matrix, compact=True)), matrix)
+    assert np.array_equal(decode_matrix(matrix.tolist()), matrix)
+    with pytest.raises(ValueError):
+        decode_matrix(dict(block, shape=[3, 3]))
+    with pytest.raises(ValueError):
+        decode_matrix(dict(block, data='not base64!'))
+    with pytest.raises(ValueError):
+        decode_matrix(dict(block, dtype='int32'))
+    with pytest.raises(ValueError):
+        decode_matrix([[1.0, 2.0], [3.0]])
+
+
+def test_fixed_grid_is_the_outer_sum_of_axis_responses():
+    current = {1: 1e5, 2: 2e5, 3: 3e5}
+    result = whatif_grid(CURVES, [{'curve_id': 1, 'levels': [0, 1e5, 2e5]}, {'curve_id': '2', 'points': 5}],
+                         current)
+    curve_set = CurveSet(CURVES)
+    second = result['axes'][1]
+    # Default range: 0 to twice the current spend
+    assert second['levels'].tolist() == [0, 1e5, 2e5, 3e5, 4e5]
+    assert result['grid']['shape'] == [3, 5]
+    assert result['grid']['other_spend'] == 3e5
+    for i, x in enumerate([0, 1e5, 2e5]):
+        for j, y in enumerate(second['levels']):
+            expected = curve_set.response(np.array([x, y, 3e5])).sum()
+            assert result['response'][i][j] == pytest.approx(expected, abs=0.01)
+            assert result['spend'][i][j] == pytest.approx(x + y + 3e5)
+    assert result['best']['index'] == [2, 4]
+    assert result['current']['response'] == pytest.approx(curve_set.response(np.array([1e5, 2e5, 3e5])).sum(), abs=0.01)
+
+
+def test_other_curves_are_reoptimized_for_the_leftover_budget():
+    curves = CURVES[:2] + OTHERS
+    # Every feasible cell leaves enough for both other curves to be funded
+    budget = 9e5
+    levels = [0.0, 2e5, 4e5, 6e5]
+    result = whatif_grid(curves, [{'curve_id': 1, 'levels': levels}, {'curve_id': 2, 'levels': levels}],
+                         others='optimize', total_budget=budget)
+    axis = [CurveSet([c]).response(np.array(levels)[:, None])[:, 0] for c in CURVES[:2]]
+    for i, x in enumerate(levels):
+        for j, y in enumerate(levels):
+            if x + y > budget:
+                assert result['response'][i][j] is None
+                continue
+            expected = axis[0][i] + axis[1][j] + hill_optimum(OTHERS, budget - x - y)[1]
+            assert result['response'][i][j] == pytest.approx(expected, rel=1e-6)
+            assert result['spend'][i][j] == pytest.approx(budget)
+    assert result['grid']['infeasible_cells'] == 3
+    assert result['grid']['estimated_cells'] == 0
+
+
+def test_floors_of_reoptimized_curves_make_cells_infeasible():
+    curves = CURVES[:1] + OTHERS
+    result = whatif_grid(curves, [{'curve_id': 1, 'levels': [0, 5e5, 9e5]}], others='optimize',
+                         total_budget=1e6, constraints={4: {'min': 2e5}})
+    assert result['response'][2] is None
+    assert result['grid']['infeasible_cells'] == 1
+    assert result['spend'][1] == pytest.approx(1e6)
+
+
+def test_invalid_grids_raise():
+    axis = {'curve_id': 1, 'points': 3}
+    with pytest.raises(ValueError):
+        whatif_grid(CURVES, [axis], others='greedy')
+    with pytest.raises(ValueError):
+        whatif_grid(CURVES, [])
+    with pytest.raises(ValueError):
+        whatif_grid(CURVES, [axis, dict(axis)])
+    with pytest.raises(ValueError):
+        whatif_grid(CURVES, [{'curve_id': 9, 'points': 3}])
+    with pytest.raises(ValueError):
+        whatif_grid(CURVES, [{'curve_id': 1, 'points': 1}])
+    with pytest.raises(ValueError):
+        whatif_grid(CURVES, [{'curve_id': 1, 'levels': [-1.0]}])
+
+
+def test_s_shaped_frontier_is_exact_outside_the_jumps():
+    others = [{'curve_ref': 'A', 'curve_type': 'atan', 'param_a': 1e5, 'param_b': 3.0, 'param_c': 1e6},
+              {'curve_ref': 'T', 'curve_type': 'tanh', 'param_a': 2e6, 'param_b': 2e5, 'param_c': 3.0}]
+    axis = {'curve_ref': 'H', 'curve_type': 'hill', 'param_a': 1e5, 'param_b': 1.0, 'param_c': 1e6}
+    levels = [0.0, 1e5, 2e5, 6e5, 7.5e5]
+    budget = 8e5
+    result = whatif_grid([axis] + others, [{'curve_id': 'H', 'levels': levels}], others='optimize',
+                         total_budget=budget)
+    curve_set = CurveSet(others)
+    for x, value in zip(levels[:4], result['response']):
+        # Brute force over the split of the leftover budget between the two other curves
+        left = budget - x
+        split = np.linspace(0, left, 200001)
+        best = curve_set.response(np.stack([split, left - split], axis=1)).sum(axis=1).max()
+        assert value == pytest.approx(CurveSet([axis]).response(np.array([[x]]))[0, 0] + best, rel=1e-8)
+    # With 50k left the atan curve is below the budget at which it switches on: an estimate
+    assert result['grid']['estimated_cells'] == 1
@@ -0,0 +1,276 @@
+"""
+BAWT Backend - Parameter Uncertainty
+Monte Carlo simulation of response under curve-parameter uncertainty
+
+Curve parameters are estimates. simulate_uncertainty() draws each curve's
+scale, shape and top (max response) from a distribution around its stored
+value, as a samples x curves matrix per parameter, and evaluates the response
+of a spend plan for every sample in one vectorized pass per chunk.
+
+Distributions come from, in order of precedence:
+
+    request specs     {"<curve id>": {"scale": {"dist": "lognormal", "sd": 12000}, ...}}
+    standard errors   param_a_se / param_b_se / param_c_se of the curve's latest fit
+                      in curve_fits (see with_standard_errors; optimizer dicts:
+                      k_se, s_se, max_response_se)
+    default spec      {"scale": {"cv": 0.1}, ...} applied to every other curve
+
+A spec is {"dist": "normal" | "lognormal" | "uniform", "sd": ..., "cv": ...,
+"low": ..., "high": ...}; sd may be given relative to the estimate as cv.
+Normal draws are truncated at zero. Uniform draws span low..high, or +/- sqrt(3) sd.
+
+Samples are drawn in chunks of at most CHUNK_ELEMENTS samples x curves to
+bound memory, and each chunk has its own seed, so results for a given seed
+do not depend on how the chunks are spread over the solver pool.
+"""
+
+import math
+import time
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from curves import CurveSet
+from multistart import lookup
+import shared
+from shared import SharedPayload, load
+
+
+PARAMETERS = ('scale', 'shape', 'top')
+DISTRIBUTIONS = ('normal', 'lognormal', 'uniform')
+GROUP_BY = ('channel', 'curve')
+
+DEFAULT_SAMPLES = 2000
+MAX_SAMPLES = 200000
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_ELEMENTS = 250000  # samples x curves evaluated at once
+
+# Keys holding the standard error of each stored parameter (curve_fits columns)
+STANDARD_ERROR_COLUMNS = {'param_a': 'param_a_se', 'param_b': 'param_b_se', 'param_c': 'param_c_se'}
+# Stored column of each normalized parameter (tanh stores top first)
+PARAMETER_COLUMNS = {
+    'default': {'scale': 'param_a', 'shape': 'param_b', 'top': 'param_c'},
+    'tanh': {'scale': 'param_b', 'shape': 'param_c', 'top': 'param_a'},
+}
+OPTIMIZER_STANDARD_ERRORS = {'scale': 'k_se', 'shape': 's_se', 'top': 'max_response_se'}
+
+
+def with_standard_errors(curves: List[Dict[str, Any]], fits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Stored curves with the standard errors of their latest fit (curve_fits rows) merged in."""
+    by_ref = {f['curve_ref']: f for f in fits}
+    return [{**curve, **{key: by_ref[curve['curve_ref']].get(key) for key in STANDARD_ERROR_COLUMNS.values()}}
+            if curve.get('curve_ref') in by_ref else curve
+            for curve in curves]
+
+
+def standard_errors(curve: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Standard error of scale, shape and top stored with a curve (None when absent)."""
+    if 'k' in curve and 'max_response' in curve:
+        keys = OPTIMIZER_STANDARD_ERRORS
+    else:
+        columns = PARAMETER_COLUMNS['tanh' if (curve.get('curve_type') or '').lower() == 'tanh' else 'default']
+        keys = {name: STANDARD_ERROR_COLUMNS[column] for name, column in columns.items()}
+    return {name: float(curve[key]) if curve.get(key) is not None else None for name, key in keys.items()}
+
+
+class ParameterDraws:
+    """Per-curve distribution of one parameter, drawn as (samples, curves) matrices."""
+
+    def __init__(self, name: str, estimate: np.ndarray, specs: List[Dict[str, Any]]):
+        self.name = name
+        self.estimate = estimate
+        n = len(estimate)
+        self.codes = np.zeros(n, dtype=np.int8)
+        self.sd = np.zeros(n)
+        self.low = np.zeros(n)
+        self.high = np.zeros(n)
+        for i, spec in enumerate(specs):
+            dist = spec.get('dist', 'lognormal')
+            if dist not in DISTRIBUTIONS:
+                raise ValueError(f"Unknown distribution '{dist}' for {name}, expected one of {', '.join(DISTRIBUTIONS)}")
+            self.codes[i] = DISTRIBUTIONS.index(dist)
+            sd = spec.get('sd')
+            if sd is None and spec.get('cv') is not None:
+                sd = float(spec['cv']) * abs(estimate[i])
+            self.sd[i] = max(float(sd or 0.0), 0.0)
+            spread = math.sqrt(3.0) * self.sd[i]
+            self.low[i] = float(spec.get('low', estimate[i] - spread))
+            self.high[i] = float(spec.get('high', estimate[i] + spread))
+            if self.low[i] > self.high[i]:
+                raise ValueError(f"Uniform {name} range is empty for curve {i + 1}")
+
+        # Lognormal with the estimate as its mean and sd as its standard deviation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.sigma = np.sqrt(np.log1p(np.square(np.where(estimate > 0, self.sd / estimate, 0.0))))
+        self.mu = np.log(np.maximum(estimate, 1e-300)) - 0.5 * np.square(self.sigma)
+        self.uncertain = bool(np.any(self.sd > 0) or np.any(self.low < self.high))
+
+    def draw(self, rng: np.random.Generator, samples: int) -> np.ndarray:
+        if not self.uncertain:
+            return np.broadcast_to(self.estimate, (samples, len(self.estimate)))
+        z = rng.standard_normal((samples, len(self.estimate)))
+        values = np.where(self.codes == 1, np.exp(self.mu + self.sigma * z),
+                          np.maximum(self.estimate + self.sd * z, 0.0))
+        uniform = self.codes == 2
+        if uniform.any():
+            u = rng.random((samples, len(self.estimate)))
+            values = np.where(uniform, np.maximum(self.low + (self.high - self.low) * u, 0.0), values)
+        return values
+
+
+def parameter_draws(curves: List[Dict[str, Any]], curve_set: CurveSet,
+                    specs: Optional[Dict[Any, Dict[str, Any]]] = None) -> Dict[str, ParameterDraws]:
+    """Distribution of each parameter of every curve, resolved from specs, standard errors and the default."""
+    specs = specs or {}
+    default = specs.get('default') or {}
+    per_curve = []
+    for curve, cid in zip(curves, curve_set.ids):
+        spec = lookup(specs, cid) or {}
+        errors = standard_errors(curve)
+        per_curve.append({
+            name: spec.get(name) or ({'sd': errors[name]} if errors[name] else default.get(name) or {})
+            for name in PARAMETERS
+        })
+    estimates = {'scale': curve_set.scale, 'shape': curve_set.shape, 'top': curve_set.top}
+    return {name: ParameterDraws(name, estimates[name], [p[name] for p in per_curve]) for name in PARAMETERS}
+
+
+class UncertaintyModel:
+    """Spend plan, parameter distributions and output grouping of one simulation (picklable)."""
+
+    def __init__(self, curves: List[Dict[str, Any]], allocations: Dict[Any, float],
+                 specs: Optional[Dict[Any, Dict[str, Any]]] = None, group_by: str = 'channel'):
+        if not curves:
+            raise ValueError("No curves to simulate")
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Unknown group_by '{group_by}', expected one of {', '.join(GROUP_BY)}")
+        self.curve_set = CurveSet(curves)
+        self.spend = np.array([float(lookup(allocations, cid) or 0) for cid in self.curve_set.ids])
+
+        self.draws = parameter_draws(curves, self.curve_set, specs)
+
+        # Output columns: curves sorted by group so np.add.reduceat sums each group
+        if group_by == 'curve':
+            keys = [str(cid) for cid in self.curve_set.ids]
+        else:
+            keys = [str(curve.get('channel') or cid) for curve, cid in zip(curves, self.curve_set.ids)]
+        self.labels = sorted(set(keys))
+        position = {label: j for j, label in enumerate(self.labels)}
+        group = np.array([position[k] for k in keys])
+        self.order = np.argsort(group, kind='stable')
+        self.starts = np.searchsorted(group[self.order], np.arange(len(self.labels)))
+        self.group_spend = np.add.reduceat(self.spend[self.order], self.starts)
+        self.group_curves = np.diff(np.append(self.starts, len(keys)))
+
+    def point_response(self) -> np.ndarray:
+        """Response per group at the parameter estimates."""
+        return np.add.reduceat(self.curve_set.response(self.spend)[self.order], self.starts)
+
+    def simulate(self, seed: np.random.SeedSequence, samples: int) -> np.ndarray:
+        """Response per group for one chunk of parameter draws (samples x groups)."""
+        rng = np.random.default_rng(seed)
+        drawn = self.curve_set.with_parameters(**{name: d.draw(rng, samples) for name, d in self.draws.items()})
+        response = drawn.response(self.spend)
+        return np.add.reduceat(response[:, self.order], self.starts, axis=1)
+
+
+def _worker_simulate(payload: tuple, seed: np.random.SeedSequence, samples: int) -> np.ndarray:
+    return load(payload).simulate(seed, samples)
+
+
+def distribution(values: np.ndarray, percentiles: Tuple[float, ...], digits: int = 2) -> List[Dict[str, float]]:
+    """Mean, standard deviation and percentiles of each column."""
+    points = np.percentile(values, percentiles, axis=0)
+    mean, std = values.mean(axis=0), values.std(axis=0)
+    return [
+        {'mean': round(float(mean[j]), digits), 'std': round(float(std[j]), digits),
+         **{f'p{q:g}': round(float(points[i, j]), digits) for i, q in enumerate(percentiles)}}
+        for j in range(values.shape[1])
+    ]
+
+
+def simulate_uncertainty(
+    curves: List[Dict[str, Any]],
+    allocations: Dict[Any, float],
+    specs: Optional[Dict[Any, Dict[str, Any]]] = None,
+    samples: int = DEFAULT_SAMPLES,
+    percentiles: Optional[List[float]] = None,
+    group_by: str = 'channel',
+    workers: Optional[int] = None,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Distribution of the response of a spend plan under parameter uncertainty.
+
+    Args:
+        curves: Response curves (optimizer dicts or response_curves rows)
+        allocations: Dict of curve id -> spend
+        specs: Per-curve parameter distributions and an optional 'default' (see module docstring)
+        samples: Number of parameter draws
+        percentiles: Percentiles to report (default 5, 25, 50, 75, 95)
+        group_by: 'channel' or 'curve'
+        workers: Chunks evaluated at once on the shared solver pool (default 1:
+            in-process; capped at shared.POOL_WORKERS)
+        seed: Seed for reproducible draws
+
+    Returns:
+        {'totals': {...}, 'groups': [...], 'simulation': {...}}
+    """
+    started = time.perf_counter()
+    samples = max(1, min(int(samples), MAX_SAMPLES))
+    percentiles = tuple(float(q) for q in (percentiles or DEFAULT_PERCENTILES))
+    if any(q < 0 or q > 100 for q in percentiles):
+        raise ValueError("Percentiles must be between 0 and 100")
+    model = UncertaintyModel(curves, allocations, specs, group_by)
+
+    rows = max(1, CHUNK_ELEMENTS // len(model.spend))
+    sizes = [min(rows, samples - start) for start in range(0, samples, rows)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = min(shared.pool_workers(workers), len(sizes))
+
+    if workers == 1:
+        chunks = [model.simulate(s, size) for s, size in zip(seeds, sizes)]
+    else:
+        pool = shared.solver_pool()
+        with SharedPayload(model) as payload:
+            # At most `workers` chunks in flight, collected in seed order
+            chunks, futures = [], deque()
+            for s, size in zip(seeds, sizes):
+                if len(futures) == workers:
+                    chunks.append(futures.popleft().result())
+                futures.append(pool.submit(_worker_simulate, payload.payload, s, size))
+            chunks.extend(f.result() for f in futures)
+    grouped = np.vstack(chunks)
+    total = grouped.sum(axis=1, keepdims=True)
+    total_spend = float(model.spend.sum())
+
+    point = model.point_response()
+    groups = []
+    for j, (label, stats) in enumerate(zip(model.labels, distribution(grouped, percentiles))):
+        groups.append({
+            group_by: label,
+            'curves': int(model.group_curves[j]),
+            'spend': round(float(model.group_spend[j]), 2),
+            'point_response': round(float(point[j]), 2),
+            'response': stats,
+        })
+
+    return {
+        'totals': {
+            'spend': round(total_spend, 2),
+            'point_response': round(float(point.sum()), 2),
+            'response': distribution(total, percentiles)[0],
+            'roi': distribution(total / max(total_spend, 1), percentiles, digits=6)[0],
+        },
+        'groups': groups,
+        'simulation': {
+            'samples': samples,
+            'chunks': len(sizes),
+            'chunk_size': rows,
+            'workers': workers,
+            'uncertain_parameters': [name for name, d in model.draws.items() if d.uncertain],
+            'percentiles': list(percentiles),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        },
+    }
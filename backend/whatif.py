@@ -0,0 +1,356 @@
+"""
+BAWT Backend - What-If Analysis
+Scoring many candidate spend plans against the same set of curves
+
+simulate_plans() takes a plans x curves spend matrix and evaluates every
+curve under every plan with one broadcast CurveSet.response call per chunk,
+instead of one simulate() call (a Python loop over curves) per plan. Chunks
+hold at most CHUNK_ELEMENTS plan-curve cells, so memory stays bounded for
+10k+ plans over hundreds of curves. With approximate=True the chunks are
+scored from cached interpolation tables instead (see the approximation
+module), within a stated error bound.
+
+whatif_grid() answers "what if curve A spent X and curve B spent Y" over a
+dense grid of levels. Total response is a sum of per-curve responses, so each
+axis curve is evaluated once per level and the grid is their outer sum. The
+remaining curves are either held at their current spend (a constant) or
+re-optimized for whatever budget the axes leave over. Their optimal response
+depends on that leftover budget alone, so its frontier is traced once (see
+portfolio.Partition) and read off by interpolation for every grid cell. The
+frontier is exact for concave curves; where an S-shaped curve switches on
+the optimum jumps, and budgets inside the jump are a linear estimate.
+"""
+
+import math
+import time
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+from approximation import DEFAULT_TOLERANCE, CurveTable
+from curves import CurveSet, curve_key
+from multistart import lookup
+from portfolio import Partition
+
+
+CHUNK_ELEMENTS = 1000000  # plan x curve cells evaluated at once
+MAX_CELLS = 200000000
+
+OTHERS = ('fixed', 'optimize')
+DEFAULT_POINTS = 41
+MAX_AXES = 4
+MAX_GRID_CELLS = 4000000
+FRONTIER_PRICES = 512  # initial price points, and budget resolution of the re-optimized curves' frontier
+FRONTIER_ROUNDS = 40  # bisections of price intervals whose budgets are further apart than that
+
+
+def select_curves(curves: List[Dict[str, Any]], curve_ids: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+    """Curves in the requested column order (matching JSON's string keys for integer curve_refs)."""
+    if curve_ids is None:
+        return list(curves)
+    by_key = {}
+    for curve in curves:
+        by_key[curve_key(curve)] = curve
+        by_key[str(curve_key(curve))] = curve
+    missing = [cid for cid in curve_ids if cid not in by_key and str(cid) not in by_key]
+    if missing:
+        raise ValueError(f"Unknown curve ids: {', '.join(str(cid) for cid in missing[:10])}")
+    return [by_key[cid] if cid in by_key else by_key[str(cid)] for cid in curve_ids]
+
+
+def simulate_plans(
+    curves: List[Dict[str, Any]],
+    plans: np.ndarray,
+    curve_ids: Optional[Sequence[Any]] = None,
+    per_curve: bool = False,
+    chunk_elements: int = CHUNK_ELEMENTS,
+    approximate: bool = False,
+    tolerance: float = DEFAULT_TOLERANCE
+) -> Dict[str, Any]:
+    """
+    Score a matrix of spend plans.
+
+    Args:
+        curves: Response curves (optimizer dicts or response_curves rows)
+        plans: Spend matrix, one row per plan and one column per curve
+        curve_ids: Curve of each column (default: the order of curves)
+        per_curve: Also return the plans x curves response matrix
+        chunk_elements: Cells evaluated per vectorized pass
+        approximate: Score plans with cached interpolation tables (see the
+            approximation module) instead of exact curve evaluation; the best
+            plan is re-scored exactly
+        tolerance: Approximation error bound, relative to each curve's max response
+
+    Returns:
+        {'curve_ids': [...], 'totals': {'spend': [...], 'response': [...], 'roi': [...]},
+         'best': {...}, 'responses': matrix (per_curve only), 'simulation': {...}}
+    """
+    started = time.perf_counter()
+    selected = select_curves(curves, curve_ids)
+    if not selected:
+        raise ValueError("No curves to simulate")
+    plans = np.asarray(plans, dtype=float)
+    if plans.ndim != 2 or plans.shape[1] != len(selected):
+        raise ValueError(f"Plans must be a plans x {len(selected)} matrix, got shape {list(plans.shape)}")
+    if plans.size > MAX_CELLS:
+        raise ValueError(f"At most {MAX_CELLS} plan-curve cells per request")
+    if not np.all(np.isfinite(plans)) or np.any(plans < 0):
+        raise ValueError("Plan spend must be finite and non-negative")
+
+    curve_set = CurveSet(selected)
+    evaluator = CurveTable(curve_set, plans.max(axis=0), tolerance) if approximate and len(plans) else curve_set
+    n_plans = plans.shape[0]
+    rows = max(1, int(chunk_elements) // len(selected))
+    total_response = np.empty(n_plans)
+    responses = np.empty(plans.shape) if per_curve else None
+    chunks = 0
+    for start in range(0, n_plans, rows):
+        block = evaluator.response(plans[start:start + rows])
+        total_response[start:start + rows] = block.sum(axis=1)
+        if per_curve:
+            responses[start:start + rows] = block
+        chunks += 1
+
+    total_spend = plans.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi = np.where(total_spend > 0, total_response / total_spend, 0.0)
+    best = int(np.argmax(total_response)) if n_plans else None
+    best_response = float(total_response[best]) if best is not None else None
+    if best is not None and evaluator is not curve_set:
+        best_response = float(curve_set.response(plans[best]).sum())
+
+    result = {
+        'curve_ids': [curve_key(c) for c in selected],
+        'totals': {
+            'spend': np.round(total_spend, 2),
+            'response': np.round(total_response, 2),
+            'roi': np.round(roi, 4),
+        },
+        'best': {
+            'plan': best,
+            'spend': round(float(total_spend[best]), 2),
+            'response': round(best_response, 2),
+        } if best is not None else None,
+        'simulation': {
+            'plans': n_plans,
+            'curves': len(selected),
+            'chunks': chunks,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        },
+    }
+    if evaluator is not curve_set:
+        result['simulation']['approximation'] = evaluator.summary()
+    if per_curve:
+        result['responses'] = responses
+    return result
+
+
+def _axis_levels(spec: Dict[str, Any], curve_set: CurveSet, index: int, current: float) -> np.ndarray:
+    """Spend levels of one axis: explicit 'levels', or 'points' evenly from 'min' to 'max'."""
+    if spec.get('levels') is not None:
+        levels = np.asarray(spec['levels'], dtype=float)
+    else:
+        points = int(spec.get('points', DEFAULT_POINTS))
+        if points < 2:
+            raise ValueError("An axis needs at least 2 points")
+        # Default range: up to twice the current spend, or twice the curve's scale when unfunded
+        high = spec.get('max')
+        if high is None:
+            high = 2 * current if current > 0 else 2 * float(curve_set.scale[index])
+        levels = np.linspace(float(spec.get('min', 0)), float(high), points)
+    if levels.ndim != 1 or not len(levels):
+        raise ValueError("Axis levels must be a non-empty list of spend values")
+    if not np.all(np.isfinite(levels)) or np.any(levels < 0):
+        raise ValueError("Axis levels must be finite and non-negative")
+    return levels
+
+
+def _frontier(curves: List[Dict[str, Any]], lower: np.ndarray, upper: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Best total response of the given curves for every budget, as (budget, response,
+    slope) points ordered by budget: each price lambda funds every curve up to where
+    its marginal ROI falls to lambda, which is the optimum for the budget it spends,
+    and lambda is the frontier's slope there.
+
+    Price intervals whose budgets lie more than 1/FRONTIER_PRICES of the range apart
+    are bisected until they close. Those that never do are jumps, where an S-shaped
+    curve switches on; 'jump' flags the segment after each point.
+    """
+    part = Partition({}, curves, np.arange(len(curves)), lower, upper)
+    low, high = part.price_range()
+    prices = np.geomspace(max(high * 4, low * 16, 1e-300), max(low / 4, 1e-300), FRONTIER_PRICES)
+    spend = part.spend(prices)  # rising with falling price
+    resolution = max(float(part.upper.sum() - lower.sum()), 1e-12) / FRONTIER_PRICES
+    for _ in range(FRONTIER_ROUNDS):
+        wide = np.nonzero(np.diff(spend.sum(axis=1)) > resolution)[0]
+        if not len(wide):
+            break
+        mids = np.sqrt(prices[wide] * prices[wide + 1])
+        prices = np.insert(prices, wide + 1, mids)
+        spend = np.insert(spend, wide + 1, part.spend(mids), axis=0)
+
+    budget = np.concatenate(([lower.sum()], spend.sum(axis=1), [part.upper.sum()]))
+    response = np.concatenate(([part.curve_set.response(lower).sum()],
+                               part.curve_set.response(spend).sum(axis=1),
+                               [part.curve_set.response(part.upper).sum()]))
+    slope = np.concatenate(([prices[0]], prices, [0.0]))
+    budget, first = np.unique(budget, return_index=True)
+    return {'budget': budget, 'response': np.maximum.accumulate(response[first]), 'slope': slope[first],
+            'jump': np.diff(budget) > resolution}
+
+
+def _interpolate(frontier: Dict[str, np.ndarray], budget: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Frontier response at any budget: cubic Hermite between points, using the price
+    as slope. Also returns which budgets fell across a jump, where the value is
+    only a linear estimate.
+    """
+    x, y, m = frontier['budget'], frontier['response'], frontier['slope']
+    if len(x) == 1:
+        return np.full(np.shape(budget), y[0]), np.zeros(np.shape(budget), dtype=bool)
+    b = np.clip(budget, x[0], x[-1])
+    k = np.clip(np.searchsorted(x, b, side='right') - 1, 0, len(x) - 2)
+    width = x[k + 1] - x[k]
+    t = (b - x[k]) / width
+    cubic = ((2 * t ** 3 - 3 * t ** 2 + 1) * y[k] + (t ** 3 - 2 * t ** 2 + t) * width * m[k]
+             + (-2 * t ** 3 + 3 * t ** 2) * y[k + 1] + (t ** 3 - t ** 2) * width * m[k + 1])
+    # Across a jump (an S-curve switching on) the slopes do not describe the segment: stay linear
+    linear = y[k] + t * (y[k + 1] - y[k])
+    jump = frontier['jump'][k]
+    return np.where(jump, linear, np.clip(cubic, y[k], y[k + 1])), jump & (t > 0) & (t < 1)
+
+
+def whatif_grid(
+    curves: List[Dict[str, Any]],
+    axes: List[Dict[str, Any]],
+    current_allocations: Optional[Dict[Any, float]] = None,
+    others: str = 'fixed',
+    total_budget: Optional[float] = None,
+    constraints: Optional[Dict[Any, Dict[str, float]]] = None
+) -> Dict[str, Any]:
+    """
+    Total response over a grid of spend levels for a few selected curves.
+
+    Args:
+        curves: Response curves (optimizer dicts or response_curves rows)
+        axes: One spec per varied curve: {curve_id, levels} or {curve_id, min, max, points}
+        current_allocations: Dict of curve id -> current spend (missing curves spend 0)
+        others: 'fixed' to hold the other curves at their current spend, or
+            'optimize' to re-allocate the budget the axes leave over among them
+        total_budget: Budget shared by axes and other curves ('optimize' only;
+            default: current total spend)
+        constraints: Dict of curve id -> {min, max} for the re-optimized curves
+
+    Returns:
+        {'axes': [...], 'response': grid, 'spend': grid, 'best': {...}, 'current': {...}, 'grid': {...}}
+        Grids are nested lists indexed [level of axis 1][level of axis 2]...;
+        infeasible cells ('optimize' with too little budget left) are null.
+    """
+    if others not in OTHERS:
+        raise ValueError(f"Unknown others mode '{others}', expected one of {', '.join(OTHERS)}")
+    if not axes or len(axes) > MAX_AXES:
+        raise ValueError(f"Between 1 and {MAX_AXES} axes are supported")
+    started = time.perf_counter()
+    curve_set = CurveSet(curves)
+    ids = curve_set.ids
+    current = np.array([float(lookup(current_allocations, cid) or 0) for cid in ids])
+
+    positions = {}
+    for i, cid in enumerate(ids):
+        positions[cid] = i
+        positions[str(cid)] = i
+    chosen = []
+    for spec in axes:
+        cid = spec.get('curve_id')
+        if cid not in positions and str(cid) not in positions:
+            raise ValueError(f"Unknown axis curve '{cid}'")
+        chosen.append(positions[cid] if cid in positions else positions[str(cid)])
+    if len(set(chosen)) != len(chosen):
+        raise ValueError("Each curve can be on at most one axis")
+
+    levels = [_axis_levels(spec, curve_set, i, current[i]) for spec, i in zip(axes, chosen)]
+    shape = tuple(len(lv) for lv in levels)
+    if math.prod(shape) > MAX_GRID_CELLS:
+        raise ValueError(f"Grid of {math.prod(shape)} cells exceeds the limit of {MAX_GRID_CELLS}")
+
+    # One response vector per axis, combined by broadcasting into the full grid
+    axis_response = [CurveSet([curves[i]]).response(lv[:, None])[:, 0] for i, lv in zip(chosen, levels)]
+    response = np.zeros(shape)
+    spend = np.zeros(shape)
+    for k, (lv, rv) in enumerate(zip(levels, axis_response)):
+        view = [1] * len(shape)
+        view[k] = len(lv)
+        response = response + rv.reshape(view)
+        spend = spend + lv.reshape(view)
+
+    rest = np.setdiff1d(np.arange(len(ids)), chosen)
+    current_response = curve_set.response(current)
+    summary: Dict[str, Any] = {'others': others, 'other_curves': len(rest)}
+    if others == 'fixed':
+        fixed_spend = float(current[rest].sum())
+        fixed_response = float(current_response[rest].sum())
+        response = response + fixed_response
+        spend = spend + fixed_spend
+        summary.update({'other_spend': round(fixed_spend, 2), 'other_response': round(fixed_response, 2)})
+    else:
+        budget = float(total_budget) if total_budget is not None else float(current.sum())
+        remaining = budget - spend
+        if len(rest):
+            bounds = [lookup(constraints, ids[i]) or {} for i in rest]
+            lower = np.array([float(b.get('min', 0)) for b in bounds])
+            upper = np.array([float(b.get('max', float('inf'))) for b in bounds])
+            upper = np.maximum(np.minimum(upper, max(budget, 0.0)), lower)
+            frontier = _frontier([curves[i] for i in rest], lower, upper)
+            top = frontier['budget'][-1]
+            others_response, estimated = _interpolate(frontier, np.minimum(remaining, top))
+            feasible = remaining >= lower.sum() * (1 - 1e-9)
+            others_spend = np.clip(remaining, lower.sum(), top)
+        else:
+            others_response = np.zeros(shape)
+            estimated = np.zeros(shape, dtype=bool)
+            feasible = remaining >= -1e-9 * max(budget, 1.0)
+            others_spend = np.zeros(shape)
+        response = np.where(feasible, response + others_response, np.nan)
+        spend = np.where(feasible, spend + others_spend, np.nan)
+        summary.update({
+            'total_budget': round(budget, 2),
+            'infeasible_cells': int((~feasible).sum()),
+            # Cells whose leftover budget falls where an S-shaped curve switches on
+            'estimated_cells': int((estimated & feasible).sum()),
+        })
+
+    best = None
+    if np.any(np.isfinite(response)):
+        flat = int(np.nanargmax(response))
+        cell = np.unravel_index(flat, shape)
+        best = {
+            'index': [int(i) for i in cell],
+            'levels': [round(float(lv[i]), 2) for lv, i in zip(levels, cell)],
+            'response': round(float(response[cell]), 2),
+            'spend': round(float(spend[cell]), 2),
+        }
+
+    def grid(values: np.ndarray) -> List[Any]:
+        rounded = np.round(values, 2).astype(object)
+        rounded[~np.isfinite(values)] = None
+        return rounded.tolist()
+
+    summary.update({'shape': list(shape), 'cells': int(math.prod(shape)),
+                    'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)})
+    return {
+        'axes': [
+            {
+                'curve_id': ids[i],
+                'channel': curves[i].get('channel'),
+                'current_spend': round(float(current[i]), 2),
+                'levels': np.round(lv, 2),
+                'response': np.round(rv, 2),
+            }
+            for i, lv, rv in zip(chosen, levels, axis_response)
+        ],
+        'response': grid(response),
+        'spend': grid(spend),
+        'best': best,
+        'current': {'spend': round(float(current.sum()), 2), 'response': round(float(current_response.sum()), 2)},
+        'grid': summary,
+    }
@@ -0,0 +1,116 @@
+"""Tests for the caching static web server"""
+import gzip
+import http.client
+import os
+import threading
+from functools import partial
+
+import pytest
+
+from webserver import IMMUTABLE, REVALIDATE, AssetCache, BAWTHandler, BAWTServer, accepts_gzip
+
+SCRIPT = b'console.log("bawt");\n' * 200
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'js' / 'app.js').write_bytes(SCRIPT)
+    (tmp_path / 'index.html').write_text(
+        '<script src="js/app.js"></script><script src="https://cdn.example/x.js"></script>')
+    (tmp_path / 'notes.txt').write_text('plain')
+    return AssetCache(str(tmp_path)).build()
+
+
+@pytest.fixture
+def server(site):
+    handler = partial(BAWTHandler, directory=site.root, assets=site)
+    server = BAWTServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path, **headers):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+    try:
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        return response, response.read()
+    finally:
+        conn.close()
+
+
+def test_accept_encoding_honours_quality_values():
+    assert accepts_gzip('gzip, deflate')
+    assert accepts_gzip('deflate;q=0.5, GZIP;q=0.1')
+    assert not accepts_gzip('gzip;q=0')
+    assert not accepts_gzip('gzip;q=bad')
+    assert not accepts_gzip('identity')
+    assert not accepts_gzip('')
+    assert accepts_gzip('*')
+    # An explicit gzip entry overrides the wildcard
+    assert not accepts_gzip('*, gzip;q=0')
+
+
+def test_pages_reference_asset_versions(site):
+    script = site.get('/js/app.js')
+    page = site.get('/')
+    assert page.body.decode() == (
+        f'<script src="js/app.js?v={script.version}"></script>'
+        '<script src="https://cdn.example/x.js"></script>')
+    assert site.get('/notes.txt') is None
+    assert site.get('/../secret.js') is None
+
+
+def test_changed_files_are_reloaded_with_the_pages(site):
+    old = site.get('/js/app.js').version
+    path = os.path.join(site.root, 'js', 'app.js')
+    with open(path, 'wb') as f:
+        f.write(SCRIPT + b'// changed\n')
+    os.utime(path, (1, 1))
+    new = site.get('/js/app.js').version
+    assert new != old
+    assert f'?v={new}' in site.get('/index.html').body.decode()
+
+
+def test_gzip_and_identity_have_distinct_etags(server, site):
+    script = site.get('/js/app.js')
+    plain, body = get(server, '/js/app.js')
+    assert body == SCRIPT
+    assert plain.getheader('ETag') == script.etag
+    assert plain.getheader('Vary') == 'Accept-Encoding'
+    assert plain.getheader('Cache-Control') == REVALIDATE
+    packed, body = get(server, '/js/app.js', **{'Accept-Encoding': 'gzip'})
+    assert packed.getheader('Content-Encoding') == 'gzip'
+    assert gzip.decompress(body) == SCRIPT
+    assert packed.getheader('ETag') == script.gzip_etag != script.etag
+
+
+def test_versioned_requests_are_immutable(server, site):
+    version = site.get('/js/app.js').version
+    response, _ = get(server, f'/js/app.js?v={version}')
+    assert response.getheader('Cache-Control') == IMMUTABLE
+    stale, _ = get(server, '/js/app.js?v=0')
+    assert stale.getheader('Cache-Control') == REVALIDATE
+
+
+def test_conditional_requests_match_the_served_encoding(server, site):
+    script = site.get('/js/app.js')
+    response, body = get(server, '/js/app.js', **{'If-None-Match': script.etag})
+    assert response.status == 304 and body == b''
+    assert response.getheader('Vary') == 'Accept-Encoding'
+    # The identity validator does not match the gzip representation
+    response, _ = get(server, '/js/app.js', **{'If-None-Match': script.etag, 'Accept-Encoding': 'gzip'})
+    assert response.status == 200
+    response, _ = get(server, '/js/app.js', **{'If-Modified-Since': script.last_modified})
+    assert response.status == 304
+
+
+def test_uncached_files_are_served_from_disk(server):
+    response, body = get(server, '/notes.txt')
+    assert response.status == 200 and body == b'plain'
+    assert response.getheader('Cache-Control') == REVALIDATE
+    assert response.getheader('ETag') is None
@@ -6,60 +6,300 @@ Usage:
     python webserver.py
 
 Then open http://localhost:8000 in your browser.
+
+Static assets (HTML/JS/CSS) are loaded into memory at startup together with
+a gzip variant and a content hash. Local script and stylesheet references in
+HTML pages are rewritten to ``?v=<hash>`` so browsers can cache them as
+immutable; pages themselves are revalidated with ETag/Last-Modified.
 """
 
+import email.utils
+import gzip
+import hashlib
 import http.server
-import socketserver
 import os
+import posixpath
+import re
+import threading
 import webbrowser
 from functools import partial
+from urllib.parse import urlsplit, parse_qs
 
 PORT = 8000
 DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
+# Assets held in memory (everything else is served from disk)
+CACHED_EXTENSIONS = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+}
+SKIP_DIRS = {'.git', 'backend', 'docs', 'test', 'templates', '__pycache__', 'node_modules'}
+MIN_GZIP_SIZE = 1024
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# <script src="js/app.js"> / <link href="styles/main.css"> (local, unversioned)
+ASSET_REF_PATTERN = re.compile(r'''((?:src|href)=["'])(?!https?:|//)([^"'?#]+\.(?:js|css))(["'])''')
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip (honouring q=0 and '*')."""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    if 'gzip' in qualities:
+        return qualities['gzip'] > 0
+    return qualities.get('*', 0.0) > 0
+
+
+class StaticAsset:
+    """In-memory copy of a static file with validators and a gzip variant."""
+
+    def __init__(self, path, body, content_type, mtime):
+        self.path = path
+        self.body = body
+        self.content_type = content_type
+        self.mtime = mtime
+        self.version = hashlib.sha1(body).hexdigest()[:12]
+        self.etag = f'"{self.version}"'
+        # Strong validators must differ between representations
+        self.gzip_etag = f'"{self.version}-gz"'
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True)
+        self.gzipped = None
+        if len(body) >= MIN_GZIP_SIZE:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.gzipped = compressed
+
+
+class AssetCache:
+    """Loads cacheable assets at startup and reloads any file whose mtime changes."""
+
+    def __init__(self, root):
+        self.root = root
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        """Load every cacheable asset under the root."""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.')]
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() in CACHED_EXTENSIONS:
+                    rel = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                    self._load('/' + rel.replace(os.sep, '/'))
+        # HTML references depend on the versions of the other assets
+        for url_path in self._pages():
+            self._load(url_path)
+        return self
+
+    def __len__(self):
+        return len(self._assets)
+
+    def get(self, url_path):
+        """Return the asset for a URL path, reloading it if the file changed on disk."""
+        if url_path.endswith('/'):
+            url_path += 'index.html'
+        url_path = posixpath.normpath(url_path)
+        asset = self._assets.get(url_path)
+        fs_path = self._fs_path(url_path)
+        if fs_path is None:
+            return None
+        try:
+            mtime = os.path.getmtime(fs_path)
+        except OSError:
+            return None
+        if asset is None or asset.mtime != mtime:
+            ext = os.path.splitext(url_path)[1].lower()
+            if ext not in CACHED_EXTENSIONS:
+                return None
+            asset = self._load(url_path)
+            if ext != '.html':
+                # Pages embed asset versions, so refresh them too
+                for page in self._pages():
+                    self._load(page)
+        return asset
+
+    def _pages(self):
+        """Snapshot of the cached HTML paths (other threads may be loading assets)."""
+        with self._lock:
+            return [p for p in self._assets if p.endswith('.html')]
+
+    def _fs_path(self, url_path):
+        fs_path = os.path.normpath(os.path.join(self.root, url_path.lstrip('/')))
+        if not fs_path.startswith(self.root + os.sep):
+            return None
+        return fs_path
+
+    def _load(self, url_path):
+        fs_path = self._fs_path(url_path)
+        ext = os.path.splitext(url_path)[1].lower()
+        with open(fs_path, 'rb') as f:
+            body = f.read()
+        mtime = os.path.getmtime(fs_path)
+        if ext == '.html':
+            body = self._version_references(url_path, body)
+        asset = StaticAsset(url_path, body, CACHED_EXTENSIONS[ext], mtime)
+        with self._lock:
+            self._assets[url_path] = asset
+        return asset
+
+    def _version_references(self, page_path, body):
+        """Append ?v=<content hash> to local JS/CSS references in an HTML page."""
+        base = page_path.rsplit('/', 1)[0] + '/'
+
+        def _replace(match):
+            ref = match.group(2)
+            target = ref if ref.startswith('/') else os.path.normpath(base + ref).replace(os.sep, '/')
+            asset = self._assets.get(target)
+            if asset is None:
+                return match.group(0)
+            return f'{match.group(1)}{ref}?v={asset.version}{match.group(3)}'
+
+        text = body.decode('utf-8')
+        return ASSET_REF_PATTERN.sub(_replace, text).encode('utf-8')
+
 
 class BAWTHandler(http.server.SimpleHTTPRequestHandler):
     """Custom HTTP handler for BAWT application."""
-    
-    def __init__(self, *args, directory=None, **kwargs):
+
+    _cached_response = False
+
+    def __init__(self, *args, directory=None, assets=None, **kwargs):
+        self.assets = assets
         super().__init__(*args, directory=directory, **kwargs)
-    
+
     def end_headers(self):
         # Add CORS headers for local development
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
         super().end_headers()
-    
+
     def do_OPTIONS(self):
+        self._cached_response = False
         self.send_response(200)
         self.end_headers()
-    
+
+    def do_GET(self):
+        if not self._send_cached(head_only=False):
+            super().do_GET()
+
+    def do_HEAD(self):
+        if not self._send_cached(head_only=True):
+            super().do_HEAD()
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        # Files served from disk (not in the asset cache) are always revalidated
+        if not self._cached_response:
+            self.send_header('Cache-Control', REVALIDATE)
+
+    def _send_cached(self, head_only):
+        """Serve an in-memory asset with conditional GET, gzip and cache headers."""
+        self._cached_response = False
+        if self.assets is None:
+            return False
+        url = urlsplit(self.path)
+        if url.path.endswith('/') and url.path != '/':
+            return False
+        asset = self.assets.get(url.path)
+        if asset is None:
+            return False
+        self._cached_response = True
+
+        requested_version = parse_qs(url.query).get('v', [None])[0]
+        cache_control = IMMUTABLE if requested_version == asset.version else REVALIDATE
+        gzipped = asset.gzipped is not None and accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        etag = asset.gzip_etag if gzipped else asset.etag
+
+        if self._not_modified(asset, etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            if asset.gzipped is not None:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            return True
+
+        body = asset.gzipped if gzipped else asset.body
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        if asset.gzipped is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Cache-Control', cache_control)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+        return True
+
+    def _not_modified(self, asset, etag):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(asset.mtime) <= since
+        return False
+
     def log_message(self, format, *args):
         # Custom log format with color
         print(f"[BAWT Server] {args[0]}")
 
 
+class BAWTServer(http.server.ThreadingHTTPServer):
+    """Thread-per-connection server so concurrent users don't queue."""
+
+    daemon_threads = True
+    allow_reuse_address = False
+
+
 def run_server():
     """Start the development server."""
-    handler = partial(BAWTHandler, directory=DIRECTORY)
-    
+    assets = AssetCache(DIRECTORY).build()
+    handler = partial(BAWTHandler, directory=DIRECTORY, assets=assets)
+
     # Try ports 8000-8010
-    start_port = 8000
+    start_port = PORT
     max_retries = 10
     httpd = None
     port = start_port
-    
+
     for i in range(max_retries):
         port = start_port + i
         try:
-            httpd = socketserver.TCPServer(("", port), handler)
+            httpd = BAWTServer(("", port), handler)
             break
         except OSError:
             print(f"Port {port} is in use, trying next...")
             continue
-            
+
     if httpd is None:
         print(f"Could not bind to any port between {start_port} and {start_port + max_retries - 1}")
         return
@@ -72,15 +312,16 @@ def run_server():
         print(f"\n  Server running at: {url}")
         print(f"  Login page: {url}/login.html")
         print(f"  Main app: {url}/index.html")
+        print(f"  Cached assets: {len(assets)}")
         print("\n  Press Ctrl+C to stop the server")
         print("=" * 50)
-        
+
         # Open browser automatically
         try:
             webbrowser.open(url)
         except Exception:
             pass
-        
+
         try:
             httpd.serve_forever()
         except KeyboardInterrupt: